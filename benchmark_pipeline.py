@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the geodata and HTML generation pipeline.
+
+Runs the real build (generate_geodata.build_geodata, timed stage by stage
+through its Profiler, plus the --mercator projection and serialization),
+then the city table, the snapshot render and HTML assembly, on synthetic
+country fixtures (no node_modules needed) at scaled-up vertex and entity
+counts, plus the real world-geojson country set when it is installed.
+
+Repeats of every stage alternate with a fixed reference workload (shapely
+overlays and JSON, no pipeline code). Stages are compared against the
+baseline as multiples of it, so a baseline recorded on one machine (or
+while the machine ran slower) still applies.
+
+    python benchmark_pipeline.py                    # run and print
+    python benchmark_pipeline.py --save-baseline    # store results as the new baseline
+    python benchmark_pipeline.py --compare          # fail on regressions vs the baseline
+"""
+import argparse
+import contextlib
+import copy
+import gc
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import shapely
+from shapely.geometry import box, mapping
+
+import generate_geodata as geo
+import generate_html
+from profiling import Profiler
+
+ROOT_DIR = os.path.dirname(__file__)
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmark_baseline.json")
+
+# Benchmark stage -> the Profiler stages of build_geodata, project_output and
+# write_output it sums
+GEODATA_STAGES = {
+    "load": ["cache_load", "load", "make_valid"],
+    "simplify": ["simplify", "resolve_overlaps"],
+    "overlay": ["overlay", "coverage", "repair"],
+    "neighbors": ["core", "clip"],
+    "morphs": ["morph"],
+    "changes": ["changes"],
+    "water": ["water"],
+    "meta": ["metadata"],
+    "project": ["project"],
+    "serialize": ["serialize"],
+}
+STAGES = list(GEODATA_STAGES) + ["cities", "snapshots", "html"]
+
+# Rough real-world extents so the historical clip boxes hit something
+FIXTURE_BOUNDS = {
+    "kazakhstan": (46.5, 40.6, 87.3, 55.4), "uzbekistan": (56.0, 37.2, 73.1, 45.6),
+    "turkmenistan": (52.5, 35.1, 66.7, 42.8), "kyrgyzstan": (69.3, 39.2, 80.3, 43.3),
+    "tajikistan": (67.4, 36.7, 75.1, 41.0), "russia": (30.0, 41.2, 110.0, 75.0),
+    "china": (73.5, 18.2, 134.8, 53.6), "iran": (44.0, 25.1, 63.3, 39.8),
+    "afghanistan": (60.5, 29.4, 74.9, 38.5), "pakistan": (60.9, 23.7, 77.8, 37.1),
+    "mongolia": (87.7, 41.6, 119.9, 52.1), "azerbaijan": (44.8, 38.4, 50.4, 41.9),
+    "georgia": (40.0, 41.0, 46.7, 43.6),
+}
+
+VERTEX_SCALES = [1000, 4000, 8000]
+ENTITY_SCALES = [1, 4, 16]
+QUICK_VERTEX_SCALES = [1000, 2000]
+QUICK_ENTITY_SCALES = [1, 4]
+
+
+# =============================================
+# FIXTURES
+# =============================================
+
+def synthetic_ring(bounds, n, rng):
+    # Noisy star-shaped ring inscribed in bounds; never self-intersects
+    minx, miny, maxx, maxy = bounds
+    cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+    rx, ry = (maxx - minx) / 2, (maxy - miny) / 2
+    ring = []
+    for i in range(n):
+        a = 2 * math.pi * i / n
+        r = 0.75 + 0.2 * math.sin(a * 7) + rng.uniform(-0.04, 0.04)
+        ring.append([round(cx + rx * r * math.cos(a), 6), round(cy + ry * r * math.sin(a), 6)])
+    ring.append(ring[0])
+    return ring
+
+
+def write_fixtures(directory, vertices, seed=1900):
+    rng = random.Random(seed)
+    for name, bounds in FIXTURE_BOUNDS.items():
+        feature = {"type": "Feature", "properties": {"name": name},
+                   "geometry": {"type": "Polygon",
+                                "coordinates": [synthetic_ring(bounds, vertices, rng)]}}
+        with open(os.path.join(directory, f"{name}.json"), "w") as f:
+            json.dump({"type": "FeatureCollection", "features": [feature]}, f)
+
+
+def replicate_entities(historical, factor):
+    # Scale the entity count by cloning every historical entity `factor` times
+    if factor == 1:
+        return historical
+    out = {}
+    for period, entities in historical.items():
+        out[period] = {}
+        for key, entity in entities.items():
+            out[period][key] = entity
+            for i in range(2, factor + 1):
+                out[period][f"{key}_{i}"] = entity
+    return out
+
+
+# =============================================
+# TIMING
+# =============================================
+
+@contextlib.contextmanager
+def no_gc():
+    # Like timeit: collections triggered by earlier stages' garbage would
+    # land on whichever stage happens to be running
+    gc.collect()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+REFERENCE_RING = synthetic_ring((0, 0, 40, 20), 4000, random.Random(0))
+
+
+def reference_work():
+    # The fixed reference workload: clip, union and serialize a noisy
+    # polygon, using the same libraries as the pipeline but none of its code
+    poly = shapely.Polygon(REFERENCE_RING)
+    parts = [poly.intersection(box(x, 0, x + 5, 20)) for x in range(0, 40, 4)]
+    return json.dumps(mapping(shapely.union_all(parts).simplify(0.01)))
+
+
+def cpu_time(fn):
+    # (CPU seconds, result): on a shared machine wall time also counts
+    # other tenants
+    with no_gc():
+        t0 = time.process_time()
+        result = fn()
+        return time.process_time() - t0, result
+
+
+def between_references(fn, repeats):
+    # Runs fn repeats times with the reference workload before, between and
+    # after: [(fn's result, mean reference seconds around that run)], so each
+    # run is set against the speed the machine had at that moment
+    runs = []
+    before, _ = cpu_time(reference_work)
+    for _ in range(repeats):
+        result = fn()
+        after, _ = cpu_time(reference_work)
+        runs.append((result, (before + after) / 2))
+        before = after
+    return runs
+
+
+def best_of(fn, repeats):
+    # (best seconds, median multiple of the reference workload, last result)
+    runs = between_references(lambda: cpu_time(fn), repeats)
+    return (min(elapsed for (elapsed, _), _ in runs),
+            statistics.median(elapsed / ref for (elapsed, _), ref in runs),
+            runs[-1][0][1])
+
+
+def profile_build(countries_dir, entity_factor):
+    # One real build through its Profiler: ({stage: cpu seconds}, output)
+    prof = Profiler("benchmark")
+    with contextlib.redirect_stdout(io.StringIO()), no_gc():
+        output = geo.build_geodata(geo.DEFAULT_REGION, prof, countries_dir=countries_dir)
+        output["historical"] = replicate_entities(output["historical"], entity_factor)
+        # The --mercator build's extra stage, on a copy so the page gets degrees
+        geo.project_output(copy.deepcopy(output), prof)
+        geo.write_output(output, os.devnull, prof)
+    cpu = {}
+    for rec in prof.stages:
+        cpu[rec["stage"]] = cpu.get(rec["stage"], 0.0) + rec["cpu_s"]
+    return {stage: sum(cpu.get(name, 0.0) for name in names)
+            for stage, names in GEODATA_STAGES.items()}, output
+
+
+def build_geodata_profiled(countries_dir, repeats, entity_factor=1):
+    # best_of for the real build, per GEODATA_STAGES entry:
+    # ({stage: seconds}, {stage: multiple}, the last run's output)
+    runs = between_references(lambda: profile_build(countries_dir, entity_factor), repeats)
+    best = {stage: min(cpu[stage] for (cpu, _), _ in runs) for stage in GEODATA_STAGES}
+    relative = {stage: statistics.median(cpu[stage] / ref for (cpu, _), ref in runs)
+                for stage in GEODATA_STAGES}
+    return best, relative, runs[-1][0][1]
+
+
+def run_pipeline(countries_dir, repeats, entity_factor=1):
+    seconds, relative, output = build_geodata_profiled(countries_dir, repeats, entity_factor)
+    payload = json.dumps(output)
+    seconds["cities"], relative["cities"], city_table = best_of(
+        lambda: generate_html.load_region_cities(generate_html.DEFAULT_REGION), repeats)
+    seconds["snapshots"], relative["snapshots"], snapshot_set = best_of(
+        lambda: generate_html.render_snapshots(output), repeats)
+    # Assembly alone: the search index and marker clusters plus the template
+    seconds["html"], relative["html"], html = best_of(
+        lambda: generate_html.build_html(payload, city_table=city_table, snapshot_set=snapshot_set), repeats)
+    return {"seconds": {k: round(v, 6) for k, v in seconds.items()},
+            "relative": {k: round(v, 4) for k, v in relative.items()},
+            "geodata_bytes": len(payload), "html_bytes": len(html)}
+
+
+# =============================================
+# SUITE
+# =============================================
+
+def run_suite(quick=False, repeats=5, include_real=True):
+    results = {}
+    vertex_scales = QUICK_VERTEX_SCALES if quick else VERTEX_SCALES
+    entity_scales = QUICK_ENTITY_SCALES if quick else ENTITY_SCALES
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in vertex_scales:
+            case_dir = os.path.join(tmp, f"v{n}")
+            os.mkdir(case_dir)
+            write_fixtures(case_dir, n)
+            results[f"synthetic/vertices={n}"] = run_pipeline(case_dir, repeats)
+            print(f"  synthetic/vertices={n}: done", file=sys.stderr)
+        base_dir = os.path.join(tmp, f"v{vertex_scales[0]}")
+        for k in entity_scales[1:]:
+            results[f"synthetic/entities=x{k}"] = run_pipeline(base_dir, repeats, entity_factor=k)
+            print(f"  synthetic/entities=x{k}: done", file=sys.stderr)
+    if include_real and os.path.isdir(geo.COUNTRIES_DIR):
+        results["real/world-geojson"] = run_pipeline(geo.COUNTRIES_DIR, repeats)
+        print("  real/world-geojson: done", file=sys.stderr)
+    return results
+
+
+# =============================================
+# REPORTING
+# =============================================
+
+def format_results(results):
+    lines = [f"{'case':<26}" + "".join(f"{s:>10}" for s in STAGES) + f"{'html KB':>9}"]
+    for case, res in results.items():
+        secs = res["seconds"]
+        lines.append(f"{case:<26}" + "".join(f"{secs[s] * 1000:>8.1f}ms" for s in STAGES)
+                     + f"{res['html_bytes'] / 1024:>9.1f}")
+    return "\n".join(lines)
+
+
+def find_regressions(baseline, results, threshold, min_seconds=0.02):
+    # Compares the stages' multiples of the reference workload, so the
+    # baseline's machine doesn't matter. Stages faster than min_seconds are
+    # too noisy to compare meaningfully.
+    regressions = []
+    for case, res in results.items():
+        base = baseline.get("results", {}).get(case)
+        if base is None or "relative" not in base:
+            continue
+        for stage in STAGES:
+            old, new = base["relative"].get(stage), res["relative"][stage]
+            if old is None or max(base["seconds"][stage], res["seconds"][stage]) < min_seconds:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append((case, stage, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the geodata and HTML pipeline.")
+    parser.add_argument("--quick", action="store_true", help="smaller scales for a fast check")
+    parser.add_argument("--repeats", type=int, default=5, help="runs per stage; the best is kept")
+    parser.add_argument("--no-real", action="store_true",
+                        help="skip the real country set even if node_modules is present")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON path")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit non-zero when a stage regresses past --threshold")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown vs baseline (default 0.25 = 25%%)")
+    parser.add_argument("--json", metavar="PATH", help="also write results to PATH")
+    args = parser.parse_args(argv)
+
+    print("Running pipeline benchmarks...", file=sys.stderr)
+    results = run_suite(args.quick, args.repeats, not args.no_real)
+    print(format_results(results))
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for case, stage, old, new in regressions:
+                print(f"  {case} {stage}: {old:.2f}x -> {new:.2f}x the reference workload"
+                      f" ({(new - old) / old:+.0%})")
+            if args.compare:
+                status = 1
+        else:
+            print(f"\nNo regressions over {args.threshold:.0%} vs {args.baseline}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Build several region maps at once from the profiles in regions.py.
+
+Every country the selected regions need is loaded and repaired exactly once,
+in parallel, into the shared on-disk geometry cache; then each region's
+geodata and HTML are built in a process of its own, reading the countries
+back from the cache (Russia, China and Iran are shared by most regions).
+
+    python build_regions.py                         # every region
+    python build_regions.py caucasus mongolia -j 2
+    python build_regions.py --cache-dir /tmp/geocache --mercator
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import generate_geodata as geo
+import generate_html
+import regions
+
+DEFAULT_CACHE_DIR = os.path.join(regions.ROOT_DIR, ".geocache")
+
+
+def warm_country(name, countries_dir, cache_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        geo.load_country(name, countries_dir=countries_dir, cache_dir=cache_dir)
+    return name
+
+
+def build_region(name, countries_dir, cache_dir, mercator):
+    # One region end to end. Progress output is captured and returned so
+    # parallel builds don't interleave.
+    region = regions.get_region(name)
+    log = io.StringIO()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        output = geo.build_geodata(region, countries_dir=countries_dir, cache_dir=cache_dir,
+                                   mercator=mercator)
+        geo.write_output(output, region["geodata"])
+        with open(region["geodata"]) as f:
+            html = generate_html.build_html(f.read(), region=region)
+        with open(region["html"], "w") as f:
+            f.write(html)
+    return {"region": name, "seconds": time.perf_counter() - t0, "log": log.getvalue(),
+            "geodata": region["geodata"], "geodata_bytes": os.path.getsize(region["geodata"]),
+            "html": region["html"], "html_bytes": os.path.getsize(region["html"])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build region maps in parallel.")
+    parser.add_argument("regions", nargs="*", metavar="REGION",
+                        help=f"regions to build (default: all of {', '.join(regions.REGIONS)})")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"shared country geometry cache (default {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--countries-dir", default=geo.COUNTRIES_DIR,
+                        help="world-geojson countries directory")
+    parser.add_argument("--mercator", action="store_true",
+                        help="emit geometry pre-projected to Web Mercator base-zoom pixels")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print each region's full build log")
+    args = parser.parse_args(argv)
+    names = args.regions or list(regions.REGIONS)
+    unknown = [n for n in names if n not in regions.REGIONS]
+    if unknown:
+        parser.error(f"unknown region(s): {', '.join(unknown)}")
+
+    countries = sorted({c for n in names for section in ("countries", "neighbors")
+                        for c in regions.REGIONS[n][section]})
+    t0 = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        print(f"Loading {len(countries)} countries into {args.cache_dir}...")
+        jobs = {pool.submit(warm_country, c, args.countries_dir, args.cache_dir): c for c in countries}
+        for job in as_completed(jobs):
+            try:
+                job.result()
+            except Exception as err:  # reported per country; the regions that need it fail below
+                print(f"  {jobs[job]}: {err}", file=sys.stderr)
+
+        print(f"Building {len(names)} regions with {args.jobs} workers...")
+        jobs = {pool.submit(build_region, n, args.countries_dir, args.cache_dir, args.mercator): n
+                for n in names}
+        for job in as_completed(jobs):
+            try:
+                res = job.result()
+            except Exception as err:
+                failed.append(jobs[job])
+                print(f"  {jobs[job]}: FAILED ({err})", file=sys.stderr)
+                continue
+            if args.verbose:
+                print(res["log"])
+            print(f"  {res['region']}: {res['seconds']:.1f}s  {res['geodata']} ({res['geodata_bytes']/1024:.1f} KB),"
+                  f" {res['html']} ({res['html_bytes']/1024:.1f} KB)")
+
+    print(f"Done in {time.perf_counter() - t0:.1f}s ({len(names) - len(failed)}/{len(names)} regions)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Payload and render-cost budget gate for a built map page.
+
+Measures what the written HTML actually ships and checks it against
+budget.json:
+
+    html_bytes      the whole page
+    layer_bytes     each embedded payload: geodata sections (modern,
+                    neighbors, historical, morphs, changes, water, meta), the
+                    snapshots, the city table, its marker clusters and the
+                    search index
+    era_bytes       per timeline interval: the entity geometry the page
+                    decodes plus the interval's snapshot layer
+    vertices_z5     per timeline interval: vertices Leaflet draws at the
+                    region's default zoom (entities + neighbours, clipped
+                    to the map bounds, 1px smoothing)
+    markers         per zoom tier: city cluster markers over the whole map,
+                    most crowded era
+    seconds         generation wall time per script, from the generator's
+                    own gate or --profile reports
+
+Every run prints a diff against the last accepted build (budget_accepted.json)
+and exits 1 when a budget is exceeded; --accept records the current build as
+the new reference. Both generators run the gate after writing their output
+(generate_geodata on the metrics the geodata settles alone) unless given
+--no-check-budget.
+
+    python check_budget.py                          # central-asia-map.html
+    python check_budget.py --region caucasus
+    python check_budget.py --profile geo.json --profile html.json
+    python check_budget.py --accept
+    python generate_html.py --no-check-budget       # skip the gate
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import shapely
+
+import regions
+import snapshots
+
+ROOT_DIR = os.path.dirname(__file__)
+BUDGET_PATH = os.path.join(ROOT_DIR, "budget.json")
+ACCEPTED_PATH = os.path.join(ROOT_DIR, "budget_accepted.json")
+
+# Leaflet's default smoothFactor: paths are simplified to 1px when drawn
+LEAFLET_SMOOTH_PX = 1.0
+MARKER_ZOOMS = [5, 6, 7, 8]
+GEODATA_LAYERS = ["modern", "neighbors", "historical", "morphs", "changes", "water", "meta"]
+
+# metric -> budget key; dict-valued metrics are checked per entry against
+# a dict budget (per-entry limits) or a number (one limit for every entry)
+BUDGET_KEYS = {
+    "html_bytes": "max_html_bytes",
+    "layer_bytes": "max_layer_bytes",
+    "era_bytes": "max_era_bytes",
+    "vertices_z5": "max_vertices_z5",
+    "markers": "max_markers",
+    "seconds": "max_seconds",
+}
+
+
+# =============================================
+# MEASUREMENT
+# =============================================
+
+def _embedded_json(html, script_id):
+    m = re.search(r'<script type="application/json" id="%s">(.*?)</script>' % script_id, html, re.S)
+    return m.group(1) if m else None
+
+
+def _embedded_const(html, name):
+    m = re.search(r"^const %s = (.*);$" % name, html, re.M)
+    return m.group(1) if m else None
+
+
+def _bytes(text):
+    return len(text.encode("utf-8"))
+
+
+def _era_geometry(geodata, region):
+    # {interval start: (entity geometry bytes, vertices drawn at the default
+    # zoom)}, entities resolved the way the geo worker does
+    index = regions.interval_index(region)
+    crs = geodata.get("crs")
+    origin, _, _, clip = snapshots.view_frame(region)
+    zoom = region["zoom"]
+
+    def drawn(geom):
+        px = snapshots.pixel_geometry(geom, origin, zoom, crs, clip, LEAFLET_SMOOTH_PX)
+        return int(shapely.get_num_coordinates(px))
+
+    neighbor_vertices = sum(drawn(g) for g in geodata["neighbors"].values())
+    out = {}
+    segments = snapshots.segment_entities(geodata, index, region["era_entities"])
+    for seg, ents in enumerate(segments):
+        out[str(index["boundaries"][seg])] = (sum(_bytes(json.dumps(geom)) for *_, geom, _ in ents),
+                                              neighbor_vertices + sum(drawn(geom) for *_, geom, _ in ents))
+    return out
+
+
+def _seconds(timings):
+    return {k: round(v, 3) for k, v in (timings or {}).items()}
+
+
+def measure_geodata(geodata, region, timings=None):
+    # The metrics a geodata payload settles on its own, for the geodata
+    # step's gate: its layer sizes and drawn vertices, no page needed
+    eras = _era_geometry(geodata, region)
+    return {"region": region["name"],
+            "layer_bytes": {name: _bytes(json.dumps(geodata[name])) for name in GEODATA_LAYERS if name in geodata},
+            "vertices_z5": {start: v for start, (_, v) in eras.items()},
+            "seconds": _seconds(timings)}
+
+
+def measure(html, region, timings=None):
+    # Metrics for one built page (the HTML text); timings: {script: seconds}
+    geodata = json.loads(_embedded_json(html, "geodata"))
+    snapshot_raw = _embedded_json(html, "snapshots")
+    layers = json.loads(snapshot_raw)["layers"] if snapshot_raw else []
+    city_raw = _embedded_const(html, "CITY_TABLE")
+    cluster_raw = _embedded_const(html, "CITY_CLUSTERS")
+    search_raw = _embedded_const(html, "CITY_SEARCH")
+
+    layer_bytes = {name: _bytes(json.dumps(geodata[name])) for name in GEODATA_LAYERS if name in geodata}
+    layer_bytes["snapshots"] = _bytes(snapshot_raw or "")
+    layer_bytes["cities"] = _bytes(city_raw or "")
+    layer_bytes["clusters"] = _bytes(cluster_raw or "")
+    layer_bytes["search"] = _bytes(search_raw or "")
+
+    era_bytes, vertices = {}, {}
+    for seg, (start, (geom_bytes, verts)) in enumerate(_era_geometry(geodata, region).items()):
+        era_bytes[start] = geom_bytes + (_bytes(layers[seg]) if seg < len(layers) else 0)
+        vertices[start] = verts
+
+    markers = {}
+    if cluster_raw:
+        clusters = json.loads(cluster_raw)
+        for z in MARKER_ZOOMS:
+            # Same level lookup as the page's clusterLevel
+            i = min(max(z, clusters["minZoom"]), clusters["maxZoom"] + 1) - clusters["minZoom"]
+            markers[str(z)] = max((len(next(lv for lv in levels[i:] if lv)["city"])
+                                   for levels in clusters["levels"]), default=0)
+
+    return {"region": region["name"], "html_bytes": _bytes(html), "layer_bytes": layer_bytes,
+            "era_bytes": era_bytes, "vertices_z5": vertices, "markers": markers,
+            "seconds": _seconds(timings)}
+
+
+def profile_timings(paths):
+    # {script: total wall seconds} from profiling.Profiler reports
+    out = {}
+    for path in paths:
+        with open(path) as f:
+            report = json.load(f)
+        out[report["script"]] = report["total_wall_s"]
+    return out
+
+
+# =============================================
+# BUDGETS AND DIFF
+# =============================================
+
+def load_budget(region_name, path=BUDGET_PATH):
+    # "default" budgets with per-region overrides merged one level deep
+    with open(path) as f:
+        config = json.load(f)
+    budget = {k: (dict(v) if isinstance(v, dict) else v) for k, v in config.get("default", {}).items()}
+    for key, value in config.get("regions", {}).get(region_name, {}).items():
+        if isinstance(value, dict) and isinstance(budget.get(key), dict):
+            budget[key].update(value)
+        else:
+            budget[key] = value
+    return budget
+
+
+def load_accepted(region_name, path=ACCEPTED_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get(region_name)
+
+
+def save_accepted(metrics, path=ACCEPTED_PATH):
+    accepted = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            accepted = json.load(f)
+    # Each generator times itself in its own run; keep the scripts this
+    # measurement has no timing for
+    previous = accepted.get(metrics["region"], {}).get("seconds", {})
+    accepted[metrics["region"]] = {**metrics, "seconds": {**previous, **metrics["seconds"]}}
+    with open(path, "w") as f:
+        json.dump(accepted, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def flatten(metrics):
+    # [(name, value, budget key, entry)] for every checked number
+    rows = []
+    for metric, key in BUDGET_KEYS.items():
+        value = metrics.get(metric)
+        if isinstance(value, dict):
+            rows += [(f"{metric}.{entry}", v, key, entry) for entry, v in value.items()]
+        elif value is not None:
+            rows.append((metric, value, key, None))
+    return rows
+
+
+def check(metrics, budget, accepted=None):
+    # (table lines, failures): one line per metric with the accepted value,
+    # the change and the limit; failures name the metrics over budget
+    old = {name: v for name, v, _, _ in flatten(accepted)} if accepted else {}
+    lines = [f"{'metric':<26} {'accepted':>10} {'current':>10} {'change':>8} {'budget':>10}"]
+    failures = []
+    for name, value, key, entry in flatten(metrics):
+        limit = budget.get(key)
+        if isinstance(limit, dict):
+            limit = limit.get(entry)
+        prev = old.get(name)
+        change = "new" if prev is None else f"{(value - prev) / prev * 100:+.1f}%" if prev else "n/a"
+        over = limit is not None and value > limit
+        if over:
+            failures.append(name)
+        lines.append(f"{name:<26} {'-' if prev is None else prev:>10} {value:>10} {change:>8}"
+                     f" {'-' if limit is None else limit:>10}{'  OVER' if over else ''}")
+    return lines, failures
+
+
+def run_gate(html, region, timings=None, budget_path=BUDGET_PATH, accepted_path=ACCEPTED_PATH,
+             accept=False):
+    # Measure a page, print the diff and return True when every budget holds
+    return gate_metrics(measure(html, region, timings), region, budget_path, accepted_path, accept)
+
+
+def gate_metrics(metrics, region, budget_path=BUDGET_PATH, accepted_path=ACCEPTED_PATH, accept=False):
+    # run_gate for metrics already measured (e.g. measure_geodata's subset)
+    budget = load_budget(region["name"], budget_path)
+    accepted = load_accepted(region["name"], accepted_path)
+    lines, failures = check(metrics, budget, accepted)
+    print(f"Budget check ({region['name']}, vs {'last accepted build' if accepted else 'no accepted build'}):")
+    print("\n".join("  " + line for line in lines))
+    if failures:
+        print(f"  {len(failures)} budget(s) exceeded: {', '.join(failures)}", file=sys.stderr)
+    else:
+        print("  All budgets met")
+    if accept:
+        save_accepted(metrics, accepted_path)
+        print(f"  Accepted as the reference build in {accepted_path}")
+    return not failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a built map page against budget.json.")
+    parser.add_argument("--region", default=regions.DEFAULT_REGION, choices=sorted(regions.REGIONS))
+    parser.add_argument("--html", metavar="PATH", help="page to check (default: the region's HTML)")
+    parser.add_argument("--profile", metavar="PATH", action="append", default=[],
+                        help="generator --profile report to take generation time from (repeatable)")
+    parser.add_argument("--budget", default=BUDGET_PATH, help=f"budget file (default {BUDGET_PATH})")
+    parser.add_argument("--accepted", default=ACCEPTED_PATH,
+                        help=f"last accepted build's metrics (default {ACCEPTED_PATH})")
+    parser.add_argument("--accept", action="store_true",
+                        help="record this build as the accepted reference (even when over budget)")
+    args = parser.parse_args(argv)
+    region = regions.get_region(args.region)
+
+    with open(args.html or region["html"], encoding="utf-8") as f:
+        html = f.read()
+    ok = run_gate(html, region, profile_timings(args.profile), args.budget, args.accepted, args.accept)
+    return 0 if ok or args.accept else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
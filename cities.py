@@ -0,0 +1,178 @@
+"""
+City database: cities.csv -> the columnar CITY_TABLE embedded in the page.
+
+cities.csv has one row per settlement with lat/lng plus a name_<era> and
+tier_<era> column per timeline era (blank = not shown in that era). The
+page gets parallel columns instead of one object per city:
+
+    lat, lng        coordinates in 1e-3 degree integers (Float32Array degrees in the page)
+    names           deduplicated string table
+    name[e], tier[e]  one array per era position e (the region's "eras"): index into
+                    names, and display tier 0 (capital) .. 4; NO_TIER = hidden
+
+An optional importance column (e.g. population; higher wins) ranks cities
+within a tier and is carried into the table as importance.
+
+build_search_index() adds the place-name search index: every era's names,
+diacritic-folded, keyed by each word start and sorted so the page can find
+all matches for a typed prefix with one binary search.
+
+build_city_clusters() adds the marker clusters: per era, the cities grouped
+for each zoom level so the page draws one marker per cluster.
+"""
+import csv
+import os
+import re
+import unicodedata
+
+import timeline
+from generate_geodata import project_px0
+
+ROOT_DIR = os.path.dirname(__file__)
+CITIES_PATH = os.path.join(ROOT_DIR, "cities.csv")
+
+COORD_SCALE = 1000
+NO_TIER = 255
+
+# Clusters are built for zooms min_zoom..CLUSTER_MAX_ZOOM; deeper zooms show
+# every city. Two markers closer than CLUSTER_RADIUS_PX at a zoom merge.
+CLUSTER_MAX_ZOOM = 9
+CLUSTER_RADIUS_PX = 80
+
+
+def max_tier_for_zoom(zoom):
+    # Least important tier a marker may have at a zoom: capitals below zoom
+    # 5, one more tier per zoom in, every tier from zoom 8
+    return min(max(zoom - 4, 0), 4)
+
+
+def read_cities(path=CITIES_PATH):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def build_city_table(rows, eras=timeline.ERAS):
+    names = []
+    name_ids = {}
+    table = {"ids": [], "lat": [], "lng": [], "names": names,
+             "name": [[] for _ in eras], "tier": [[] for _ in eras]}
+    for row in rows:
+        table["ids"].append(row["id"])
+        table["lat"].append(round(float(row["lat"]) * COORD_SCALE))
+        table["lng"].append(round(float(row["lng"]) * COORD_SCALE))
+        for e, era in enumerate(eras):
+            name = row.get(f"name_{era}", "")
+            tier = row.get(f"tier_{era}", "")
+            if name not in name_ids:
+                name_ids[name] = len(names)
+                names.append(name)
+            table["name"][e].append(name_ids[name])
+            table["tier"][e].append(int(tier) if tier != "" and name else NO_TIER)
+    if any(row.get("importance") for row in rows):
+        table["importance"] = [float(row.get("importance") or 0) for row in rows]
+    return table
+
+
+def load_city_table(path=CITIES_PATH, eras=timeline.ERAS):
+    return build_city_table(read_cities(path), eras)
+
+
+# =============================================
+# SEARCH INDEX
+# =============================================
+
+def fold_name(name):
+    # Must match foldName() in the page: strip diacritics, lowercase, and
+    # collapse punctuation/hyphens to single spaces ("Kzyl-Orda" -> "kzyl orda")
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return re.sub(r"[\W_]+", " ", name.lower()).strip()
+
+
+def build_search_index(table, eras=timeline.ERAS):
+    # keys: sorted unique folded keys; postings for keys[k] are
+    # start[k]..start[k+1] in the parallel city/name/eras columns, where eras
+    # is a bitmask over era positions in which that city carried the name
+    postings = {}
+    for e in range(len(eras)):
+        for city, (name_id, tier) in enumerate(zip(table["name"][e], table["tier"][e])):
+            if tier == NO_TIER or not table["names"][name_id]:
+                continue
+            words = fold_name(table["names"][name_id]).split(" ")
+            for i in range(len(words)):
+                entry = postings.setdefault(" ".join(words[i:]), {})
+                entry[(city, name_id)] = entry.get((city, name_id), 0) | (1 << e)
+    index = {"keys": [], "start": [0], "city": [], "name": [], "eras": []}
+    for key in sorted(postings):
+        index["keys"].append(key)
+        for (city, name_id), mask in sorted(postings[key].items()):
+            index["city"].append(city)
+            index["name"].append(name_id)
+            index["eras"].append(mask)
+        index["start"].append(len(index["city"]))
+    return index
+
+
+# =============================================
+# MARKER CLUSTERS
+# =============================================
+
+def _cluster_level(clusters, px, py, radius):
+    # Greedy radius clustering over a grid of radius-sized cells: clusters
+    # arrive most important first, so each one either joins the nearest
+    # earlier representative within radius (looked up in the 3x3 cells
+    # around it) or becomes a representative itself
+    grid = {}
+    out = []
+    for rep, count in clusters:
+        x, y = px[rep], py[rep]
+        cx, cy = int(x // radius), int(y // radius)
+        best, best_d = None, radius * radius
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in grid.get((gx, gy), ()):
+                    d = (px[out[j][0]] - x) ** 2 + (py[out[j][0]] - y) ** 2
+                    if d < best_d:
+                        best, best_d = j, d
+        if best is None:
+            grid.setdefault((cx, cy), []).append(len(out))
+            out.append([rep, count])
+        else:
+            out[best][1] += count
+    return out
+
+
+def build_city_clusters(table, min_zoom, max_zoom=CLUSTER_MAX_ZOOM, radius=CLUSTER_RADIUS_PX,
+                        eras=timeline.ERAS):
+    # levels[e][z - min_zoom] for z in min_zoom..max_zoom + 1: the clusters
+    # shown at zoom z in era position e as parallel "city" (representative)
+    # and "count" columns, most important first. Built bottom-up, so every
+    # cluster is a union of clusters one zoom deeper. A cluster is only shown
+    # while its representative's tier is within max_tier_for_zoom, so
+    # isolated minor towns wait for their zoom rather than standing alone.
+    # The last level is every shown city (no count column); a level
+    # identical to the next deeper one is stored as null.
+    n = len(table["ids"])
+    lat = [v / COORD_SCALE for v in table["lat"]]
+    lng = [v / COORD_SCALE for v in table["lng"]]
+    px, py = project_px0(lng, lat) if n else ([], [])
+    importance = table.get("importance", [0] * n)
+    levels = []
+    for e in range(len(eras)):
+        tiers = table["tier"][e]
+        shown = sorted((i for i in range(n) if tiers[i] != NO_TIER),
+                       key=lambda i: (tiers[i], -importance[i], i))
+        clusters = [[i, 1] for i in shown]
+        deeper = {"city": shown, "count": [1] * len(shown)}
+        era_levels = [{"city": shown}]
+        for z in range(max_zoom, min_zoom - 1, -1):
+            scale = 2 ** z
+            # Hidden clusters still merge, so the counts above cover them
+            clusters = _cluster_level(clusters, [x * scale for x in px], [y * scale for y in py], radius)
+            cap = max_tier_for_zoom(z)
+            visible = [c for c in clusters if tiers[c[0]] <= cap]
+            level = {"city": [c[0] for c in visible], "count": [c[1] for c in visible]}
+            era_levels.append(None if level == deeper else level)
+            deeper = level
+        levels.append(era_levels[::-1])
+    return {"minZoom": min_zoom, "maxZoom": max_zoom, "levels": levels}
@@ -1,81 +1,178 @@
 #!/usr/bin/env python3
 """
 STEP 1: Generate geodata.json with modern borders, neighbor borders,
-and historical approximate polygons for 1900, 1920, 1924 eras.
+and historical approximate polygons for 1900, 1920, 1924 eras, plus
+vertex-matched morph rings for animating between timeline intervals, the
+change set the page applies at each interval boundary, delta-encoded
+shoreline series for water bodies that change over time (the Aral Sea), and
+per-entity metadata (geodesic area, bbox, label anchor, vertex count).
+With --mercator the drawn geometry is emitted pre-projected (see
+project_output).
+
+--region picks a profile from regions.py (default central-asia); with
+--cache-dir the loaded country geometries are shared with other builds
+through an on-disk cache (see build_regions.py). --qa-report / --qa-fail
+run the topology checks in topology_qa.py on the result.
 """
+import argparse
+import hashlib
 import json
 import os
+import sys
+import numpy as np
+import shapely
 from shapely.geometry import shape, box, mapping, Polygon, MultiPolygon
-from shapely.ops import unary_union
+from shapely.ops import polylabel, unary_union
 from shapely.validation import make_valid
 
+import regions
+import timeline
+from profiling import NULL_PROFILER, Profiler
+
 ROOT_DIR = os.path.dirname(__file__)
 COUNTRIES_DIR = os.path.join(ROOT_DIR, "node_modules", "world-geojson", "countries")
-OUTPUT_PATH = os.path.join(ROOT_DIR, "geodata.json")
-
-CA_COUNTRIES = ["kazakhstan", "uzbekistan", "turkmenistan", "kyrgyzstan", "tajikistan"]
-CA_CODES = {"kazakhstan": "KZ", "uzbekistan": "UZ", "turkmenistan": "TM",
-            "kyrgyzstan": "KG", "tajikistan": "TJ"}
 
-NEIGHBOR_COUNTRIES = {"russia": "RU", "china": "CN", "iran": "IR",
-                      "afghanistan": "AF", "pakistan": "PK", "mongolia": "MN",
-                      "azerbaijan": "AZ", "georgia": "GE"}
+# The default (Central Asia) profile; other regions come from regions.py
+DEFAULT_REGION = regions.get_region()
+OUTPUT_PATH = DEFAULT_REGION["geodata"]
+CA_CODES = DEFAULT_REGION["countries"]
+CA_COUNTRIES = list(CA_CODES)
+NEIGHBOR_COUNTRIES = DEFAULT_REGION["neighbors"]
+CLIP_BOX = box(*DEFAULT_REGION["clip_box"])
+
+
+def _cache_path(cache_dir, source):
+    # Keyed on the source file's path, size and mtime so an updated
+    # world-geojson never serves a stale geometry
+    st = os.stat(source)
+    key = f"{os.path.abspath(source)}:{st.st_size}:{st.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(source))[0]}-{digest}.wkb")
+
+
+def load_country(name, prof=NULL_PROFILER, countries_dir=None, cache_dir=None):
+    path = os.path.join(countries_dir or COUNTRIES_DIR, f"{name}.json")
+    cached = _cache_path(cache_dir, path) if cache_dir else None
+    if cached and os.path.exists(cached):
+        with prof.stage("cache_load", name) as rec:
+            with open(cached, "rb") as f:
+                wkb = f.read()
+            rec["bytes_in"] = len(wkb)
+            return shapely.from_wkb(wkb)
+    with prof.stage("load", name) as rec:
+        with open(path) as f:
+            raw = f.read()
+        data = json.loads(raw)
+        rec["bytes_in"] = len(raw)
+    with prof.stage("make_valid", name) as rec:
+        if data["type"] == "FeatureCollection":
+            geoms = [make_valid(shape(feat["geometry"])) for feat in data["features"]]
+            merged = unary_union(geoms)
+        else:
+            merged = make_valid(shape(data["geometry"]))
+        merged = make_valid(merged)
+        rec["vertices_out"] = int(shapely.get_num_coordinates(merged))
+    if cached:
+        # Written under a temporary name and renamed, so concurrent builds
+        # never read a partial file
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(shapely.to_wkb(merged))
+        os.replace(tmp, cached)
+    return merged
+
+
+def simplify_and_map(geom, tolerance, prof=NULL_PROFILER, entity=None):
+    with prof.stage("simplify", entity) as rec:
+        s = geom.simplify(tolerance, preserve_topology=True)
+        s = make_valid(s)
+        mapped = mapping(s)
+        if prof.enabled:
+            rec["vertices_in"] = int(shapely.get_num_coordinates(geom))
+            rec["vertices_out"] = int(shapely.get_num_coordinates(s))
+            rec["bytes_out"] = len(json.dumps(mapped))
+    return mapped
+
+
+def load_modern(prof=NULL_PROFILER, countries_dir=None, region=DEFAULT_REGION, cache_dir=None):
+    # Load all modern borders of the region's core countries
+    print("Loading modern borders...")
+    modern = {}
+    for name, code in region["countries"].items():
+        geom = load_country(name, prof, countries_dir, cache_dir)
+        modern[code] = geom
+        print(f"  {code}: loaded")
+    return modern
 
-CLIP_BOX = box(44, 28, 92, 57)
 
+def drawn_core(modern_geo, historical):
+    """Union of every core geometry the page draws, modern and historical."""
+    geoms = [shape(g) for g in modern_geo.values()]
+    geoms += [shape(e["geometry"]) for era in historical.values() for e in era.values()]
+    return make_valid(unary_union(geoms))
 
-def load_country(name):
-    path = os.path.join(COUNTRIES_DIR, f"{name}.json")
-    with open(path) as f:
-        data = json.load(f)
-    if data["type"] == "FeatureCollection":
-        geoms = [make_valid(shape(feat["geometry"])) for feat in data["features"]]
-        merged = unary_union(geoms)
-    else:
-        merged = make_valid(shape(data["geometry"]))
-    return make_valid(merged)
 
+def polygonal(geom):
+    if geom.geom_type in ("Polygon", "MultiPolygon"):
+        return geom
+    return unary_union([g for g in shapely.get_parts(geom) if g.geom_type in ("Polygon", "MultiPolygon")])
 
-def simplify_and_map(geom, tolerance):
-    s = geom.simplify(tolerance, preserve_topology=True)
-    s = make_valid(s)
-    return mapping(s)
 
+def resolve_overlaps(geoms):
+    # {code: geometry} with each geometry minus the ones before it: shapes
+    # simplified one at a time overlap along their shared borders, and the
+    # overlap goes to whichever comes first
+    out, taken = {}, None
+    for code, geom in geoms.items():
+        out[code] = geom if taken is None else polygonal(make_valid(geom.difference(taken)))
+        taken = geom if taken is None else taken.union(geom)
+    return out
 
-def main():
-    # Load all modern CA borders
-    print("Loading modern borders...")
-    modern = {}
-    for name in CA_COUNTRIES:
-        code = CA_CODES[name]
-        geom = load_country(name)
-        modern[code] = geom
-        print(f"  {code}: loaded")
-
-    # Process modern CA borders (tolerance=0.015)
-    modern_geo = {}
-    for code, geom in modern.items():
-        modern_geo[code] = simplify_and_map(geom, 0.015)
-        print(f"  {code}: simplified")
 
-    # Process neighbors
+def process_neighbors(prof=NULL_PROFILER, countries_dir=None, region=DEFAULT_REGION, cache_dir=None,
+                      core=None):
+    # Neighbours are simplified more coarsely than the core, so their edges
+    # cross into it; trimming by `core` keeps any area from being drawn twice.
     print("Loading and processing neighbors...")
     neighbors_geo = {}
     large_neighbors = {"russia", "china"}
-    for name, code in NEIGHBOR_COUNTRIES.items():
-        geom = load_country(name)
+    clip_box = box(*region["clip_box"])
+    for name, code in region["neighbors"].items():
+        geom = load_country(name, prof, countries_dir, cache_dir)
         tol = 0.08 if name in large_neighbors else 0.04
-        simplified = geom.simplify(tol, preserve_topology=True)
-        clipped = make_valid(simplified).intersection(CLIP_BOX)
+        with prof.stage("clip", code) as rec:
+            simplified = geom.simplify(tol, preserve_topology=True)
+            clipped = make_valid(simplified).intersection(clip_box)
+            if core is not None:
+                clipped = polygonal(make_valid(clipped.difference(core)))
+            rec["vertices_in"] = int(shapely.get_num_coordinates(geom))
+            rec["vertices_out"] = int(shapely.get_num_coordinates(clipped))
         if clipped.is_empty:
             print(f"  WARNING: {name} empty after clip!")
             continue
         neighbors_geo[code] = mapping(make_valid(clipped))
         print(f"  {code}: done (tol={tol})")
+    return neighbors_geo
 
+
+def overlay_map(geom, prof=NULL_PROFILER, entity=None):
+    # Overlays are cut from the already simplified modern borders, so they
+    # share those edges exactly; simplifying them again would pull shared
+    # edges apart into slivers and overlaps
+    with prof.stage("repair", entity) as rec:
+        mapped = mapping(make_valid(geom))
+        if prof.enabled:
+            rec["vertices_out"] = int(shapely.get_num_coordinates(geom))
+            rec["bytes_out"] = len(json.dumps(mapped))
+    return mapped
+
+
+def build_historical(modern, prof=NULL_PROFILER):
     # =============================================
     # HISTORICAL POLYGONS
     # =============================================
+    # modern: the simplified, overlap-free modern borders (build_geodata)
     print("Generating historical polygons...")
 
     KZ = modern["KZ"]
@@ -94,57 +191,68 @@ def main():
     # Kulyab, Karategin, Darvaz (most of modern TJ south of Khujand)
     # Northern boundary ~40.2N in UZ (below Samarkand which was Russian),
     # but extends through all of TJ except the very north
-    bukhara_uz_box = box(63, 36.5, 70, 40.3)
-    bukhara_uz_part = make_valid(UZ.intersection(bukhara_uz_box))
-
-    # Tajikistan part: everything except the Khujand (Sughd) northern strip
-    tj_north_box = box(68, 40.0, 72, 41.5)
-    tj_north = make_valid(TJ.intersection(tj_north_box))
-    bukhara_tj_part = make_valid(TJ.difference(tj_north_box))
-
-    bukhara_emirate = make_valid(unary_union([bukhara_uz_part, bukhara_tj_part]))
-    # Clean up any slivers
-    if bukhara_emirate.area < 0.01:
-        print("    WARNING: Bukhara emirate very small, adjusting...")
-        bukhara_uz_box = box(62, 36, 71, 40.5)
+    with prof.stage("overlay", "BUKHARA") as rec:
+        bukhara_uz_box = box(63, 36.5, 70, 40.3)
         bukhara_uz_part = make_valid(UZ.intersection(bukhara_uz_box))
-        bukhara_tj_part = make_valid(TJ.difference(box(68, 40.2, 72, 42)))
+
+        # Tajikistan part: everything except the Khujand (Sughd) northern strip
+        tj_north_box = box(68, 40.0, 72, 41.5)
+        tj_north = make_valid(TJ.intersection(tj_north_box))
+        bukhara_tj_part = make_valid(TJ.difference(tj_north_box))
+
         bukhara_emirate = make_valid(unary_union([bukhara_uz_part, bukhara_tj_part]))
+        # Clean up any slivers
+        if bukhara_emirate.area < 0.01:
+            print("    WARNING: Bukhara emirate very small, adjusting...")
+            bukhara_uz_box = box(62, 36, 71, 40.5)
+            bukhara_uz_part = make_valid(UZ.intersection(bukhara_uz_box))
+            bukhara_tj_part = make_valid(TJ.difference(box(68, 40.2, 72, 42)))
+            bukhara_emirate = make_valid(unary_union([bukhara_uz_part, bukhara_tj_part]))
+        rec["vertices_out"] = int(shapely.get_num_coordinates(bukhara_emirate))
 
     print(f"    Bukhara emirate area: {bukhara_emirate.area:.2f}")
 
     # Khanate of Khiva: NW Uzbekistan (Karakalpakstan + Khorezm) + strip of N Turkmenistan
-    khiva_box = box(55.5, 40.0, 62.5, 44.5)
-    khiva_uz = make_valid(UZ.intersection(khiva_box))
-    khiva_tm_box = box(56, 40, 62, 42.5)
-    khiva_tm = make_valid(TM.intersection(khiva_tm_box))
-    khiva_khanate = make_valid(unary_union([khiva_uz, khiva_tm]))
+    with prof.stage("overlay", "KHIVA") as rec:
+        khiva_box = box(55.5, 40.0, 62.5, 44.5)
+        khiva_uz = make_valid(UZ.intersection(khiva_box))
+        khiva_tm_box = box(56, 40, 62, 42.5)
+        khiva_tm = make_valid(TM.intersection(khiva_tm_box))
+        khiva_khanate = make_valid(unary_union([khiva_uz, khiva_tm]))
+        rec["vertices_out"] = int(shapely.get_num_coordinates(khiva_khanate))
     print(f"    Khiva khanate area: {khiva_khanate.area:.2f}")
 
     # Semirechye (SE Kazakhstan) — part of Russian Turkestan
-    semirechye_box = box(67, 40, 81, 46)
-    semirechye = make_valid(KZ.intersection(semirechye_box))
+    with prof.stage("overlay", "SEMIRECHYE") as rec:
+        semirechye_box = box(67, 40, 81, 46)
+        semirechye = make_valid(KZ.intersection(semirechye_box))
+        rec["vertices_out"] = int(shapely.get_num_coordinates(semirechye))
     print(f"    Semirechye area: {semirechye.area:.2f}")
 
     # Russian Turkestan: KG + (TM minus Khiva area) + (UZ minus Bukhara minus Khiva)
     #   + N Tajikistan (Khujand) + Semirechye
-    tm_minus_khiva = make_valid(TM.difference(khiva_khanate))
-    uz_minus_bukhara_khiva = make_valid(UZ.difference(bukhara_emirate).difference(khiva_khanate))
-
-    russian_turkestan = make_valid(unary_union([
-        KG, tm_minus_khiva, uz_minus_bukhara_khiva, tj_north, semirechye
-    ]))
+    with prof.stage("overlay", "TURKESTAN") as rec:
+        tm_minus_khiva = make_valid(TM.difference(khiva_khanate))
+        uz_minus_bukhara_khiva = make_valid(UZ.difference(bukhara_emirate).difference(khiva_khanate))
+
+        russian_turkestan = make_valid(unary_union([
+            KG, tm_minus_khiva, uz_minus_bukhara_khiva, tj_north, semirechye
+        ]))
+        rec["vertices_out"] = int(shapely.get_num_coordinates(russian_turkestan))
     print(f"    Russian Turkestan area: {russian_turkestan.area:.2f}")
 
     # Kazakh Steppe: Kazakhstan minus Semirechye
-    kazakh_steppe = make_valid(KZ.difference(semirechye))
+    with prof.stage("overlay", "STEPPE") as rec:
+        kazakh_steppe = make_valid(KZ.difference(semirechye))
+        rec["vertices_out"] = int(shapely.get_num_coordinates(kazakh_steppe))
     print(f"    Kazakh Steppe area: {kazakh_steppe.area:.2f}")
 
     # Verify coverage: all 4 entities should roughly cover all_ca
-    hist_1900_union = make_valid(unary_union([
-        russian_turkestan, bukhara_emirate, khiva_khanate, kazakh_steppe
-    ]))
-    coverage = hist_1900_union.area / all_ca.area * 100
+    with prof.stage("coverage", "1900"):
+        hist_1900_union = make_valid(unary_union([
+            russian_turkestan, bukhara_emirate, khiva_khanate, kazakh_steppe
+        ]))
+        coverage = hist_1900_union.area / all_ca.area * 100
     print(f"    1900 coverage: {coverage:.1f}% of total CA area")
 
     historical = {}
@@ -152,25 +260,25 @@ def main():
     # 1900
     historical["1900"] = {
         "TURKESTAN": {
-            "geometry": simplify_and_map(russian_turkestan, 0.025),
+            "geometry": overlay_map(russian_turkestan, prof, "1900/TURKESTAN"),
             "color": "#8B4513",
             "name": "Russian Turkestan",
             "subtitle": "Governor-Generalship, est. 1867"
         },
         "BUKHARA": {
-            "geometry": simplify_and_map(bukhara_emirate, 0.025),
+            "geometry": overlay_map(bukhara_emirate, prof, "1900/BUKHARA"),
             "color": "#DAA520",
             "name": "Emirate of Bukhara",
             "subtitle": "Russian Protectorate since 1868"
         },
         "KHIVA": {
-            "geometry": simplify_and_map(khiva_khanate, 0.025),
+            "geometry": overlay_map(khiva_khanate, prof, "1900/KHIVA"),
             "color": "#4682B4",
             "name": "Khanate of Khiva",
             "subtitle": "Russian Protectorate since 1873"
         },
         "STEPPE": {
-            "geometry": simplify_and_map(kazakh_steppe, 0.025),
+            "geometry": overlay_map(kazakh_steppe, prof, "1900/STEPPE"),
             "color": "#CD853F",
             "name": "Kazakh Steppe",
             "subtitle": "Russian Empire \u2014 Steppe regions"
@@ -181,25 +289,25 @@ def main():
     print("  1920: Soviet Takeover...")
     historical["1920"] = {
         "TURKESTAN_ASSR": {
-            "geometry": simplify_and_map(russian_turkestan, 0.025),
+            "geometry": overlay_map(russian_turkestan, prof, "1920/TURKESTAN_ASSR"),
             "color": "#C0392B",
             "name": "Turkestan ASSR",
             "subtitle": "Autonomous SSR within RSFSR, est. 1918"
         },
         "BUKHARA_PSR": {
-            "geometry": simplify_and_map(bukhara_emirate, 0.025),
+            "geometry": overlay_map(bukhara_emirate, prof, "1920/BUKHARA_PSR"),
             "color": "#E74C3C",
             "name": "Bukharan PSR",
             "subtitle": "People's Soviet Republic, est. 1920"
         },
         "KHOREZM_PSR": {
-            "geometry": simplify_and_map(khiva_khanate, 0.025),
+            "geometry": overlay_map(khiva_khanate, prof, "1920/KHOREZM_PSR"),
             "color": "#F39C12",
             "name": "Khorezm PSR",
             "subtitle": "People's Soviet Republic, est. 1920"
         },
         "KIRGHIZ_ASSR": {
-            "geometry": simplify_and_map(kazakh_steppe, 0.025),
+            "geometry": overlay_map(kazakh_steppe, prof, "1920/KIRGHIZ_ASSR"),
             "color": "#E67E22",
             "name": "Kirghiz ASSR",
             "subtitle": "Later renamed Kazakh ASSR, est. 1920"
@@ -209,7 +317,9 @@ def main():
     # 1924: National Delimitation
     print("  1924: National Delimitation...")
     # Uzbek SSR = modern UZ + modern TJ combined
-    uzbek_ssr_1924 = make_valid(unary_union([UZ, TJ]))
+    with prof.stage("overlay", "UZ_SSR") as rec:
+        uzbek_ssr_1924 = make_valid(unary_union([UZ, TJ]))
+        rec["vertices_out"] = int(shapely.get_num_coordinates(uzbek_ssr_1924))
     # Turkmen SSR = modern TM
     turkmen_ssr_1924 = TM
     # Kara-Kirghiz AO = modern KG
@@ -219,25 +329,25 @@ def main():
 
     historical["1924"] = {
         "UZ_SSR": {
-            "geometry": simplify_and_map(uzbek_ssr_1924, 0.015),
+            "geometry": overlay_map(uzbek_ssr_1924, prof, "1924/UZ_SSR"),
             "color": "#81B29A",
             "name": "Uzbek SSR",
             "subtitle": "Est. Oct 27, 1924 \u00b7 Includes Tajik ASSR"
         },
         "TM_SSR": {
-            "geometry": simplify_and_map(turkmen_ssr_1924, 0.015),
+            "geometry": overlay_map(turkmen_ssr_1924, prof, "1924/TM_SSR"),
             "color": "#F2CC8F",
             "name": "Turkmen SSR",
             "subtitle": "Est. Oct 27, 1924"
         },
         "KARA_KIRGHIZ": {
-            "geometry": simplify_and_map(kara_kirghiz_1924, 0.015),
+            "geometry": overlay_map(kara_kirghiz_1924, prof, "1924/KARA_KIRGHIZ"),
             "color": "#3D85C6",
             "name": "Kara-Kirghiz AO",
             "subtitle": "Autonomous Oblast within RSFSR"
         },
         "KZ_ASSR": {
-            "geometry": simplify_and_map(kazakh_assr_1924, 0.015),
+            "geometry": overlay_map(kazakh_assr_1924, prof, "1924/KZ_ASSR"),
             "color": "#E07A5F",
             "name": "Kazakh ASSR",
             "subtitle": "Autonomous SSR within RSFSR"
@@ -245,6 +355,390 @@ def main():
     }
 
     # 1936, 1991, 2024 use modern borders — stored as modern_geo already
+    return historical
+
+
+# =============================================
+# ERA TRANSITION MORPHS
+# =============================================
+
+MORPH_POINTS = 96
+MORPH_PRECISION = 3
+
+
+def main_ring(geom):
+    # Exterior of the largest polygon part; small islands and holes are not morphed
+    polys = [g for g in getattr(geom, "geoms", [geom]) if isinstance(g, Polygon)]
+    if not polys:
+        return None
+    return np.asarray(max(polys, key=lambda p: p.area).exterior.coords)[:-1]
+
+
+def resample_ring(ring, n):
+    # n points evenly spaced by arc length along a closed ring (no repeated
+    # closing vertex), counter-clockwise
+    ring = np.asarray(ring, dtype=float)
+    if shapely.LinearRing(ring).is_ccw is False:
+        ring = ring[::-1]
+    closed = np.vstack([ring, ring[:1]])
+    seg = np.hypot(*np.diff(closed, axis=0).T)
+    dist = np.concatenate([[0], np.cumsum(seg)])
+    targets = np.linspace(0, dist[-1], n, endpoint=False)
+    return np.column_stack([np.interp(targets, dist, closed[:, 0]),
+                            np.interp(targets, dist, closed[:, 1])])
+
+
+def align_ring(ref, ring):
+    # Cyclic shift of ring (same length as ref) that minimises the summed
+    # squared distance to ref, so vertex i travels the shortest way
+    shifts = np.stack([np.roll(ring, -k, axis=0) for k in range(len(ring))])
+    cost = ((shifts - ref) ** 2).sum(axis=(1, 2))
+    return shifts[int(np.argmin(cost))]
+
+
+def segment_geometries(output, index, seg, era_entities=timeline.ERA_ENTITIES):
+    # {(era, key): shapely geometry} for the entities alive in interval seg
+    geoms = {}
+    for i in index["segments"][seg]:
+        era, key = index["entities"][i][:2]
+        hist = output["historical"].get(str(era), {}).get(key)
+        if hist:
+            geoms[(era, key)] = shape(hist["geometry"])
+        elif key in era_entities.get(era, {}):
+            code = era_entities[era][key]["code"]
+            if code in output["modern"]:
+                geoms[(era, key)] = shape(output["modern"][code])
+    return geoms
+
+
+def match_entities(before, after):
+    # Pair every entity on each side with its largest-overlap counterpart,
+    # so merges (Bukhara + Khiva -> Uzbek SSR) and splits both animate
+    def best(geom, candidates):
+        scored = [(geom.intersection(g).area, ref) for ref, g in candidates.items()]
+        return max(scored)[1] if scored and max(scored)[0] > 0 else None
+    pairs = []
+    for ref, geom in after.items():
+        src = best(geom, before)
+        if src:
+            pairs.append((src, ref))
+    for ref, geom in before.items():
+        dst = best(geom, after)
+        if dst and (ref, dst) not in pairs:
+            pairs.append((ref, dst))
+    return pairs
+
+
+def build_morphs(output, prof=NULL_PROFILER, n=MORPH_POINTS, region=DEFAULT_REGION):
+    # One entry per timeline boundary year whose borders change: vertex-matched
+    # ring pairs (n points each) the page lerps between. "from"/"to" are flat
+    # [lng, lat, ...] arrays, one ring of n points per pair.
+    print("Precomputing era transition morphs...")
+    index = regions.interval_index(region)
+    morphs = {}
+    for seg in range(len(index["segments"]) - 1):
+        year = index["boundaries"][seg + 1]
+        with prof.stage("morph", str(year)) as rec:
+            before = segment_geometries(output, index, seg, region["era_entities"])
+            after = segment_geometries(output, index, seg + 1, region["era_entities"])
+            pairs, src, dst = [], [], []
+            for a, b in match_entities(before, after):
+                ra, rb = main_ring(before[a]), main_ring(after[b])
+                if ra is None or rb is None:
+                    continue
+                ra = resample_ring(ra, n)
+                rb = align_ring(ra, resample_ring(rb, n))
+                pairs.append([a[0], a[1], b[0], b[1]])
+                src.append(ra)
+                dst.append(rb)
+            if not pairs or all(np.allclose(s, d) for s, d in zip(src, dst)):
+                continue
+            morphs[str(year)] = {
+                "n": n,
+                "pairs": pairs,
+                "from": np.round(np.concatenate(src).ravel(), MORPH_PRECISION).tolist(),
+                "to": np.round(np.concatenate(dst).ravel(), MORPH_PRECISION).tolist(),
+            }
+            rec["vertices_out"] = 2 * n * len(pairs)
+        print(f"  {year}: {len(pairs)} ring pairs")
+    return morphs
+
+
+# =============================================
+# ERA CHANGE SETS
+# =============================================
+# What the page has to touch at each timeline boundary. Entities whose
+# geometry carries over unchanged (1936 -> 1991 -> 2024 reuse the modern
+# borders) keep their drawn polygon and are only restyled or relabelled;
+# everything else is removed or drawn anew.
+
+LABEL_FIELDS = ["name", "subtitle", "center"]
+
+
+def segment_records(output, index, seg, era_entities=timeline.ERA_ENTITIES):
+    # {(era, key): (GeoJSON geometry, display fields)} for the entities alive
+    # in interval seg; like segment_geometries, without parsing the geometry
+    records = {}
+    for i in index["segments"][seg]:
+        era, key = index["entities"][i][:2]
+        hist = output["historical"].get(str(era), {}).get(key)
+        if hist:
+            records[(era, key)] = (hist["geometry"], {"color": hist["color"], "name": hist["name"],
+                                                      "subtitle": hist["subtitle"], "center": None})
+        elif key in era_entities.get(era, {}):
+            meta = era_entities[era][key]
+            if meta["code"] in output["modern"]:
+                records[(era, key)] = (output["modern"][meta["code"]], meta)
+    return records
+
+
+def build_changes(output, region=DEFAULT_REGION):
+    # One entry per timeline boundary year: "keep" lists [era_a, key_a,
+    # era_b, key_b, fields] for entities drawn with identical geometry on
+    # both sides, fields naming what the page must update ("style" for a
+    # new colour, "label" for new label text or position); "add" and
+    # "remove" the [era, key] entities whose polygons appear or go away
+    print("Diffing era change sets...")
+    index = regions.interval_index(region)
+    changes = {}
+    for seg in range(len(index["segments"]) - 1):
+        year = index["boundaries"][seg + 1]
+        before = segment_records(output, index, seg, region["era_entities"])
+        after = segment_records(output, index, seg + 1, region["era_entities"])
+        keep, add = [], []
+        for ref, (geom, meta) in after.items():
+            # The same entity on both sides first, else any identical border
+            src = ref if ref in before and before[ref][0] == geom else \
+                next((r for r, (g, _) in before.items() if g == geom), None)
+            if src is None:
+                add.append(list(ref))
+                continue
+            old = before.pop(src)[1]
+            fields = []
+            if old["color"] != meta["color"]:
+                fields.append("style")
+            # Historical labels are placed by key on the page
+            if src[1] != ref[1] or any(old.get(f) != meta.get(f) for f in LABEL_FIELDS):
+                fields.append("label")
+            keep.append([src[0], src[1], ref[0], ref[1], fields])
+        changes[str(year)] = {"keep": keep, "add": add, "remove": [list(r) for r in before]}
+        print(f"  {year}: {len(keep)} kept ({sum(1 for k in keep if k[4])} restyled/relabelled), "
+              f"{len(add)} redrawn, {len(before)} removed")
+    return changes
+
+
+# =============================================
+# WATER BODIES
+# =============================================
+# Dated shoreline polygons (a GeoJSON FeatureCollection, one feature per
+# body and year with "body", "name" and "year" properties) become one ring
+# of WATER_POINTS vertices per year, each aligned to the year before. Only
+# the first ring is stored in full; every later year is the integer vertex
+# offsets from the previous one, which stay small as a shoreline recedes.
+
+WATER_POINTS = 64
+WATER_SCALE = 1000  # degrees -> integer units (~100 m)
+
+
+def load_water_series(path):
+    # {body: {"name": name, "years": {year: geometry}}}
+    with open(path) as f:
+        data = json.load(f)
+    bodies = {}
+    for feat in data["features"]:
+        props = feat["properties"]
+        body = bodies.setdefault(props["body"], {"name": props.get("name", props["body"]), "years": {}})
+        body["years"][int(props["year"])] = make_valid(shape(feat["geometry"]))
+    return bodies
+
+
+def build_water(path, prof=NULL_PROFILER, n=WATER_POINTS):
+    # {"n", "scale", "bodies": {body: {"name", "years", "base", "deltas"}}}:
+    # base is the first year's ring as flat [lng, lat, ...] integers (degrees
+    # * scale) and deltas[i] what to add to get year i + 1 from year i. A
+    # body's largest polygon per year is kept (islands are dropped).
+    water = {"n": n, "scale": WATER_SCALE, "bodies": {}}
+    if not path:
+        return water
+    if not os.path.exists(path):
+        print(f"  Water series {path} not found, no shoreline layer")
+        return water
+    print("Encoding water body shorelines...")
+    for body, series in load_water_series(path).items():
+        with prof.stage("water", body) as rec:
+            years, rings = [], []
+            for year in sorted(series["years"]):
+                ring = main_ring(series["years"][year])
+                if ring is None:
+                    continue
+                ring = resample_ring(ring, n)
+                if rings:
+                    ring = align_ring(rings[-1], ring)
+                years.append(year)
+                rings.append(ring)
+            if not rings:
+                continue
+            # Quantize first so the deltas add up to exactly the rounded rings
+            ints = np.round(np.array(rings) * WATER_SCALE).astype(int).reshape(len(rings), -1)
+            water["bodies"][body] = {
+                "name": series["name"],
+                "years": years,
+                "base": ints[0].tolist(),
+                "deltas": np.diff(ints, axis=0).tolist(),
+            }
+            rec["vertices_out"] = n * len(years)
+        # Against drawing from a stored ring per dated year / per timeline year
+        encoded = len(json.dumps(water["bodies"][body]))
+        full = len(json.dumps([np.round(r, 3).ravel().tolist() for r in rings]))
+        per_year = full / len(years) * (years[-1] - years[0] + 1)
+        print(f"  {series['name']}: {len(years)} shorelines ({years[0]}-{years[-1]}), {encoded/1024:.1f} KB "
+              f"(full rings {full/1024:.1f} KB, a ring per year {per_year/1024:.1f} KB)")
+    return water
+
+
+# =============================================
+# ENTITY METADATA
+# =============================================
+
+EARTH_RADIUS_KM = 6371.0088
+META_FIELDS = ["area_km2", "west", "south", "east", "north", "anchor_lat", "anchor_lng", "vertices"]
+
+
+def geodesic_areas(geoms):
+    # Spherical polygon area (km^2) for an array of geometries at once:
+    # every ring's edges go through one vectorized pass, exteriors add and
+    # holes subtract. Non-polygonal parts contribute nothing.
+    parts, part_geom = shapely.get_parts(geoms, return_index=True)
+    keep = shapely.get_type_id(parts) == 3
+    parts, part_geom = parts[keep], part_geom[keep]
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    exterior = np.r_[True, ring_part[1:] != ring_part[:-1]] if len(rings) else np.zeros(0, bool)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    lng, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    same = coord_ring[1:] == coord_ring[:-1]
+    term = (lng[1:] - lng[:-1]) * (2 + np.sin(lat[:-1]) + np.sin(lat[1:]))
+    ring_area = np.abs(np.bincount(coord_ring[1:][same], term[same], minlength=len(rings)))
+    ring_area = ring_area * (EARTH_RADIUS_KM ** 2 / 2)  # float even when there are no rings
+    signed = np.where(exterior, ring_area, -ring_area)
+    return np.bincount(part_geom[ring_part], signed, minlength=len(geoms))
+
+
+def label_anchor(geom):
+    # Pole of inaccessibility of the largest polygon part: stays inside
+    # concave shapes where the centroid would not
+    polys = [g for g in getattr(geom, "geoms", [geom]) if isinstance(g, Polygon)]
+    if not polys:
+        return geom.representative_point()
+    return polylabel(max(polys, key=lambda p: p.area), tolerance=0.01)
+
+
+def build_metadata(output, prof=NULL_PROFILER):
+    # Per-entity records in META_FIELDS order, computed from the simplified
+    # output geometries so they match exactly what the page draws
+    refs, geoms = [], []
+    for code, g in output["modern"].items():
+        refs.append(("modern", None, code))
+        geoms.append(shape(g))
+    for code, g in output["neighbors"].items():
+        refs.append(("neighbors", None, code))
+        geoms.append(shape(g))
+    for era, entities in output["historical"].items():
+        for key, ent in entities.items():
+            refs.append(("historical", era, key))
+            geoms.append(shape(ent["geometry"]))
+
+    with prof.stage("metadata") as rec:
+        geoms = np.array(geoms, dtype=object)
+        areas = geodesic_areas(geoms)
+        bounds = shapely.bounds(geoms)
+        vertices = shapely.get_num_coordinates(geoms)
+        rec["vertices_in"] = int(vertices.sum())
+
+        meta = {"fields": META_FIELDS, "modern": {}, "neighbors": {}, "historical": {}}
+        for (section, era, key), geom, area, (w, s, e, n), verts in zip(refs, geoms, areas, bounds, vertices):
+            anchor = label_anchor(geom)
+            row = [int(round(area))] + [round(float(v), 3) for v in (w, s, e, n)] + [
+                round(anchor.y, 3), round(anchor.x, 3), int(verts)]
+            target = meta[section] if era is None else meta[section].setdefault(era, {})
+            target[key] = row
+    return meta
+
+
+# =============================================
+# PRE-PROJECTED OUTPUT (--mercator)
+# =============================================
+
+# Base-zoom pixel space ("px0"): Leaflet's EPSG:3857 projection at zoom 0,
+# a 256px-wide world. The page only scales these by 2^zoom, so building
+# layers and zooming never run per-vertex trigonometry.
+MAX_LATITUDE = 85.0511287798
+MERCATOR_PRECISION = 6
+
+
+def project_px0(lng, lat):
+    lat = np.clip(np.asarray(lat, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    x = 256 * (np.asarray(lng, dtype=float) / 360 + 0.5)
+    y = 256 * (0.5 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / (2 * np.pi))
+    return x, y
+
+
+def unproject_px0(x, y):
+    lng = (np.asarray(x, dtype=float) / 256 - 0.5) * 360
+    lat = np.degrees(2 * np.arctan(np.exp((0.5 - np.asarray(y, dtype=float) / 256) * 2 * np.pi)) - np.pi / 2)
+    return lng, lat
+
+
+def _project_coords(coords):
+    x, y = project_px0(coords[:, 0], coords[:, 1])
+    return np.round(np.column_stack([x, y]), MERCATOR_PRECISION)
+
+
+def project_output(output, prof=NULL_PROFILER):
+    # Reprojects every drawn geometry in place; morphs, water and meta stay in degrees
+    def project(geojson):
+        # Rounding can pinch a ring into a self-touch; repair like every other stage
+        return mapping(make_valid(shapely.transform(shape(geojson), _project_coords)))
+
+    with prof.stage("project"):
+        output["modern"] = {code: project(g) for code, g in output["modern"].items()}
+        output["neighbors"] = {code: project(g) for code, g in output["neighbors"].items()}
+        for entities in output["historical"].values():
+            for ent in entities.values():
+                ent["geometry"] = project(ent["geometry"])
+        output["crs"] = "px0"
+
+
+def write_output(output, path, prof=NULL_PROFILER):
+    with prof.stage("serialize") as rec:
+        payload = json.dumps(output)
+        rec["bytes_out"] = len(payload)
+    with prof.stage("write") as rec:
+        with open(path, "w") as f:
+            f.write(payload)
+        rec["bytes_out"] = os.path.getsize(path)
+
+
+def build_geodata(region=DEFAULT_REGION, prof=NULL_PROFILER, countries_dir=None, cache_dir=None,
+                  mercator=False, water_path=None):
+    modern = load_modern(prof, countries_dir, region, cache_dir)
+
+    # Process modern borders (tolerance=0.015)
+    simplified = {}
+    for code, geom in modern.items():
+        simplified[code] = shape(simplify_and_map(geom, 0.015, prof, code))
+        print(f"  {code}: simplified")
+    with prof.stage("resolve_overlaps"):
+        simplified = resolve_overlaps(simplified)
+    modern_geo = {code: mapping(geom) for code, geom in simplified.items()}
+
+    # Only Central Asia has hand-built pre-1936 overlays, cut from the
+    # simplified borders so every era tiles the same ground
+    historical = build_historical(simplified, prof) if region["historical"] else {}
+
+    # Process neighbors, trimmed to what the core entities leave uncovered
+    with prof.stage("core"):
+        core = drawn_core(modern_geo, historical)
+    neighbors_geo = process_neighbors(prof, countries_dir, region, cache_dir, core=core)
 
     # Build output
     output = {
@@ -252,17 +746,80 @@ def main():
         "neighbors": neighbors_geo,
         "historical": historical
     }
-
-    with open(OUTPUT_PATH, "w") as f:
-        json.dump(output, f)
-
-    fsize = os.path.getsize(OUTPUT_PATH)
-    print(f"\nSaved to {OUTPUT_PATH} ({fsize/1024:.1f} KB)")
-    print(f"  Modern: {len(modern_geo)} countries")
-    print(f"  Neighbors: {len(neighbors_geo)} countries")
-    print(f"  Historical periods: {list(historical.keys())}")
-    for period, entities in historical.items():
+    output["morphs"] = build_morphs(output, prof, region=region)
+    with prof.stage("changes"):
+        output["changes"] = build_changes(output, region)
+    output["water"] = build_water(water_path or region["water"], prof)
+    output["meta"] = build_metadata(output, prof)
+    if mercator:
+        project_output(output, prof)
+    output["region"] = region["name"]
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate geodata.json for the timeline map.")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write a JSON stage timing/memory report to PATH")
+    parser.add_argument("--mercator", action="store_true",
+                        help="emit geometry pre-projected to Web Mercator base-zoom pixels")
+    parser.add_argument("--region", default=regions.DEFAULT_REGION, choices=sorted(regions.REGIONS),
+                        help=f"region profile from regions.py (default {regions.DEFAULT_REGION})")
+    parser.add_argument("--cache-dir", metavar="DIR",
+                        help="reuse/store loaded country geometries in DIR")
+    parser.add_argument("--water", metavar="PATH",
+                        help="dated shoreline GeoJSON to encode (default: the region's water series)")
+    parser.add_argument("--qa-report", metavar="PATH",
+                        help="run the topology QA (topology_qa.py) and write its JSON report to PATH")
+    parser.add_argument("--qa-fail", action="store_true",
+                        help="run the topology QA and fail the build when an issue exceeds its tolerance")
+    parser.add_argument("--no-check-budget", action="store_false", dest="check_budget",
+                        help="skip checking the output against budget.json (see check_budget.py)")
+    args = parser.parse_args(argv)
+    prof = Profiler("generate_geodata", enabled=bool(args.profile))
+    region = regions.get_region(args.region)
+
+    output = build_geodata(region, prof, cache_dir=args.cache_dir, mercator=args.mercator,
+                           water_path=args.water)
+    output_path = region["geodata"]
+    write_output(output, output_path, prof)
+
+    fsize = os.path.getsize(output_path)
+    print(f"\nSaved to {output_path} ({fsize/1024:.1f} KB)")
+    print(f"  Region: {region['name']}")
+    print(f"  Modern: {len(output['modern'])} countries")
+    print(f"  Neighbors: {len(output['neighbors'])} countries")
+    print(f"  Historical periods: {list(output['historical'].keys())}")
+    for period, entities in output["historical"].items():
         print(f"    {period}: {list(entities.keys())}")
+    print(f"  Morphs: {list(output['morphs'].keys())}")
+    print(f"  Change sets: {list(output['changes'].keys())}")
+    print(f"  Water bodies: {list(output['water']['bodies'].keys())}")
+    print(f"  Coordinates: {'Web Mercator px (zoom 0)' if args.mercator else 'lng/lat degrees'}")
+
+    qa_ok = True
+    if args.qa_report or args.qa_fail:
+        import topology_qa
+        print()
+        with prof.stage("topology_qa"):
+            report = topology_qa.run_qa(output, region)
+        topology_qa.print_summary(report)
+        if args.qa_report:
+            topology_qa.write_report(report, args.qa_report)
+            print(f"  Report: {args.qa_report}")
+        qa_ok = report["ok"]
+
+    budget_ok = True
+    if args.check_budget:
+        import check_budget
+        print()
+        metrics = check_budget.measure_geodata(output, region, {"generate_geodata": prof.elapsed()})
+        budget_ok = check_budget.gate_metrics(metrics, region)
+
+    if args.profile:
+        prof.write(args.profile)
+    if (args.qa_fail and not qa_ok) or not budget_ok:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -3,26 +3,419 @@
 STEP 2: Generate the complete Central Asia interactive timeline map HTML.
 Reads geodata.json and embeds it. ALL writing via Python file I/O.
 """
+import argparse
+import hashlib
 import json
+import math
 import os
+import sys
+
+import check_budget
+import cities
+import regions
+import snapshots
+import timeline
+from profiling import Profiler
+
 ROOT_DIR = os.path.dirname(__file__)
-GEODATA_PATH = os.path.join(ROOT_DIR, "geodata.json")
-OUTPUT_PATH = os.path.join(ROOT_DIR, "central-asia-map.html")
+DEFAULT_REGION = regions.get_region()
+SW_PATH = os.path.join(ROOT_DIR, "sw.js")
+
+LEAFLET_CSS = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"
+LEAFLET_JS = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
+FONTS_CSS = ("https://fonts.googleapis.com/css2?family=Crimson+Pro:wght@400;600;700"
+             "&family=DM+Sans:wght@400;500;600;700&display=swap")
+TILE_URL = "https://{s}.basemaps.cartocdn.com/rastertiles/voyager_nolabels/{z}/{x}/{y}{r}.png"
+TILE_SUBDOMAINS = "abcd"
+MAP_BOUNDS = DEFAULT_REGION["bounds"]
+
+
+# In-browser instrumentation, only emitted with --perf. Wraps the render
+# paths in performance.mark/measure, counts DOM nodes, vertices and markers,
+# and shows a HUD (Shift+P, or ?hud in the URL). Shift+D downloads the trace.
+PERF_JS = r'''
+// ===== PERF INSTRUMENTATION (--perf build) =====
+const PERF = {
+  endpoint: __PERF_ENDPOINT__,
+  maxTrace: 5000,
+  seq: 0,
+  trace: [],
+  last: {},
+  counts: {},
+  longTasks: 0,
+  pendingSwitch: null,
+  hud: null
+};
+
+function perfRecord(entry) {
+  entry.t = Math.round(performance.now() * 10) / 10;
+  entry.year = currentYear;
+  PERF.trace.push(entry);
+  if (PERF.trace.length > PERF.maxTrace) PERF.trace.shift();
+}
+
+function perfWrap(name, fn) {
+  return function() {
+    const id = name + '#' + (++PERF.seq);
+    performance.mark(id + ':start');
+    try {
+      return fn.apply(this, arguments);
+    } finally {
+      performance.mark(id + ':end');
+      const m = performance.measure(name, id + ':start', id + ':end');
+      const ms = m ? m.duration : 0;
+      performance.clearMarks(id + ':start');
+      performance.clearMarks(id + ':end');
+      PERF.last[name] = ms;
+      perfRecord({name, ms: Math.round(ms * 100) / 100});
+    }
+  };
+}
+
+function countDrawnPoints(layer) {
+  // Points left after Leaflet's clip + simplify pass (what the SVG path really holds)
+  let n = 0;
+  if (!layer) return 0;
+  layer.eachLayer(l => { (l._parts || []).forEach(p => { n += p.length; }); });
+  return n;
+}
+
+function perfCounts() {
+  const seg = geoCache.segments[currentSegment];
+  const sourceVerts = (seg ? seg.vertexCount : 0) + (geoCache.neighbors ? geoCache.neighbors.vertexCount : 0);
+  PERF.counts = {
+    domNodes: document.getElementsByTagName('*').length,
+    svgPaths: document.querySelectorAll('.leaflet-overlay-pane path').length,
+    sourceVertices: sourceVerts,
+    drawnPoints: countDrawnPoints(caLayer) + countDrawnPoints(neighborLayer),
+    markers: entityLabels.length + neighborLabels.length + cityMarkers.length + waterMarkers.length,
+    cityMarkers: cityMarkers.length,
+    zoom: map.getZoom()
+  };
+  return PERF.counts;
+}
+
+perfEraEvent = function(phase, era) {
+  if (phase === 'start') {
+    performance.mark('switchEra:' + era + ':start');
+    PERF.pendingSwitch = era;
+    return;
+  }
+  if (PERF.pendingSwitch !== era) return;
+  PERF.pendingSwitch = null;
+  performance.mark('switchEra:' + era + ':commit');
+  const m = performance.measure('switchEra', 'switchEra:' + era + ':start', 'switchEra:' + era + ':commit');
+  const ms = m ? m.duration : 0;
+  PERF.last.switchEra = ms;
+  perfRecord(Object.assign({name: 'switchEra', ms: Math.round(ms * 100) / 100}, perfCounts()));
+  perfRenderHud();
+};
+
+map.off('moveend', renderCities);
+renderCA = perfWrap('renderCA', renderCA);
+renderNeighbors = perfWrap('renderNeighbors', renderNeighbors);
+renderCities = perfWrap('renderCities', renderCities);
+buildLegend = perfWrap('buildLegend', buildLegend);
+prepareEraLayers = perfWrap('prepareEraLayers', prepareEraLayers);
+commitEraLayers = perfWrap('commitEraLayers', commitEraLayers);
+decodeBatch = perfWrap('decodeBatch', decodeBatch);
+switchEra = perfWrap('switchEra:sync', switchEra);
+map.on('moveend', () => { renderCities(); perfRecord(Object.assign({name: 'moveend'}, perfCounts())); perfRenderHud(); });
+
+if (window.PerformanceObserver && PerformanceObserver.supportedEntryTypes &&
+    PerformanceObserver.supportedEntryTypes.indexOf('longtask') >= 0) {
+  new PerformanceObserver(list => {
+    list.getEntries().forEach(e => {
+      PERF.longTasks++;
+      perfRecord({name: 'longtask', ms: Math.round(e.duration * 100) / 100});
+    });
+  }).observe({entryTypes: ['longtask']});
+}
+
+function perfRenderHud() {
+  if (!PERF.hud) return;
+  const c = PERF.counts;
+  const fmt = k => PERF.last[k] === undefined ? '—' : PERF.last[k].toFixed(1) + 'ms';
+  PERF.hud.textContent =
+    'year ' + currentYear + '  z' + (c.zoom === undefined ? map.getZoom() : c.zoom) + '\n' +
+    'switchEra   ' + fmt('switchEra') + '\n' +
+    'renderCA    ' + fmt('renderCA') + '\n' +
+    'neighbors   ' + fmt('renderNeighbors') + '\n' +
+    'cities      ' + fmt('renderCities') + '\n' +
+    'legend      ' + fmt('buildLegend') + '\n' +
+    'prepare     ' + fmt('prepareEraLayers') + '\n' +
+    'commit      ' + fmt('commitEraLayers') + '\n' +
+    'DOM nodes   ' + (c.domNodes || 0) + '\n' +
+    'SVG paths   ' + (c.svgPaths || 0) + '\n' +
+    'vertices    ' + (c.sourceVertices || 0) + ' src / ' + (c.drawnPoints || 0) + ' drawn\n' +
+    'markers     ' + (c.markers || 0) + ' (' + (c.cityMarkers || 0) + ' cities)\n' +
+    'long tasks  ' + PERF.longTasks;
+}
+
+function perfToggleHud() {
+  if (PERF.hud) { PERF.hud.remove(); PERF.hud = null; return; }
+  PERF.hud = document.createElement('pre');
+  PERF.hud.id = 'perf-hud';
+  PERF.hud.style.cssText = 'position:absolute;bottom:20px;right:16px;z-index:2000;margin:0;' +
+    'padding:10px 12px;font:11px/1.45 ui-monospace,Menlo,monospace;color:#E6EDF3;' +
+    'background:rgba(13,17,23,0.9);border:1px solid rgba(255,255,255,0.12);border-radius:8px;' +
+    'pointer-events:none;white-space:pre';
+  document.body.appendChild(PERF.hud);
+  perfCounts();
+  perfRenderHud();
+}
+
+function perfTraceJSON() {
+  return JSON.stringify({
+    userAgent: navigator.userAgent,
+    hardwareConcurrency: navigator.hardwareConcurrency || null,
+    deviceMemory: navigator.deviceMemory || null,
+    viewport: [window.innerWidth, window.innerHeight],
+    devicePixelRatio: window.devicePixelRatio,
+    capturedAt: new Date().toISOString(),
+    counts: perfCounts(),
+    trace: PERF.trace
+  });
+}
+
+function perfDumpTrace() {
+  const blob = new Blob([perfTraceJSON()], {type: 'application/json'});
+  const a = document.createElement('a');
+  a.href = URL.createObjectURL(blob);
+  a.download = 'ca-perf-trace-' + Date.now() + '.json';
+  document.body.appendChild(a);
+  a.click();
+  a.remove();
+  setTimeout(() => URL.revokeObjectURL(a.href), 1000);
+}
+
+document.addEventListener('keydown', e => {
+  if (e.target.tagName === 'INPUT') return;
+  if (e.shiftKey && e.key === 'P') perfToggleHud();
+  if (e.shiftKey && e.key === 'D') perfDumpTrace();
+});
+
+if (PERF.endpoint) {
+  // Field collection: ship the trace when the kiosk page is hidden or unloaded
+  window.addEventListener('pagehide', () => {
+    if (PERF.trace.length) navigator.sendBeacon(PERF.endpoint, perfTraceJSON());
+  });
+}
+
+window.caPerf = {trace: PERF.trace, counts: perfCounts, dump: perfDumpTrace, json: perfTraceJSON, toggleHud: perfToggleHud};
+if (/[?&]hud\b/.test(location.search)) setTimeout(perfToggleHud, 0);
+'''
+
+
+def perf_script(endpoint=None):
+    return PERF_JS.replace("__PERF_ENDPOINT__", json.dumps(endpoint))
+
+
+# Service worker, only emitted with --service-worker. The app page and CDN
+# assets go into a precache versioned by content hash and are served from it
+# first; tiles go into a bounded cache that is warmed for MAP_BOUNDS up to
+# --sw-tile-zoom.
+SERVICE_WORKER_JS = r'''// Generated by generate_html.py --service-worker. Do not edit.
+const VERSION = __VERSION__;
+const PREFIX = 'ca-timeline-';
+const APP_CACHE = PREFIX + 'app-' + VERSION;
+const STATIC_CACHE = PREFIX + 'static-v1';
+const TILE_CACHE = PREFIX + 'tiles-' + __TILE_KEY__;
+const PRECACHE = __PRECACHE__;
+const PAGE_URL = __PAGE_URL__;
+const TILE_URL = __TILE_URL__;
+const TILE_SUBDOMAINS = __TILE_SUBDOMAINS__;
+const TILE_HOST = __TILE_HOST__;
+const TILE_RANGES = __TILE_RANGES__;  // [z, x0, x1, y0, y1] inclusive
+const MAX_TILES = __MAX_TILES__;
+
+let putsSinceTrim = 0;
+
+function absolute(url) {
+  return new URL(url, self.registration.scope).href;
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(APP_CACHE).then(cache => Promise.all(PRECACHE.map(url => {
+    const abs = absolute(url);
+    if (new URL(abs).origin === self.location.origin) return cache.add(abs);
+    // CDN assets over CORS: an opaque response would be padded against the
+    // storage quota and cache a failure for good, so skip the asset instead
+    return cache.add(new Request(abs, {mode: 'cors'})).catch(() => {});
+  }))).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+  const keep = [APP_CACHE, STATIC_CACHE, TILE_CACHE];
+  event.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k.startsWith(PREFIX) && keep.indexOf(k) < 0).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
+});
+
+function trimTiles() {
+  // Cache keys come back in insertion order: drop the oldest tiles first
+  return caches.open(TILE_CACHE).then(cache => cache.keys().then(keys => {
+    const excess = keys.length - MAX_TILES;
+    return excess > 0 ? Promise.all(keys.slice(0, excess).map(k => cache.delete(k))) : null;
+  }));
+}
+
+function cacheFirst(cacheName, request, isTile) {
+  return caches.open(cacheName).then(cache => cache.match(request).then(hit => {
+    if (hit) return hit;
+    return fetch(request).then(resp => {
+      if (resp.ok) {
+        cache.put(request, resp.clone());
+        if (isTile && ++putsSinceTrim >= 50) { putsSinceTrim = 0; trimTiles(); }
+      }
+      return resp;
+    });
+  }));
+}
+
+self.addEventListener('fetch', event => {
+  const req = event.request;
+  if (req.method !== 'GET') return;
+  const url = new URL(req.url);
+  if (url.hostname.endsWith(TILE_HOST)) {
+    event.respondWith(cacheFirst(TILE_CACHE, req, true));
+  } else if (req.mode === 'navigate') {
+    // Cache-first: the page embeds the geodata and is the largest download.
+    // A new build changes VERSION, so the browser's sw.js update check
+    // precaches it and the next visit serves it.
+    event.respondWith(caches.open(APP_CACHE).then(cache =>
+      cache.match(req, {ignoreSearch: true}).then(hit => hit || cache.match(absolute(PAGE_URL))))
+      .then(hit => hit || fetch(req)));
+  } else if (url.hostname === 'fonts.gstatic.com') {
+    event.respondWith(cacheFirst(STATIC_CACHE, req, false));
+  } else {
+    event.respondWith(caches.match(req).then(hit => hit || fetch(req)));
+  }
+});
+
+function tileUrls(retina) {
+  const urls = [];
+  TILE_RANGES.forEach(([z, x0, x1, y0, y1]) => {
+    for (let x = x0; x <= x1; x++) {
+      for (let y = y0; y <= y1; y++) {
+        const s = TILE_SUBDOMAINS[Math.abs(x + y) % TILE_SUBDOMAINS.length];
+        urls.push(TILE_URL.replace('{s}', s).replace('{z}', z).replace('{x}', x)
+          .replace('{y}', y).replace('{r}', retina ? '@2x' : ''));
+      }
+    }
+  });
+  return urls.slice(0, MAX_TILES);
+}
+
+function warmTiles(retina) {
+  return caches.open(TILE_CACHE).then(cache => {
+    const queue = tileUrls(retina);
+    const worker = () => {
+      const url = queue.shift();
+      if (!url) return null;
+      return cache.match(url).then(hit => hit ||
+        fetch(url, {mode: 'cors'}).then(resp => resp.ok ? cache.put(url, resp) : null).catch(() => null))
+        .then(worker);
+    };
+    return Promise.all([worker(), worker(), worker(), worker()]);
+  });
+}
+
+self.addEventListener('message', event => {
+  if (event.data && event.data.type === 'warm-tiles') event.waitUntil(warmTiles(!!event.data.retina));
+});
+'''
+
+SW_REGISTER_JS = r'''
+// ===== SERVICE WORKER (--service-worker build) =====
+if ('serviceWorker' in navigator && /^https?:$/.test(location.protocol)) {
+  window.addEventListener('load', () => {
+    navigator.serviceWorker.register(__SW_URL__)
+      .then(() => navigator.serviceWorker.ready)
+      .then(reg => { if (reg.active) reg.active.postMessage({type: 'warm-tiles', retina: L.Browser.retina}); })
+      .catch(err => console.warn('Service worker registration failed:', err));
+  });
+}
+'''
+
+
+def tile_ranges(bounds, zmin, zmax, margin=1):
+    # Slippy-map tile index ranges covering bounds (plus a margin) per zoom
+    (south, west), (north, east) = bounds
+    ranges = []
+    for z in range(zmin, zmax + 1):
+        n = 2 ** z
+
+        def tx(lng):
+            return int((lng + 180.0) / 360.0 * n)
+
+        def ty(lat):
+            rad = math.radians(lat)
+            return int((1.0 - math.asinh(math.tan(rad)) / math.pi) / 2.0 * n)
+
+        ranges.append([z, max(tx(west) - margin, 0), min(tx(east) + margin, n - 1),
+                       max(ty(north) - margin, 0), min(ty(south) + margin, n - 1)])
+    return ranges
+
+
+def sw_register_script(sw_url):
+    return SW_REGISTER_JS.replace("__SW_URL__", json.dumps(sw_url))
+
+
+def build_service_worker(html, page_url, tile_zoom, max_tiles):
+    precache = [page_url, LEAFLET_CSS, LEAFLET_JS, FONTS_CSS]
+    ranges = tile_ranges(MAP_BOUNDS, 5, tile_zoom)
+    config = json.dumps([precache, ranges, max_tiles, TILE_URL])
+    version = hashlib.sha256((html + config).encode("utf-8")).hexdigest()[:12]
+    tile_key = hashlib.sha256(TILE_URL.encode("utf-8")).hexdigest()[:8]
+    tile_host = TILE_URL.split("//", 1)[1].split("/", 1)[0].replace("{s}.", "")
+    subs = {
+        "__VERSION__": version, "__TILE_KEY__": tile_key, "__PRECACHE__": precache,
+        "__PAGE_URL__": page_url, "__TILE_URL__": TILE_URL,
+        "__TILE_SUBDOMAINS__": TILE_SUBDOMAINS, "__TILE_HOST__": tile_host,
+        "__TILE_RANGES__": ranges, "__MAX_TILES__": max_tiles,
+    }
+    sw = SERVICE_WORKER_JS
+    for placeholder, value in subs.items():
+        sw = sw.replace(placeholder, json.dumps(value))
+    return sw, version
 
-with open(GEODATA_PATH) as f:
-    geodata_raw = f.read()
 
 # Build HTML as a Python string
-html = r'''<!DOCTYPE html>
+def render_snapshots(geodata, region=DEFAULT_REGION):
+    return snapshots.render_snapshots(geodata, region)
+
+
+def load_region_cities(region):
+    # Regions without a city file get an empty table (no markers, no search hits)
+    if region["cities"] is None:
+        return cities.build_city_table([], region["eras"])
+    return cities.load_city_table(region["cities"], region["eras"])
+
+
+def build_html(geodata_raw, perf=False, perf_endpoint=None, sw_url=None, city_table=None,
+               snapshot_set=None, region=DEFAULT_REGION):
+    if city_table is None:
+        city_table = load_region_cities(region)
+    search_index = cities.build_search_index(city_table, region["eras"])
+    city_clusters = cities.build_city_clusters(city_table, min_zoom=region["zoom"], eras=region["eras"])
+    if snapshot_set is None:
+        snapshot_set = render_snapshots(json.loads(geodata_raw), region)
+    interval_index = regions.interval_index(region)
+    initial_segment = timeline.segment_for_year(interval_index, timeline.TIMELINE_END)
+    return r'''<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>Central Asia — Historical Timeline Map</title>
+<title>''' + region["title"] + r''' — Historical Timeline Map</title>
 <link rel="preconnect" href="https://fonts.googleapis.com">
-<link href="https://fonts.googleapis.com/css2?family=Crimson+Pro:wght@400;600;700&family=DM+Sans:wght@400;500;600;700&display=swap" rel="stylesheet">
-<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
-<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<link href="''' + FONTS_CSS + r'''" rel="stylesheet" crossorigin="" media="print" onload="this.media='all'">
+<script>
+// Lite mode: the static snapshots are the whole map (?lite, Save-Data, or a low-memory device)
+if (/[?&]lite\b/.test(location.search) || (navigator.connection && navigator.connection.saveData) ||
+    navigator.deviceMemory <= 1) document.documentElement.classList.add('lite');
+</script>
 <style>
 *,*::before,*::after{box-sizing:border-box;margin:0;padding:0}
 :root{
@@ -40,6 +433,20 @@ html,body{height:100%;overflow:hidden;background:#0d1117;color:var(--text-primar
 body{font-family:var(--font-sans)}
 #map{width:100%;height:100%;z-index:1}
 
+/* Static snapshot: first paint, and the whole map in lite mode */
+#snapshot{
+  position:absolute;inset:0;z-index:2;overflow:hidden;pointer-events:none;
+  background:#f2efe9;transition:opacity 0.35s ease;
+}
+#snapshot.done{opacity:0}
+#snapshot svg{position:absolute}
+#snapshot text{
+  font-family:var(--font-serif);font-weight:700;font-size:12px;
+  text-transform:uppercase;letter-spacing:3px;fill:rgba(230,237,243,0.82);
+  stroke:rgba(0,0,0,0.55);stroke-width:3px;paint-order:stroke;
+}
+.lite #map,.lite #legend,.lite #search,.lite #home-btn{display:none}
+
 .glass{
   background:var(--glass-bg);
   backdrop-filter:blur(var(--glass-blur));
@@ -116,8 +523,6 @@ body{font-family:var(--font-sans)}
 }
 #timeline-track{
   position:relative;width:100%;height:40px;
-  display:flex;align-items:center;justify-content:space-between;
-  padding:0 6px;
 }
 #timeline-line{
   position:absolute;top:50%;left:6px;right:6px;height:3px;
@@ -129,7 +534,8 @@ body{font-family:var(--font-sans)}
   transition:width 0.4s ease;
 }
 .timeline-dot{
-  position:relative;z-index:2;width:14px;height:14px;
+  position:absolute;top:50%;z-index:2;width:14px;height:14px;
+  transform:translate(-50%,-50%);
   border-radius:50%;background:rgba(255,255,255,0.12);
   border:2px solid rgba(255,255,255,0.2);
   cursor:pointer;transition:all 0.3s ease;
@@ -137,22 +543,38 @@ body{font-family:var(--font-sans)}
 }
 .timeline-dot:hover{
   background:rgba(129,178,154,0.3);border-color:var(--accent);
-  transform:scale(1.2);
+  transform:translate(-50%,-50%) scale(1.2);
 }
 .timeline-dot.active{
   width:18px;height:18px;
   background:var(--accent);border-color:#fff;
   box-shadow:0 0 12px rgba(129,178,154,0.5);
 }
+#timeline-slider{
+  position:absolute;top:50%;left:0;width:100%;height:24px;margin:0;z-index:1;
+  transform:translateY(-50%);background:transparent;cursor:pointer;
+  -webkit-appearance:none;appearance:none;
+}
+#timeline-slider::-webkit-slider-runnable-track{background:transparent;height:24px}
+#timeline-slider::-moz-range-track{background:transparent;height:24px}
+#timeline-slider::-webkit-slider-thumb{
+  -webkit-appearance:none;width:12px;height:24px;margin-top:0;
+  border-radius:3px;background:rgba(230,237,243,0.25);border:none;
+}
+#timeline-slider::-moz-range-thumb{width:12px;height:24px;border-radius:3px;background:rgba(230,237,243,0.25);border:none}
+#timeline-slider:focus{outline:none}
 #timeline-labels{
-  display:flex;justify-content:space-between;
-  margin-top:4px;padding:0 2px;
+  position:relative;height:14px;
+  margin-top:4px;
 }
+#timeline-labels.staggered{height:26px}
 #timeline-labels span{
+  position:absolute;top:0;transform:translateX(-50%);
   font-size:0.68rem;color:var(--text-muted);
   width:50px;text-align:center;
   font-family:var(--font-sans);font-weight:500;
 }
+#timeline-labels span.stagger{top:12px}
 
 /* Home button */
 #home-btn{
@@ -166,6 +588,26 @@ body{font-family:var(--font-sans)}
 }
 #home-btn:hover{color:var(--text-primary);background:rgba(13,17,23,0.95)}
 
+/* Place search */
+#search{
+  position:absolute;top:16px;left:266px;z-index:1000;
+  width:240px;padding:0;
+}
+#search-input{
+  width:100%;height:34px;padding:0 12px;background:transparent;border:none;
+  color:var(--text-primary);font-family:var(--font-sans);font-size:0.8rem;
+}
+#search-input::placeholder{color:var(--text-muted)}
+#search-input:focus{outline:none}
+#search-results{display:none;border-top:1px solid var(--glass-border);padding:4px}
+#search-results.visible{display:block}
+.search-result{
+  display:flex;flex-direction:column;padding:5px 8px;border-radius:6px;cursor:pointer;
+}
+.search-result:hover{background:rgba(255,255,255,0.06)}
+.search-name{font-size:0.8rem;color:var(--text-primary)}
+.search-meta{font-size:0.66rem;color:var(--text-muted)}
+
 /* Water labels */
 .water-label{
   font-family:var(--font-serif);font-style:italic;
@@ -212,6 +654,7 @@ body{font-family:var(--font-sans)}
   text-shadow:0 1px 3px rgba(0,0,0,0.9),0 0 8px rgba(0,0,0,0.6);
 }
 .city-name.capital-name{font-weight:600;font-size:11px;color:rgba(242,204,143,0.9)}
+.city-count{margin-left:3px;font-size:8.5px;font-weight:400;color:rgba(139,148,158,0.8)}
 
 /* Leaflet overrides */
 .leaflet-control-zoom{display:none}
@@ -229,6 +672,11 @@ body{font-family:var(--font-sans)}
 </head>
 <body>
 <div id="map"></div>
+<div id="snapshot" aria-hidden="true">''' + snapshots.snapshot_svg(snapshot_set, initial_segment) + r'''</div>
+
+<!-- Leaflet loads after the snapshot so it never delays first paint -->
+<link rel="stylesheet" href="''' + LEAFLET_CSS + r'''" crossorigin=""/>
+<script src="''' + LEAFLET_JS + r'''" crossorigin=""></script>
 
 <!-- Info Panel -->
 <div id="info-panel" class="glass">
@@ -245,7 +693,7 @@ body{font-family:var(--font-sans)}
 
 <!-- Legend -->
 <div id="legend" class="glass">
-  <h3 id="legend-title">Central Asia</h3>
+  <h3 id="legend-title">''' + region["title"] + r'''</h3>
   <div class="legend-section">
     <div class="legend-section-title" id="legend-ca-title">Entities</div>
     <div id="legend-ca"></div>
@@ -263,6 +711,7 @@ body{font-family:var(--font-sans)}
   <div id="timeline-track">
     <div id="timeline-line"></div>
     <div id="timeline-fill"></div>
+    <input type="range" id="timeline-slider" aria-label="Year">
   </div>
   <div id="timeline-labels"></div>
 </div>
@@ -270,324 +719,478 @@ body{font-family:var(--font-sans)}
 <!-- Home Button -->
 <button id="home-btn" title="Reset view">&#8962;</button>
 
-<script>
-// ===== GEODATA (injected) =====
-const GEODATA = ''' + geodata_raw + r''';
-
-// ===== ERAS =====
-const ERAS = [1900, 1920, 1924, 1936, 1991, 2024];
-const ERA_NAMES = {
-  1900: 'Russian Imperial Era',
-  1920: 'Soviet Takeover',
-  1924: 'National Delimitation',
-  1936: 'Full SSR Status',
-  1991: 'Independence',
-  2024: 'Modern Era'
-};
+<!-- Place search -->
+<div id="search" class="glass">
+  <input type="search" id="search-input" placeholder="Search places, e.g. Verny" autocomplete="off" spellcheck="false" aria-label="Search places">
+  <div id="search-results"></div>
+</div>
 
-// ===== COLORS =====
-const NEIGHBOR_STYLES = {
-  RU:{fill:'#2d3748',name:'Russia'},
-  CN:{fill:'#1a365d',name:'China'},
-  IR:{fill:'#3d3028',name:'Iran'},
-  AF:{fill:'#3d2c4a',name:'Afghanistan'},
-  PK:{fill:'#2a3a2e',name:'Pakistan'},
-  MN:{fill:'#2d3340',name:'Mongolia'},
-  AZ:{fill:'#2a3340',name:'Azerbaijan'},
-  GE:{fill:'#2e2a34',name:'Georgia'}
+<!-- GEODATA (injected) — parsed by the geo worker, never on the main thread -->
+<script type="application/json" id="geodata">''' + geodata_raw.replace("</", "<\\/") + r'''</script>
+
+<!-- Per-interval snapshot layers for lite mode and era switches before the map is ready -->
+<script type="application/json" id="snapshots">''' + json.dumps({"base": snapshot_set["base"], "layers": snapshot_set["layers"]}).replace("</", "<\\/") + r'''</script>
+
+<script type="text/js-worker" id="geo-worker">
+// Runs in a Web Worker (or inline as a fallback): parses the GEODATA payload
+// and assembles per-era features into transferable typed-array batches.
+let GEO = null;
+let ERA_DEFS = {};
+
+function polygonsOf(geom) {
+  if (!geom) return [];
+  if (geom.type === 'Polygon') return [geom.coordinates];
+  if (geom.type === 'MultiPolygon') return geom.coordinates;
+  if (geom.type === 'GeometryCollection') return [].concat(...geom.geometries.map(polygonsOf));
+  return [];
+}
+
+// Batch layout: coords are [lat,lng,...] float32 ([y,x,...] base-zoom Mercator
+// pixels when the geodata was built with --mercator, flagged by "projected");
+// ringLen, polyRings and featPolys give vertices per ring, rings per polygon
+// and polygons per feature. The closing vertex of each GeoJSON ring is
+// dropped (Leaflet closes rings).
+function encodeBatch(geoms) {
+  const all = geoms.map(polygonsOf);
+  let nCoords = 0, nRings = 0, nPolys = 0;
+  all.forEach(ps => {
+    nPolys += ps.length;
+    ps.forEach(rs => { nRings += rs.length; rs.forEach(r => { nCoords += r.length - 1; }); });
+  });
+  const coords = new Float32Array(nCoords * 2);
+  const ringLen = new Uint32Array(nRings);
+  const polyRings = new Uint32Array(nPolys);
+  const featPolys = new Uint32Array(geoms.length);
+  let c = 0, ri = 0, pi = 0;
+  all.forEach((ps, fi) => {
+    featPolys[fi] = ps.length;
+    ps.forEach(rs => {
+      polyRings[pi++] = rs.length;
+      rs.forEach(r => {
+        ringLen[ri++] = r.length - 1;
+        for (let k = 0; k < r.length - 1; k++) { coords[c++] = r[k][1]; coords[c++] = r[k][0]; }
+      });
+    });
+  });
+  return {coords, ringLen, polyRings, featPolys, vertexCount: nCoords, projected: GEO.crs === 'px0'};
+}
+
+function batchTransfer(b) {
+  return [b.coords.buffer, b.ringLen.buffer, b.polyRings.buffer, b.featPolys.buffer];
+}
+
+function metaRecord(section, key) {
+  // GEO.meta rows are flat arrays in GEO.meta.fields order (generate_geodata
+  // META_FIELDS); older geodata without the section yields null
+  const row = GEO.meta && section && section[key];
+  if (!row) return null;
+  const r = {};
+  GEO.meta.fields.forEach((name, i) => { r[name] = row[i]; });
+  return {area: r.area_km2, bbox: [r.west, r.south, r.east, r.north],
+          anchor: [r.anchor_lat, r.anchor_lng], vertices: r.vertices};
+}
+
+function prepareSegment(refs) {
+  // refs: [era, key] pairs; 1900/1920/1924 entities live in GEO.historical,
+  // later ones are modern geometry + ERA_DEFS metadata
+  const entities = [];
+  const geoms = [];
+  const meta = GEO.meta || {};
+  refs.forEach(([era, key]) => {
+    const hist = GEO.historical[era] && GEO.historical[era][key];
+    const def = ERA_DEFS[era] && ERA_DEFS[era][key];
+    if (hist) {
+      entities.push({era, key, color: hist.color, name: hist.name, subtitle: hist.subtitle,
+                     meta: metaRecord((meta.historical || {})[era], key)});
+      geoms.push(hist.geometry);
+    } else if (def) {
+      entities.push({era, key, color: def.color, name: def.name, subtitle: def.subtitle, center: def.center,
+                     meta: metaRecord(meta.modern, def.code)});
+      geoms.push(GEO.modern[def.code]);
+    }
+  });
+  return {entities, batch: encodeBatch(geoms)};
+}
+
+self.onmessage = e => {
+  const msg = e.data;
+  if (msg.type === 'init') {
+    GEO = JSON.parse(msg.text);
+    ERA_DEFS = msg.eraDefs;
+  } else if (msg.type === 'neighbors') {
+    const codes = Object.keys(GEO.neighbors);
+    const batch = encodeBatch(codes.map(c => GEO.neighbors[c]));
+    const meta = codes.map(c => metaRecord(GEO.meta && GEO.meta.neighbors, c));
+    self.postMessage({type: 'neighbors', codes, meta, batch}, batchTransfer(batch));
+  } else if (msg.type === 'morph') {
+    const m = GEO.morphs && GEO.morphs[msg.year];
+    if (!m) {
+      self.postMessage({type: 'morph', year: msg.year, pairs: null});
+      return;
+    }
+    const from = Float32Array.from(m.from), to = Float32Array.from(m.to);
+    self.postMessage({type: 'morph', year: msg.year, n: m.n, pairs: m.pairs, from, to}, [from.buffer, to.buffer]);
+  } else if (msg.type === 'changes') {
+    // Boundary year -> change set; empty for geodata that predates them
+    self.postMessage({type: 'changes', changes: GEO.changes || {}});
+  } else if (msg.type === 'water') {
+    // Shorelines: base ring + per-year integer deltas, summed back into one
+    // [lat,lng,...] keyframe per dated year
+    const w = GEO.water || {bodies: {}};
+    const bodies = Object.keys(w.bodies).map(key => {
+      const b = w.bodies[key], n = w.n, frames = new Float32Array(b.years.length * n * 2);
+      const acc = b.base.slice();
+      for (let y = 0; y < b.years.length; y++) {
+        if (y > 0) b.deltas[y - 1].forEach((d, i) => { acc[i] += d; });
+        for (let k = 0, o = y * n * 2; k < n; k++) {
+          frames[o + 2 * k] = acc[2 * k + 1] / w.scale;
+          frames[o + 2 * k + 1] = acc[2 * k] / w.scale;
+        }
+      }
+      return {key, name: b.name, years: b.years, n, frames};
+    });
+    self.postMessage({type: 'water', bodies}, bodies.map(b => b.frames.buffer));
+  } else if (msg.type === 'segment') {
+    const out = prepareSegment(msg.refs);
+    self.postMessage({type: 'segment', index: msg.index, entities: out.entities, batch: out.batch}, batchTransfer(out.batch));
+  }
 };
+</script>
+
+<script>
+
+// ===== ERAS / TIMELINE (from the region profile) =====
+const ERAS = ''' + json.dumps(region["eras"]) + r''';
+const ERA_NAMES = ''' + json.dumps(region["era_names"]) + r''';
+// Interval index over entity lifespans: segment i covers
+// [boundaries[i], boundaries[i+1]) and lists its active entities
+const TIMELINE = ''' + json.dumps(interval_index, separators=(",", ":")) + r''';
 
-// Modern CA colors (used for 1936/1991/2024)
-const CA_COLORS = {KZ:'#E07A5F',UZ:'#81B29A',TM:'#F2CC8F',KG:'#3D85C6',TJ:'#9B72CF'};
+// ===== COLORS =====
+const NEIGHBOR_STYLES = ''' + json.dumps(region["neighbor_styles"]) + r''';
 
 // Neighbor label positions (visual center within clipped bounds)
-const NEIGHBOR_LABEL_POS = {
-  RU:[52.5,68], CN:[40,82], IR:[34,55], AF:[34.5,67],
-  PK:[32,69], MN:[48,88], AZ:[40.5,48.5], GE:[42,44.3]
-};
+const NEIGHBOR_LABEL_POS = ''' + json.dumps(region["neighbor_label_pos"]) + r''';
 
 // ===== ERA ENTITY CONFIG =====
 // For 1936/1991/2024 — define what entities show on the map
-const ERA_ENTITIES = {
-  1936: {
-    KZ_SSR:{code:'KZ',color:'#E07A5F',name:'Kazakh SSR',subtitle:'Union Republic since 1936',center:[48,67]},
-    UZ_SSR:{code:'UZ',color:'#81B29A',name:'Uzbek SSR',subtitle:'Union Republic since 1924',center:[41.3,64.5]},
-    TM_SSR:{code:'TM',color:'#F2CC8F',name:'Turkmen SSR',subtitle:'Union Republic since 1924',center:[39,59.5]},
-    KG_SSR:{code:'KG',color:'#3D85C6',name:'Kirghiz SSR',subtitle:'Union Republic since 1936',center:[41.5,74.5]},
-    TJ_SSR:{code:'TJ',color:'#9B72CF',name:'Tajik SSR',subtitle:'Union Republic since 1929',center:[38.8,70.8]}
-  },
-  1991: {
-    KZ:{code:'KZ',color:'#E07A5F',name:'Republic of Kazakhstan',subtitle:'Independence: Dec 16, 1991',center:[48,67]},
-    UZ:{code:'UZ',color:'#81B29A',name:'Republic of Uzbekistan',subtitle:'Independence: Sep 1, 1991',center:[41.3,64.5]},
-    TM:{code:'TM',color:'#F2CC8F',name:'Republic of Turkmenistan',subtitle:'Independence: Oct 27, 1991',center:[39,59.5]},
-    KG:{code:'KG',color:'#3D85C6',name:'Republic of Kyrgyzstan',subtitle:'Independence: Aug 31, 1991',center:[41.5,74.5]},
-    TJ:{code:'TJ',color:'#9B72CF',name:'Republic of Tajikistan',subtitle:'Independence: Sep 9, 1991',center:[38.8,70.8]}
-  },
-  2024: {
-    KZ:{code:'KZ',color:'#E07A5F',name:'Kazakhstan',subtitle:'',center:[48,67]},
-    UZ:{code:'UZ',color:'#81B29A',name:'Uzbekistan',subtitle:'',center:[41.3,64.5]},
-    TM:{code:'TM',color:'#F2CC8F',name:'Turkmenistan',subtitle:'',center:[39,59.5]},
-    KG:{code:'KG',color:'#3D85C6',name:'Kyrgyzstan',subtitle:'',center:[41.5,74.5]},
-    TJ:{code:'TJ',color:'#9B72CF',name:'Tajikistan',subtitle:'',center:[38.8,70.8]}
-  }
-};
+const ERA_ENTITIES = ''' + json.dumps(region["era_entities"]) + r''';
 
 // Historical entity label centers (1900/1920/1924 come from geodata keys)
-const HIST_LABEL_POS = {
-  // 1900
-  TURKESTAN:[40.5,66], BUKHARA:[38.8,67], KHIVA:[42,59.5], STEPPE:[49,62],
-  // 1920
-  TURKESTAN_ASSR:[40.5,66], BUKHARA_PSR:[38.8,67], KHOREZM_PSR:[42,59.5], KIRGHIZ_ASSR:[49,62],
-  // 1924
-  UZ_SSR:[40,67], TM_SSR:[39,59.5], KARA_KIRGHIZ:[41.5,74.5], KZ_ASSR:[48,67]
-};
+const HIST_LABEL_POS = ''' + json.dumps(region["hist_label_pos"]) + r''';
 
 // ===== INFO PANEL DATA PER ERA =====
-const INFO_DATA = {
-  1936: {
-    KZ_SSR:{pop:'6.1M',area:'2,724,900 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    UZ_SSR:{pop:'6.3M',area:'448,978 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    TM_SSR:{pop:'1.3M',area:'491,210 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    KG_SSR:{pop:'1.5M',area:'199,951 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    TJ_SSR:{pop:'1.5M',area:'143,100 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'}
-  },
-  1991: {
-    KZ:{pop:'16.5M',area:'2,724,900 km\u00b2',gdp:'~$120B',currency:'Soviet Ruble \u2192 Tenge (1993)'},
-    UZ:{pop:'20.7M',area:'448,978 km\u00b2',gdp:'~$60B',currency:"Soviet Ruble \u2192 So'm (1993)"},
-    TM:{pop:'3.7M',area:'491,210 km\u00b2',gdp:'~$18B',currency:'Soviet Ruble \u2192 Manat (1993)'},
-    KG:{pop:'4.4M',area:'199,951 km\u00b2',gdp:'~$12B',currency:'Soviet Ruble \u2192 Som (1993)'},
-    TJ:{pop:'5.3M',area:'143,100 km\u00b2',gdp:'~$8B',currency:'Soviet Ruble \u2192 Somoni (2000)'}
-  },
-  2024: {
-    KZ:{pop:'19.8M',area:'2,724,900 km\u00b2',gdp:'$604B',currency:'Tenge (\u20b8)'},
-    UZ:{pop:'36.0M',area:'448,978 km\u00b2',gdp:'$301B',currency:"So'm"},
-    TM:{pop:'6.5M',area:'491,210 km\u00b2',gdp:'$112B',currency:'Manat (m)'},
-    KG:{pop:'7.1M',area:'199,951 km\u00b2',gdp:'$43B',currency:'Som'},
-    TJ:{pop:'10.1M',area:'143,100 km\u00b2',gdp:'$46B',currency:'Somoni (SM)'}
-  },
-  1900: {
-    TURKESTAN:{pop:'~6M',area:'~1,707,000 km\u00b2',gdp:'\u2014',currency:'Russian Ruble'},
-    BUKHARA:{pop:'~2.5M',area:'~203,000 km\u00b2',gdp:'\u2014',currency:'Tanga (Bukharan)'},
-    KHIVA:{pop:'~800K',area:'~62,000 km\u00b2',gdp:'\u2014',currency:'Tilla (Khivan)'},
-    STEPPE:{pop:'~4M',area:'~2,400,000 km\u00b2',gdp:'\u2014',currency:'Russian Ruble'}
-  },
-  1920: {
-    TURKESTAN_ASSR:{pop:'~5.5M',area:'~1,707,000 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    BUKHARA_PSR:{pop:'~2M',area:'~203,000 km\u00b2',gdp:'\u2014',currency:'Bukharan Ruble'},
-    KHOREZM_PSR:{pop:'~600K',area:'~62,000 km\u00b2',gdp:'\u2014',currency:'Khorezmian Ruble'},
-    KIRGHIZ_ASSR:{pop:'~4.5M',area:'~2,400,000 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'}
-  },
-  1924: {
-    UZ_SSR:{pop:'~5M',area:'~590,000 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    TM_SSR:{pop:'~1M',area:'~491,000 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    KARA_KIRGHIZ:{pop:'~1M',area:'~199,000 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'},
-    KZ_ASSR:{pop:'~6M',area:'~2,724,000 km\u00b2',gdp:'\u2014',currency:'Soviet Ruble'}
-  }
-};
+const INFO_DATA = ''' + json.dumps(region["info"]) + r''';
 
 // ===== COMPLETE CITY DATABASE =====
+// Columnar table generated from cities.csv (see cities.py): parallel
+// coordinate/name/tier columns, one name and tier array per era position
+const CITY_TABLE = ''' + json.dumps(city_table, separators=(",", ":"), ensure_ascii=False) + r''';
 const CITIES = {
-  tashkent:{lat:41.299,lng:69.240,
-    names:{1900:'Tashkent',1920:'Tashkent',1924:'Tashkent',1936:'Tashkent',1991:'Tashkent',2024:'Tashkent'},
-    tier:{1900:0,1920:0,1924:1,1936:0,1991:0,2024:0}},
-  almaty:{lat:43.238,lng:76.946,
-    names:{1900:'Verny',1920:'Verny',1924:'Alma-Ata',1936:'Alma-Ata',1991:'Almaty',2024:'Almaty'},
-    tier:{1900:1,1920:1,1924:1,1936:1,1991:1,2024:1}},
-  bishkek:{lat:42.874,lng:74.569,
-    names:{1900:'Pishpek',1920:'Pishpek',1924:'Pishpek',1936:'Frunze',1991:'Bishkek',2024:'Bishkek'},
-    tier:{1900:2,1920:2,1924:2,1936:0,1991:0,2024:0}},
-  dushanbe:{lat:38.560,lng:68.774,
-    names:{1900:'Dyushambe',1920:'Dyushambe',1924:'Dyushambe',1936:'Stalinabad',1991:'Dushanbe',2024:'Dushanbe'},
-    tier:{1900:4,1920:4,1924:3,1936:0,1991:0,2024:0}},
-  astana:{lat:51.169,lng:71.449,
-    names:{1900:'Akmolinsk',1920:'Akmolinsk',1924:'Akmolinsk',1936:'Akmolinsk',1991:'Tselinograd',2024:'Astana'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:2,2024:0}},
-  ashgabat:{lat:37.960,lng:58.326,
-    names:{1900:'Ashkhabad',1920:'Poltoratsk',1924:'Ashkhabad',1936:'Ashkhabad',1991:'Ashgabat',2024:'Ashgabat'},
-    tier:{1900:1,1920:1,1924:0,1936:0,1991:0,2024:0}},
-  bukhara:{lat:39.768,lng:64.421,
-    names:{1900:'Bukhara',1920:'Bukhara',1924:'Bukhara',1936:'Bukhara',1991:'Bukhara',2024:'Bukhara'},
-    tier:{1900:0,1920:0,1924:1,1936:1,1991:1,2024:1}},
-  khiva:{lat:41.378,lng:60.364,
-    names:{1900:'Khiva',1920:'Khiva',1924:'Khiva',1936:'Khiva',1991:'Khiva',2024:'Khiva'},
-    tier:{1900:0,1920:0,1924:3,1936:3,1991:3,2024:3}},
-  samarkand:{lat:39.654,lng:66.960,
-    names:{1900:'Samarkand',1920:'Samarkand',1924:'Samarkand',1936:'Samarkand',1991:'Samarkand',2024:'Samarkand'},
-    tier:{1900:1,1920:1,1924:0,1936:1,1991:1,2024:1}},
-  khujand:{lat:40.282,lng:69.629,
-    names:{1900:'Khodjent',1920:'Khodjent',1924:'Khodjent',1936:'Leninabad',1991:'Khujand',2024:'Khujand'},
-    tier:{1900:2,1920:2,1924:2,1936:1,1991:1,2024:1}},
-  mary:{lat:37.594,lng:61.831,
-    names:{1900:'Merv',1920:'Merv',1924:'Mary',1936:'Mary',1991:'Mary',2024:'Mary'},
-    tier:{1900:2,1920:2,1924:2,1936:2,1991:2,2024:2}},
-  turkmenbashi:{lat:40.049,lng:52.960,
-    names:{1900:'Krasnovodsk',1920:'Krasnovodsk',1924:'Krasnovodsk',1936:'Krasnovodsk',1991:'Krasnovodsk',2024:'Turkmenbashi'},
-    tier:{1900:2,1920:2,1924:3,1936:3,1991:3,2024:3}},
-  atyrau:{lat:47.105,lng:51.876,
-    names:{1900:'Guryev',1920:'Guryev',1924:'Guryev',1936:'Guryev',1991:'Atyrau',2024:'Atyrau'},
-    tier:{1900:3,1920:3,1924:2,1936:2,1991:2,2024:2}},
-  semey:{lat:50.411,lng:80.228,
-    names:{1900:'Semipalatinsk',1920:'Semipalatinsk',1924:'Semipalatinsk',1936:'Semipalatinsk',1991:'Semipalatinsk',2024:'Semey'},
-    tier:{1900:2,1920:2,1924:3,1936:3,1991:3,2024:3}},
-  turkmenabat:{lat:39.073,lng:63.572,
-    names:{1900:'Chardzhou',1920:'Chardzhou',1924:'Chardzhou',1936:'Chardzhou',1991:'Chardzhou',2024:'Turkmenabat'},
-    tier:{1900:2,1920:2,1924:2,1936:2,1991:2,2024:2}},
-  nukus:{lat:42.462,lng:59.603,
-    names:{1900:'Nukus',1920:'Nukus',1924:'Nukus',1936:'Nukus',1991:'Nukus',2024:'Nukus'},
-    tier:{1900:3,1920:3,1924:2,1936:2,1991:2,2024:2}},
-  kokand:{lat:40.528,lng:70.943,
-    names:{1900:'Kokand',1920:'Kokand',1924:'Kokand',1936:'Kokand',1991:'Kokand',2024:'Kokand'},
-    tier:{1900:1,1920:2,1924:3,1936:3,1991:3,2024:3}},
-  namangan:{lat:41.000,lng:71.672,
-    names:{1900:'Namangan',1920:'Namangan',1924:'Namangan',1936:'Namangan',1991:'Namangan',2024:'Namangan'},
-    tier:{1900:2,1920:2,1924:2,1936:1,1991:1,2024:1}},
-  andijan:{lat:40.783,lng:72.344,
-    names:{1900:'Andijan',1920:'Andijan',1924:'Andijan',1936:'Andijan',1991:'Andijan',2024:'Andijan'},
-    tier:{1900:2,1920:2,1924:2,1936:2,1991:2,2024:2}},
-  fergana:{lat:40.384,lng:71.789,
-    names:{1900:'New Margilan',1920:'New Margilan',1924:'Fergana',1936:'Fergana',1991:'Fergana',2024:'Fergana'},
-    tier:{1900:2,1920:2,1924:2,1936:2,1991:2,2024:2}},
-  shymkent:{lat:42.315,lng:69.597,
-    names:{1900:'Chimkent',1920:'Chimkent',1924:'Chimkent',1936:'Chimkent',1991:'Shymkent',2024:'Shymkent'},
-    tier:{1900:2,1920:2,1924:1,1936:1,1991:1,2024:1}},
-  karaganda:{lat:49.802,lng:73.102,
-    names:{1900:'Karaganda',1920:'Karaganda',1924:'Karaganda',1936:'Karaganda',1991:'Karaganda',2024:'Karaganda'},
-    tier:{1900:4,1920:4,1924:3,1936:2,1991:2,2024:2}},
-  aktobe:{lat:50.300,lng:57.210,
-    names:{1900:'Aktyubinsk',1920:'Aktyubinsk',1924:'Aktyubinsk',1936:'Aktyubinsk',1991:'Aktobe',2024:'Aktobe'},
-    tier:{1900:3,1920:3,1924:3,1936:2,1991:2,2024:2}},
-  osh:{lat:40.530,lng:72.802,
-    names:{1900:'Osh',1920:'Osh',1924:'Osh',1936:'Osh',1991:'Osh',2024:'Osh'},
-    tier:{1900:2,1920:2,1924:2,1936:2,1991:2,2024:2}},
-  navoi:{lat:40.103,lng:65.379,
-    names:{1900:'Kermine',1920:'Kermine',1924:'Kermine',1936:'Kermine',1991:'Navoi',2024:'Navoi'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:3,2024:3}},
-  karshi:{lat:38.861,lng:65.798,
-    names:{1900:'Karshi',1920:'Karshi',1924:'Karshi',1936:'Karshi',1991:'Karshi',2024:'Karshi'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  urgench:{lat:41.551,lng:60.632,
-    names:{1900:'Urgench',1920:'Urgench',1924:'Urgench',1936:'Urgench',1991:'Urgench',2024:'Urgench'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  jizzakh:{lat:40.116,lng:67.842,
-    names:{1900:'Jizzakh',1920:'Jizzakh',1924:'Jizzakh',1936:'Jizzakh',1991:'Jizzakh',2024:'Jizzakh'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  termez:{lat:37.224,lng:67.278,
-    names:{1900:'Termez',1920:'Termez',1924:'Termez',1936:'Termez',1991:'Termez',2024:'Termez'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  jalalabad:{lat:40.933,lng:73.002,
-    names:{1900:'Jalal-Abad',1920:'Jalal-Abad',1924:'Jalal-Abad',1936:'Jalal-Abad',1991:'Jalal-Abad',2024:'Jalal-Abad'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  karakol:{lat:42.491,lng:78.390,
-    names:{1900:'Karakol',1920:'Karakol',1924:'Karakol',1936:'Przhevalsk',1991:'Karakol',2024:'Karakol'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  kulob:{lat:38.543,lng:69.784,
-    names:{1900:'Kulyab',1920:'Kulyab',1924:'Kulyab',1936:'Kulyab',1991:'Kulob',2024:'Kulob'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  bokhtar:{lat:37.836,lng:68.781,
-    names:{1900:'Kurgan-Tyube',1920:'Kurgan-Tyube',1924:'Kurgan-Tyube',1936:'Kurgan-Tyube',1991:'Kurgan-Tyube',2024:'Bokhtar'},
-    tier:{1900:4,1920:4,1924:4,1936:3,1991:3,2024:3}},
-  istaravshan:{lat:39.914,lng:69.004,
-    names:{1900:'Ura-Tyube',1920:'Ura-Tyube',1924:'Ura-Tyube',1936:'Ura-Tyube',1991:'Istaravshan',2024:'Istaravshan'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:4,2024:4}},
-  khorog:{lat:37.536,lng:71.513,
-    names:{1900:'Khorog',1920:'Khorog',1924:'Khorog',1936:'Khorog',1991:'Khorog',2024:'Khorog'},
-    tier:{1900:4,1920:4,1924:4,1936:3,1991:3,2024:3}},
-  panjakent:{lat:39.490,lng:67.608,
-    names:{1900:'Panjikent',1920:'Panjikent',1924:'Panjikent',1936:'Panjikent',1991:'Panjakent',2024:'Panjakent'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:4,2024:4}},
-  pavlodar:{lat:52.287,lng:76.954,
-    names:{1900:'Pavlodar',1920:'Pavlodar',1924:'Pavlodar',1936:'Pavlodar',1991:'Pavlodar',2024:'Pavlodar'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  kostanay:{lat:53.214,lng:63.632,
-    names:{1900:'Kostanay',1920:'Kostanay',1924:'Kostanay',1936:'Kostanay',1991:'Kostanay',2024:'Kostanay'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  oral:{lat:51.233,lng:51.366,
-    names:{1900:'Uralsk',1920:'Uralsk',1924:'Uralsk',1936:'Uralsk',1991:'Oral',2024:'Oral'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  petropavl:{lat:54.867,lng:69.149,
-    names:{1900:'Petropavlovsk',1920:'Petropavlovsk',1924:'Petropavlovsk',1936:'Petropavlovsk',1991:'Petropavl',2024:'Petropavl'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  kyzylorda:{lat:44.853,lng:65.509,
-    names:{1900:'Perovsk',1920:'Perovsk',1924:'Kzyl-Orda',1936:'Kzyl-Orda',1991:'Kyzylorda',2024:'Kyzylorda'},
-    tier:{1900:3,1920:3,1924:2,1936:2,1991:3,2024:3}},
-  taraz:{lat:42.900,lng:71.366,
-    names:{1900:'Aulie-Ata',1920:'Aulie-Ata',1924:'Aulie-Ata',1936:'Mirzoyan',1991:'Taraz',2024:'Taraz'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  aktau:{lat:43.650,lng:51.147,
-    names:{1900:'Fort Alexandrovsky',1920:'Fort Alexandrovsky',1924:'Fort Shevchenko',1936:'Fort Shevchenko',1991:'Aktau',2024:'Aktau'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:3,2024:3}},
-  turkestan:{lat:43.301,lng:68.252,
-    names:{1900:'Turkestan',1920:'Turkestan',1924:'Turkestan',1936:'Turkestan',1991:'Turkestan',2024:'Turkestan'},
-    tier:{1900:2,1920:2,1924:3,1936:4,1991:4,2024:4}},
-  ustkamenogorsk:{lat:49.948,lng:82.628,
-    names:{1900:'Ust-Kamenogorsk',1920:'Ust-Kamenogorsk',1924:'Ust-Kamenogorsk',1936:'Ust-Kamenogorsk',1991:'Ust-Kamenogorsk',2024:'Oskemen'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  dashoguz:{lat:41.836,lng:59.967,
-    names:{1900:'Dashkhovuz',1920:'Dashkhovuz',1924:'Dashkhovuz',1936:'Tashauz',1991:'Dashoguz',2024:'Dashoguz'},
-    tier:{1900:3,1920:3,1924:3,1936:3,1991:3,2024:3}},
-  balkanabat:{lat:39.510,lng:54.367,
-    names:{1900:'Jebel',1920:'Jebel',1924:'Nebit-Dag',1936:'Nebit-Dag',1991:'Balkanabat',2024:'Balkanabat'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:4,2024:4}},
-  naryn:{lat:41.429,lng:75.991,
-    names:{1900:'Naryn',1920:'Naryn',1924:'Naryn',1936:'Naryn',1991:'Naryn',2024:'Naryn'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:4,2024:4}},
-  talas:{lat:42.516,lng:72.243,
-    names:{1900:'Talas',1920:'Talas',1924:'Talas',1936:'Talas',1991:'Talas',2024:'Talas'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:4,2024:4}},
-  batken:{lat:40.063,lng:70.819,
-    names:{1900:'Batken',1920:'Batken',1924:'Batken',1936:'Batken',1991:'Batken',2024:'Batken'},
-    tier:{1900:4,1920:4,1924:4,1936:4,1991:4,2024:4}}
+  count: CITY_TABLE.ids.length,
+  lat: Float32Array.from(CITY_TABLE.lat, v => v / ''' + str(cities.COORD_SCALE) + r'''),
+  lng: Float32Array.from(CITY_TABLE.lng, v => v / ''' + str(cities.COORD_SCALE) + r'''),
+  names: CITY_TABLE.names,
+  name: CITY_TABLE.name.map(a => Uint32Array.from(a)),
+  tier: CITY_TABLE.tier.map(a => Uint8Array.from(a))
 };
 
+// Marker clusters per era position and zoom (see cities.build_city_clusters):
+// levels[e][z - minZoom] lists each cluster's representative city and how
+// many shown cities it stands for; null = same as the next deeper zoom
+const CITY_CLUSTERS = ''' + json.dumps(city_clusters, separators=(",", ":")) + r''';
+
 // ===== WATER LABELS =====
-const WATER_LABELS = [
-  {name:'Caspian Sea',lat:42.0,lng:50.5,cls:'water-label-lg'},
-  {name:'Aral Sea',lat:45.0,lng:59.5,cls:'water-label-sm'},
-  {name:'Lake Balkhash',lat:46.5,lng:74.5,cls:'water-label-sm'},
-  {name:'Issyk-Kul',lat:42.45,lng:77.2,cls:'water-label-sm'}
-];
+const WATER_LABELS = ''' + json.dumps(region["water_labels"]) + r''';
 
 // ===== STATE =====
-let currentEra = 2024;
+let currentYear = TIMELINE.end;
+let currentEra = eraForYear(currentYear);
+let currentSegment = segmentForYear(currentYear);
 let caLayer = null;
+let drawnSegment = null;
 let neighborLayer = null;
 let entityLabels = [];
 let neighborLabels = [];
 let cityMarkers = [];
 let highlightedKey = null;
 
+// ===== TIMELINE LOOKUPS =====
+function segmentForYear(year) {
+  // Binary search over the snapshot boundaries
+  const b = TIMELINE.boundaries;
+  let lo = 0, hi = b.length - 2;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (b[mid] <= year) lo = mid; else hi = mid - 1;
+  }
+  return lo;
+}
+
+function eraForYear(year) {
+  // Latest labelled era on or before year (drives city names and panel text)
+  let era = ERAS[0];
+  for (let i = 0; i < ERAS.length && ERAS[i] <= year; i++) era = ERAS[i];
+  return era;
+}
+
 // ===== MAP INIT =====
+const LITE = document.documentElement.classList.contains('lite');
+const HOME = {center: ''' + json.dumps(region["center"]) + r''', zoom: ''' + json.dumps(region["zoom"]) + r'''};
 const map = L.map('map', {
-  center: [42.0, 64.0],
-  zoom: 5,
-  minZoom: 5,
+  center: HOME.center,
+  zoom: HOME.zoom,
+  minZoom: HOME.zoom,
   maxZoom: 14,
-  maxBounds: L.latLngBounds(L.latLng(30, 44), L.latLng(56, 90)),
+  maxBounds: L.latLngBounds(''' + json.dumps(region["bounds"]) + r'''),
   maxBoundsViscosity: 1.0,
   zoomControl: false,
   renderer: L.svg()
 });
 
-L.tileLayer('https://{s}.basemaps.cartocdn.com/rastertiles/voyager_nolabels/{z}/{x}/{y}{r}.png', {
+const baseTiles = L.tileLayer(''' + json.dumps(TILE_URL) + r''', {
   attribution:'&copy; OSM &copy; CARTO',
-  subdomains:'abcd',maxZoom:19
-}).addTo(map);
+  subdomains:''' + json.dumps(TILE_SUBDOMAINS) + r''',maxZoom:19,
+  crossOrigin:true  // CORS tiles, so the service worker can tell failures apart
+});
+const tilesReady = new Promise(resolve => baseTiles.once('load', resolve));
+if (!LITE) baseTiles.addTo(map);
 
 L.control.scale({position:'bottomleft',imperial:false}).addTo(map);
 
-// ===== NEIGHBORS (static — same in all eras) =====
-function renderNeighbors() {
-  if (neighborLayer) map.removeLayer(neighborLayer);
-  neighborLabels.forEach(m => map.removeLayer(m));
-  neighborLabels = [];
+// ===== SNAPSHOT =====
+// The static SVG of the default view painted from the HTML. It stays up
+// until the polygons and tiles are on the map (or the user moves it), and
+// in lite mode it is the only view: switching eras swaps its layer.
+const snapshotEl = document.getElementById('snapshot');
+let snapshotSet = null;
 
-  const features = Object.entries(GEODATA.neighbors).map(([code, geom]) => ({
-    type: 'Feature',
-    properties: { code },
-    geometry: geom
-  }));
+function showSnapshot(seg) {
+  snapshotSet = snapshotSet || JSON.parse(document.getElementById('snapshots').textContent);
+  snapshotEl.innerHTML = snapshotSet.base + snapshotSet.layers[seg] + '</svg>';
+}
+
+function dismissSnapshot() {
+  if (LITE || !snapshotEl.isConnected || snapshotEl.classList.contains('done')) return;
+  snapshotEl.classList.add('done');
+  setTimeout(() => snapshotEl.remove(), 400);
+}
+
+map.once('movestart', dismissSnapshot);
+
+// ===== GEODATA (decoded off the main thread) =====
+const geoCache = {segments: {}, neighbors: null, morphs: {}, changes: null, water: null};
+const geoWaiting = {};
+let geoPort = null;
+
+function onGeoMessage(msg) {
+  if (msg.type === 'neighbors') {
+    geoCache.neighbors = {codes: msg.codes, meta: msg.meta, batch: msg.batch, vertexCount: msg.batch.vertexCount, latlngs: null};
+    resolveGeo('neighbors', geoCache.neighbors);
+  } else if (msg.type === 'segment') {
+    msg.entities.forEach(e => {
+      e.id = e.era + ':' + e.key;
+      e.center = e.center || HIST_LABEL_POS[e.key] || (e.meta && e.meta.anchor) || HOME.center;
+    });
+    geoCache.segments[msg.index] = {entities: msg.entities, batch: msg.batch, vertexCount: msg.batch.vertexCount, latlngs: null};
+    resolveGeo('segment:' + msg.index, geoCache.segments[msg.index]);
+  } else if (msg.type === 'morph') {
+    geoCache.morphs[msg.year] = msg;
+    resolveGeo('morph:' + msg.year, msg);
+  } else if (msg.type === 'changes') {
+    geoCache.changes = msg.changes;
+    resolveGeo('changes', msg.changes);
+  } else if (msg.type === 'water') {
+    geoCache.water = msg.bodies;
+    resolveGeo('water', msg.bodies);
+  }
+}
+
+function resolveGeo(id, value) {
+  const w = geoWaiting[id];
+  if (!w) return;
+  delete geoWaiting[id];
+  w.resolve(value);
+}
+
+function requestGeo(id, msg, cached) {
+  if (cached) return Promise.resolve(cached);
+  if (!geoWaiting[id]) {
+    let resolve;
+    const promise = new Promise(r => { resolve = r; });
+    geoWaiting[id] = {promise, resolve, msg};
+    geoPort.postMessage(msg);
+  }
+  return geoWaiting[id].promise;
+}
+
+function ensureSegment(index) {
+  const refs = TIMELINE.segments[index].map(i => TIMELINE.entities[i].slice(0, 2));
+  return requestGeo('segment:' + index, {type: 'segment', index, refs}, geoCache.segments[index]);
+}
+
+function ensureMorph(year) {
+  return requestGeo('morph:' + year, {type: 'morph', year}, geoCache.morphs[year]);
+}
+
+function ensureNeighbors() {
+  return requestGeo('neighbors', {type: 'neighbors'}, geoCache.neighbors);
+}
+
+function ensureChanges() {
+  return requestGeo('changes', {type: 'changes'}, geoCache.changes);
+}
+
+function ensureWater() {
+  return requestGeo('water', {type: 'water'}, geoCache.water);
+}
+
+function startInlineGeo() {
+  // Same worker source, run on the main thread (no Worker support, or blocked by CSP)
+  const inner = {postMessage: msg => setTimeout(() => onGeoMessage(msg), 0)};
+  new Function('self', document.getElementById('geo-worker').textContent)(inner);
+  return {postMessage: msg => setTimeout(() => inner.onmessage({data: msg}), 0)};
+}
+
+function startGeoWorker() {
+  const init = {type: 'init', text: document.getElementById('geodata').textContent, eraDefs: ERA_ENTITIES};
+  try {
+    const src = document.getElementById('geo-worker').textContent;
+    const worker = new Worker(URL.createObjectURL(new Blob([src], {type: 'text/javascript'})));
+    worker.onmessage = e => onGeoMessage(e.data);
+    worker.onerror = () => {
+      worker.terminate();
+      geoPort = startInlineGeo();
+      geoPort.postMessage(init);
+      Object.values(geoWaiting).forEach(w => geoPort.postMessage(w.msg));
+    };
+    geoPort = worker;
+  } catch (err) {
+    geoPort = startInlineGeo();
+  }
+  geoPort.postMessage(init);
+}
+
+function decodeBatch(batch) {
+  // Typed arrays -> LatLng[][][] per feature (multipolygon nesting)
+  if (batch.projected) return decodeProjectedBatch(batch);
+  const {coords, ringLen, polyRings, featPolys} = batch;
+  const out = new Array(featPolys.length);
+  let c = 0, ri = 0, pi = 0;
+  for (let f = 0; f < featPolys.length; f++) {
+    const polys = new Array(featPolys[f]);
+    for (let p = 0; p < polys.length; p++) {
+      const rings = new Array(polyRings[pi++]);
+      for (let r = 0; r < rings.length; r++) {
+        const ring = new Array(ringLen[ri++]);
+        for (let k = 0; k < ring.length; k++, c += 2) ring[k] = new L.LatLng(coords[c], coords[c + 1]);
+        rings[r] = ring;
+      }
+      polys[p] = rings;
+    }
+    out[f] = polys;
+  }
+  return out;
+}
 
-  neighborLayer = L.geoJSON({type:'FeatureCollection',features}, {
+// ===== PRE-PROJECTED GEOMETRY (geodata built with --mercator) =====
+// Rings stay Float32Array views of [y, x] base-zoom pixels; ProjectedPolygon
+// projects them with a multiply by 2^zoom instead of running every vertex
+// through L.CRS.EPSG3857
+function unprojectPx0(x, y) {
+  const lat = (2 * Math.atan(Math.exp(Math.PI * (1 - y / 128))) - Math.PI / 2) * 180 / Math.PI;
+  return L.latLng(lat, x / 256 * 360 - 180);
+}
+
+function decodeProjectedBatch(batch) {
+  // One {rings, bounds} per feature; all polygons' rings are flattened, which
+  // is what Leaflet's own projection does for multipolygons anyway
+  const {coords, ringLen, polyRings, featPolys} = batch;
+  const out = new Array(featPolys.length);
+  let c = 0, ri = 0, pi = 0;
+  for (let f = 0; f < featPolys.length; f++) {
+    const rings = [];
+    let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+    for (let p = 0; p < featPolys[f]; p++) {
+      for (let r = polyRings[pi++]; r > 0; r--) {
+        const end = c + ringLen[ri++] * 2;
+        rings.push(coords.subarray(c, end));
+        for (; c < end; c += 2) {
+          if (coords[c] < minY) minY = coords[c];
+          if (coords[c] > maxY) maxY = coords[c];
+          if (coords[c + 1] < minX) minX = coords[c + 1];
+          if (coords[c + 1] > maxX) maxX = coords[c + 1];
+        }
+      }
+    }
+    out[f] = {rings, bounds: rings.length ? L.latLngBounds(unprojectPx0(minX, maxY), unprojectPx0(maxX, minY)) : null};
+  }
+  return out;
+}
+
+const ProjectedPolygon = L.Polygon.extend({
+  initialize(feature, options) {
+    L.setOptions(this, options);
+    this._pxRings = feature.rings;
+    this._latlngs = [];
+    this._bounds = feature.bounds || L.latLngBounds([]);
+  },
+
+  getBounds() {
+    return this._bounds;
+  },
+
+  _project() {
+    // Same rounding as map.latLngToLayerPoint, minus the trigonometry
+    const scale = Math.pow(2, this._map.getZoom());
+    const origin = this._map.getPixelOrigin();
+    const pxBounds = new L.Bounds();
+    this._rings = this._pxRings.map(r => {
+      const ring = new Array(r.length / 2);
+      for (let k = 0, c = 0; k < ring.length; k++, c += 2) {
+        ring[k] = new L.Point(Math.round(r[c + 1] * scale) - origin.x, Math.round(r[c] * scale) - origin.y);
+        pxBounds.extend(ring[k]);
+      }
+      return ring;
+    });
+    if (pxBounds.isValid()) {
+      this._rawPxBounds = pxBounds;
+      this._updateBounds();
+    }
+  }
+});
+
+function cachedLatLngs(entry) {
+  if (!entry.latlngs) entry.latlngs = decodeBatch(entry.batch);
+  return entry.latlngs;
+}
+
+function featureLayer(propsList, latlngs, options) {
+  // L.geoJSON group built from pre-decoded rings; setStyle(fn) keeps working via layer.feature
+  const group = L.geoJSON(null, options);
+  propsList.forEach((properties, i) => {
+    const feature = {type: 'Feature', properties, geometry: null};
+    const layerOptions = L.extend({
+      interactive: options.interactive !== false,
+      renderer: options.renderer
+    }, options.style(feature));
+    const layer = latlngs[i].rings ? new ProjectedPolygon(latlngs[i], layerOptions) : L.polygon(latlngs[i], layerOptions);
+    layer.feature = feature;
+    if (options.onEachFeature) options.onEachFeature(feature, layer);
+    group.addLayer(layer);
+  });
+  return group;
+}
+
+// ===== NEIGHBORS (static — same in all eras) =====
+// Each renderer is split into prepare (build layers off the map) and commit
+// (swap them in), so an era switch can build everything during the fade and
+// touch the DOM once. renderX() does both for one-off redraws.
+function prepareNeighbors() {
+  const nb = geoCache.neighbors;
+  if (!nb) return null;
+  // Geometry never changes between eras: reuse the drawn layer, relabel only
+  const layer = neighborLayer || featureLayer(nb.codes.map((code, i) => ({ code, meta: nb.meta[i] })), cachedLatLngs(nb), {
     style: f => {
       const s = NEIGHBOR_STYLES[f.properties.code];
       return {
@@ -599,9 +1202,10 @@ function renderNeighbors() {
     },
     interactive: false,
     renderer: L.svg()
-  }).addTo(map);
+  });
 
   // Neighbor labels
+  const labels = [];
   Object.entries(NEIGHBOR_STYLES).forEach(([code, s]) => {
     const pos = NEIGHBOR_LABEL_POS[code];
     if (!pos) return;
@@ -612,146 +1216,268 @@ function renderNeighbors() {
       html: displayName,
       iconSize: null
     });
-    const m = L.marker(pos, {icon, interactive:false}).addTo(map);
-    neighborLabels.push(m);
+    labels.push(L.marker(pos, {icon, interactive:false}));
   });
+  return {layer, labels};
 }
 
-// ===== CA ENTITIES (change per era) =====
-function getEraEntities(era) {
-  // For 1900, 1920, 1924: use historical data from GEODATA
-  if (GEODATA.historical[era]) {
-    const hist = GEODATA.historical[era];
-    return Object.entries(hist).map(([key, entity]) => ({
-      key,
-      geometry: entity.geometry,
-      color: entity.color,
-      name: entity.name,
-      subtitle: entity.subtitle,
-      center: HIST_LABEL_POS[key] || [42, 64]
-    }));
+function commitNeighbors(prepared) {
+  if (!prepared) return;
+  if (neighborLayer !== prepared.layer) {
+    if (neighborLayer) map.removeLayer(neighborLayer);
+    neighborLayer = prepared.layer.addTo(map);
+    cullToView();
   }
-  // For 1936, 1991, 2024: use modern geo with era-specific metadata
-  const entDef = ERA_ENTITIES[era];
-  if (!entDef) return [];
-  return Object.entries(entDef).map(([key, ent]) => ({
-    key,
-    geometry: GEODATA.modern[ent.code],
-    color: ent.color,
-    name: ent.name,
-    subtitle: ent.subtitle,
-    center: ent.center
-  }));
+  neighborLabels.forEach(m => map.removeLayer(m));
+  neighborLabels = prepared.labels;
+  neighborLabels.forEach(m => m.addTo(map));
 }
 
-function renderCA() {
-  if (caLayer) map.removeLayer(caLayer);
-  entityLabels.forEach(m => map.removeLayer(m));
-  entityLabels = [];
+function renderNeighbors() {
+  commitNeighbors(prepareNeighbors());
+}
 
-  const entities = getEraEntities(currentEra);
-  const features = entities.map(e => ({
-    type: 'Feature',
-    properties: { key: e.key, color: e.color, name: e.name, subtitle: e.subtitle },
-    geometry: e.geometry
-  }));
+// ===== CA ENTITIES (change per era) =====
+function getSegmentEntities(index) {
+  // Entities alive in a timeline segment, assembled by the geo worker (ensureSegment)
+  const cached = geoCache.segments[index];
+  return cached ? cached.entities : [];
+}
 
-  caLayer = L.geoJSON({type:'FeatureCollection',features}, {
-    style: f => ({
-      fillColor: f.properties.color,
-      fillOpacity: f.properties.key === highlightedKey ? 0.65 : 0.5,
-      color: f.properties.key === highlightedKey ? '#fff' : 'rgba(255,255,255,0.35)',
-      weight: f.properties.key === highlightedKey ? 2.5 : 1.5
-    }),
-    onEachFeature: (f, layer) => {
-      layer.on('mouseover', () => {
+const caRenderer = L.svg();
+
+function caStyle(f) {
+  const hi = f.properties.key === highlightedKey;
+  return {
+    fillColor: f.properties.color,
+    fillOpacity: hi ? 0.65 : 0.5,
+    color: hi ? '#fff' : 'rgba(255,255,255,0.35)',
+    weight: hi ? 2.5 : 1.5
+  };
+}
+
+function caProps(e) {
+  return { key: e.id, color: e.color, name: e.name, subtitle: e.subtitle, meta: e.meta };
+}
+
+function caFeatureLayer(props, latlngs) {
+  // Handlers read the feature's properties when they fire, so a polygon
+  // kept across an era switch picks up its new key and colour
+  return featureLayer(props, latlngs, {
+    style: caStyle,
+    onEachFeature: (f, featLayer) => {
+      featLayer.on('mouseover', () => {
         highlightedKey = f.properties.key;
-        caLayer.setStyle(feat => ({
-          fillColor: feat.properties.color,
-          fillOpacity: feat.properties.key === highlightedKey ? 0.65 : 0.5,
-          color: feat.properties.key === highlightedKey ? '#fff' : 'rgba(255,255,255,0.35)',
-          weight: feat.properties.key === highlightedKey ? 2.5 : 1.5
-        }));
+        caLayer.setStyle(caStyle);
       });
-      layer.on('mouseout', () => {
+      featLayer.on('mouseout', () => {
         highlightedKey = null;
-        caLayer.setStyle(feat => ({
-          fillColor: feat.properties.color,
-          fillOpacity: 0.5,
-          color: 'rgba(255,255,255,0.35)',
-          weight: 1.5
-        }));
+        caLayer.setStyle(caStyle);
       });
-      layer.on('click', () => showInfoPanel(f.properties.key));
+      featLayer.on('click', () => showInfoPanel(f.properties.key));
     },
-    renderer: L.svg()
-  }).addTo(map);
+    renderer: caRenderer
+  });
+}
 
-  // Entity labels
-  entities.forEach(e => {
-    let html = e.name;
-    if (e.subtitle) html += '<span class="sub">' + e.subtitle + '</span>';
-    const icon = L.divIcon({
-      className: 'entity-label entity-label-ca',
-      html,
-      iconSize: null
-    });
-    const m = L.marker(e.center, {icon, interactive:false}).addTo(map);
-    entityLabels.push(m);
+function entityIcon(e) {
+  let html = e.name;
+  if (e.subtitle) html += '<span class="sub">' + e.subtitle + '</span>';
+  return L.divIcon({
+    className: 'entity-label entity-label-ca',
+    html,
+    iconSize: null
   });
 }
 
-// ===== INFO PANEL =====
-function showInfoPanel(key) {
-  const eraData = INFO_DATA[currentEra];
-  if (!eraData || !eraData[key]) return;
-  const data = eraData[key];
+function entityLabel(e) {
+  const m = L.marker(e.center, {icon: entityIcon(e), interactive:false});
+  m.entityId = e.id;
+  m.meta = e.meta;
+  return m;
+}
+
+function changeSet(from, to) {
+  // The generator's change set for a switch between neighbouring segments,
+  // oriented from -> to; null for other switches or older geodata
+  if (from === null || Math.abs(to - from) !== 1 || !geoCache.changes) return null;
+  const c = geoCache.changes[TIMELINE.boundaries[Math.max(from, to)]];
+  if (!c) return null;
+  if (to > from) return c;
+  return {keep: c.keep.map(([ea, ka, eb, kb, fields]) => [eb, kb, ea, ka, fields]),
+          add: c.remove, remove: c.add};
+}
+
+function prepareCA(seg, change) {
+  const cached = geoCache.segments[seg];
+  if (!cached) return {seg, layer: null, labels: []};
+  if (change && caLayer) {
+    const inPlace = prepareCAChanges(seg, cached, change);
+    if (inPlace) return inPlace;
+  }
+  const entities = cached.entities;
+  const layer = caFeatureLayer(entities.map(caProps), cachedLatLngs(cached));
+  return {seg, layer, labels: entities.map(entityLabel)};
+}
+
+function prepareCAChanges(seg, cached, change) {
+  // Update the drawn segment in place: kept polygons get new properties
+  // (and a restyle or relabel when the change set says so); only added
+  // entities are decoded and built. null when the drawn layers don't match
+  // the change set, so the caller rebuilds everything.
+  const entities = new Map(cached.entities.map((e, i) => [e.id, i]));
+  const polys = new Map();
+  caLayer.eachLayer(l => polys.set(l.feature.properties.key, l));
+  const labels = new Map(entityLabels.map(m => [m.entityId, m]));
+  const kept = [];
+  for (const [ea, ka, eb, kb, fields] of change.keep) {
+    const poly = polys.get(ea + ':' + ka), label = labels.get(ea + ':' + ka);
+    const i = entities.get(eb + ':' + kb);
+    if (!poly || !label || i === undefined) return null;
+    kept.push({poly, label, entity: cached.entities[i], fields});
+  }
+  const removed = [];
+  for (const [era, key] of change.remove) {
+    const id = era + ':' + key;
+    if (!polys.has(id)) return null;
+    removed.push({poly: polys.get(id), label: labels.get(id)});
+  }
+  const added = change.add.map(([era, key]) => entities.get(era + ':' + key));
+  if (added.includes(undefined)) return null;
+  const latlngs = added.length ? cachedLatLngs(cached) : [];
+  return {
+    seg, from: drawnSegment, kept, removed,
+    layer: added.length ? caFeatureLayer(added.map(i => caProps(cached.entities[i])), added.map(i => latlngs[i])) : null,
+    labels: added.map(i => entityLabel(cached.entities[i]))
+  };
+}
+
+function commitCA(prepared) {
+  if (prepared.kept && (prepared.from !== drawnSegment || !caLayer)) {
+    // Something else was committed since this was prepared
+    prepared = prepareCA(prepared.seg);
+  }
+  if (prepared.kept) {
+    commitCAChanges(prepared);
+  } else {
+    if (caLayer) map.removeLayer(caLayer);
+    entityLabels.forEach(m => map.removeLayer(m));
+    caLayer = prepared.layer ? prepared.layer.addTo(map) : null;
+    entityLabels = prepared.labels;
+    entityLabels.forEach(m => m.addTo(map));
+  }
+  drawnSegment = prepared.seg;
+  cullToView();
+}
+
+function commitCAChanges(prepared) {
+  prepared.removed.forEach(r => {
+    caLayer.removeLayer(r.poly);
+    if (r.label) map.removeLayer(r.label);
+  });
+  const gone = new Set(prepared.removed.map(r => r.label));
+  entityLabels = entityLabels.filter(m => !gone.has(m));
+  prepared.kept.forEach(({poly, label, entity, fields}) => {
+    poly.feature.properties = caProps(entity);
+    label.entityId = entity.id;
+    label.meta = entity.meta;
+    if (fields.includes('style')) poly.setStyle(caStyle(poly.feature));
+    if (fields.includes('label')) {
+      label.setIcon(entityIcon(entity));
+      label.setLatLng(entity.center);
+    }
+  });
+  if (prepared.layer) prepared.layer.eachLayer(l => caLayer.addLayer(l));
+  prepared.labels.forEach(m => m.addTo(map));
+  entityLabels = entityLabels.concat(prepared.labels);
+}
+
+function renderCA() {
+  commitCA(prepareCA(currentSegment));
+}
+
+// ===== EXTENTS & CULLING =====
+// Bboxes from GEO.meta: legend clicks fit the entity's real extent, and
+// features whose bbox misses the view are taken off the map without
+// touching their coordinates
+function metaBounds(meta) {
+  return L.latLngBounds([meta.bbox[1], meta.bbox[0]], [meta.bbox[3], meta.bbox[2]]);
+}
+
+function flyToEntity(meta, center) {
+  if (meta) map.flyToBounds(metaBounds(meta), {duration: 1.2, padding: [40, 40], maxZoom: 7});
+  else map.flyTo(center, 6, {duration: 1.2});
+}
+
+function bboxInView(meta, view) {
+  if (!meta) return true;
+  const b = meta.bbox;
+  return b[0] <= view.getEast() && b[2] >= view.getWest() && b[1] <= view.getNorth() && b[3] >= view.getSouth();
+}
+
+function cullToView() {
+  const view = map.getBounds().pad(0.25);
+  const cull = (l, meta) => {
+    const show = bboxInView(meta, view);
+    if (show !== map.hasLayer(l)) show ? map.addLayer(l) : map.removeLayer(l);
+  };
+  [caLayer, neighborLayer].forEach(group => {
+    if (group && map.hasLayer(group)) group.eachLayer(l => cull(l, l.feature.properties.meta));
+  });
+  entityLabels.forEach(m => cull(m, m.meta));
+}
+
+map.on('moveend', cullToView);
 
-  // Get entity name
-  let name = key;
-  const entities = getEraEntities(currentEra);
-  const ent = entities.find(e => e.key === key);
-  if (ent) name = ent.name;
+// ===== INFO PANEL =====
+function showInfoPanel(id) {
+  // id is 'era:key' — an entity's data lives under the era that defines it
+  const ent = getSegmentEntities(currentSegment).find(e => e.id === id);
+  if (!ent) return;
+  // Entities without figures in the profile still show name and area
+  const data = (INFO_DATA[ent.era] || {})[ent.key] || {pop: '\u2014', area: '\u2014', gdp: '\u2014', currency: '\u2014'};
 
   const panel = document.getElementById('info-panel');
-  document.getElementById('info-name').textContent = name;
-  document.getElementById('info-subtitle').textContent = ent ? (ent.subtitle || '') : '';
+  document.getElementById('info-name').textContent = ent.name;
+  document.getElementById('info-subtitle').textContent = ent.subtitle || '';
   document.getElementById('info-pop').textContent = data.pop;
-  document.getElementById('info-area').textContent = data.area;
+  // Computed geodesic area of the drawn shape when geodata carries it
+  document.getElementById('info-area').textContent = ent.meta ? formatArea(ent.meta.area) : data.area;
   document.getElementById('info-gdp').textContent = data.gdp;
   document.getElementById('info-currency').textContent = data.currency;
   panel.classList.add('visible');
 }
 
+function formatArea(km2) {
+  const step = km2 >= 100000 ? 1000 : 100;
+  return '~' + (Math.round(km2 / step) * step).toLocaleString('en-US') + ' km\u00b2';
+}
+
 function closeInfoPanel() {
   document.getElementById('info-panel').classList.remove('visible');
 }
 
 // ===== LEGEND =====
-function buildLegend() {
-  const caDiv = document.getElementById('legend-ca');
-  const nbDiv = document.getElementById('legend-neighbors');
-  const caTitle = document.getElementById('legend-ca-title');
-  caDiv.innerHTML = '';
-  nbDiv.innerHTML = '';
-
-  const entities = getEraEntities(currentEra);
+function prepareLegend(seg) {
+  const entities = getSegmentEntities(seg);
+  const ca = document.createDocumentFragment();
+  const nb = document.createDocumentFragment();
 
   // Set section title based on era
-  if (currentEra <= 1924) caTitle.textContent = 'Political Entities';
-  else if (currentEra === 1936) caTitle.textContent = 'Soviet Republics';
-  else if (currentEra === 1991) caTitle.textContent = 'New Republics';
-  else caTitle.textContent = 'Countries';
+  let title = 'Countries';
+  if (currentEra <= 1924) title = 'Political Entities';
+  else if (currentEra === 1936) title = 'Soviet Republics';
+  else if (currentEra === 1991) title = 'New Republics';
 
   entities.forEach(e => {
     const item = document.createElement('div');
     item.className = 'legend-item';
     item.innerHTML = '<div class="legend-swatch" style="background:'+e.color+'"></div><span>'+e.name+'</span>';
     item.addEventListener('click', () => {
-      map.flyTo(e.center, 6, {duration:1.2});
-      showInfoPanel(e.key);
+      flyToEntity(e.meta, e.center);
+      showInfoPanel(e.id);
     });
-    caDiv.appendChild(item);
+    ca.appendChild(item);
   });
 
   Object.entries(NEIGHBOR_STYLES).forEach(([code, s]) => {
@@ -761,11 +1487,24 @@ function buildLegend() {
     if (currentEra === 1991 && code === 'RU') dn = 'Russian Federation';
     item.innerHTML = '<div class="legend-swatch" style="background:'+s.fill+'"></div><span>'+dn+'</span>';
     item.addEventListener('click', () => {
+      const nbCache = geoCache.neighbors;
+      const meta = nbCache ? nbCache.meta[nbCache.codes.indexOf(code)] : null;
       const pos = NEIGHBOR_LABEL_POS[code];
-      if (pos) map.flyTo(pos, 6, {duration:1.2});
+      if (meta || pos) flyToEntity(meta, pos);
     });
-    nbDiv.appendChild(item);
+    nb.appendChild(item);
   });
+  return {title, ca, nb};
+}
+
+function commitLegend(prepared) {
+  document.getElementById('legend-ca-title').textContent = prepared.title;
+  document.getElementById('legend-ca').replaceChildren(prepared.ca);
+  document.getElementById('legend-neighbors').replaceChildren(prepared.nb);
+}
+
+function buildLegend() {
+  commitLegend(prepareLegend(currentSegment));
 }
 
 // ===== WATER LABELS =====
@@ -779,37 +1518,190 @@ WATER_LABELS.forEach(w => {
   waterMarkers.push(L.marker([w.lat,w.lng],{icon,interactive:false}).addTo(map));
 });
 
+// ===== WATER BODIES =====
+// Shorelines that move with the timeline (the Aral Sea). Each body has one
+// keyframe ring per dated year; years in between lerp the two neighbouring
+// keyframes vertex by vertex, years outside the series hold the nearest
+// one. Drawn above the era polygons, so era fades leave them alone.
+map.createPane('water').style.zIndex = 450;
+const waterRenderer = L.svg({pane: 'water'});
+let waterLayers = [];
+
+function shorelineAt(body, year) {
+  // [keyframe index, blend towards the next one]
+  const ys = body.years;
+  if (year <= ys[0]) return [0, 0];
+  let i = 0;
+  while (i < ys.length - 1 && ys[i + 1] <= year) i++;
+  return i === ys.length - 1 ? [i, 0] : [i, (year - ys[i]) / (ys[i + 1] - ys[i])];
+}
+
+function shorelineLatLngs(body, i, t) {
+  const f = body.frames, n = body.n, a = i * n * 2, b = a + n * 2;
+  const ring = new Array(n);
+  for (let k = 0, c = 0; k < n; k++, c += 2) {
+    ring[k] = t ? new L.LatLng(f[a + c] + (f[b + c] - f[a + c]) * t, f[a + c + 1] + (f[b + c + 1] - f[a + c + 1]) * t)
+                : new L.LatLng(f[a + c], f[a + c + 1]);
+  }
+  return ring;
+}
+
+function renderWater() {
+  const bodies = geoCache.water;
+  if (!bodies) return;
+  bodies.forEach((body, j) => {
+    const [i, t] = shorelineAt(body, currentYear);
+    const id = i + ':' + t;
+    let layer = waterLayers[j];
+    if (layer && layer.shorelineId === id) return;  // e.g. every year before the series starts
+    const latlngs = shorelineLatLngs(body, i, t);
+    if (layer) layer.setLatLngs(latlngs);
+    else layer = waterLayers[j] = L.polygon(latlngs, {
+      pane: 'water', renderer: waterRenderer, interactive: false,
+      stroke: false, fillColor: '#aacbd8', fillOpacity: 1
+    }).addTo(map);
+    layer.shorelineId = id;
+  });
+}
+
 // ===== CITIES =====
-function tierMinZoom(t) {
-  if (t === 0) return 0; // capital — always visible
-  if (t === 1) return 5;
-  if (t === 2) return 6;
-  if (t === 3) return 7;
-  return 8;
+function clusterLevel(e, zoom) {
+  const c = CITY_CLUSTERS, levels = c.levels[e];
+  let i = Math.min(Math.max(Math.round(zoom), c.minZoom), c.maxZoom + 1) - c.minZoom;
+  while (!levels[i]) i++;
+  return levels[i];
 }
 
-function renderCities() {
-  cityMarkers.forEach(m => map.removeLayer(m));
-  cityMarkers = [];
-  const z = map.getZoom();
-
-  Object.values(CITIES).forEach(city => {
-    const t = city.tier[currentEra];
-    if (t === undefined || z < tierMinZoom(t)) return;
-    const name = city.names[currentEra] || '';
-    if (!name) return;
-    const isCap = (t === 0);
+function prepareCities(zoom) {
+  // The precomputed clusters for the zoom, kept to those in (a padded) view
+  const e = ERAS.indexOf(currentEra);
+  const level = clusterLevel(e, zoom);
+  const tiers = CITIES.tier[e], nameIds = CITIES.name[e];
+  const view = map.getBounds().pad(0.25);
+  const west = view.getWest(), east = view.getEast(), south = view.getSouth(), north = view.getNorth();
+  const items = [];
+  for (let k = 0; k < level.city.length; k++) {
+    const i = level.city[k];
+    const lat = CITIES.lat[i], lng = CITIES.lng[i];
+    if (lat < south || lat > north || lng < west || lng > east) continue;
+    const count = level.count ? level.count[k] : 1;
+    const isCap = (tiers[i] === 0);
+    const html = '<div class="city-dot'+(isCap?' capital':'')+'"></div><div class="city-name'+(isCap?' capital-name':'')+'">'+
+      CITIES.names[nameIds[i]]+(count > 1 ? '<span class="city-count">+'+(count - 1)+'</span>' : '')+'</div>';
+    items.push({id: i + '|' + html, lat, lng, html});
+  }
+  return {zoom, items};
+}
+
+function commitCities(prepared) {
+  // Markers whose city and label are unchanged stay on the map
+  const old = new Map(cityMarkers.map(m => [m.cityId, m]));
+  cityMarkers = prepared.items.map(c => {
+    const kept = old.get(c.id);
+    if (kept) {
+      old.delete(c.id);
+      return kept;
+    }
     const icon = L.divIcon({
       className:'city-marker',
-      html:'<div class="city-dot'+(isCap?' capital':'')+'"></div><div class="city-name'+(isCap?' capital-name':'')+'">'+name+'</div>',
+      html:c.html,
       iconSize:[90,28],
       iconAnchor:[45,6]
     });
-    cityMarkers.push(L.marker([city.lat,city.lng],{icon,interactive:false}).addTo(map));
+    const m = L.marker([c.lat,c.lng],{icon,interactive:false});
+    m.cityId = c.id;
+    return m.addTo(map);
   });
+  old.forEach(m => map.removeLayer(m));
 }
 
-map.on('zoomend', renderCities);
+function renderCities() {
+  commitCities(prepareCities(map.getZoom()));
+}
+
+// moveend also fires after every zoom
+map.on('moveend', renderCities);
+
+// ===== ERA MORPHS =====
+// Border animation between neighbouring segments: the generator stores
+// vertex-matched rings (morph.n points per pair), so each frame is a plain
+// lerp of two Float32Arrays into the pair's live LatLng ring
+const MORPH_MS = 650;
+const REDUCED_MOTION = !!(window.matchMedia && window.matchMedia('(prefers-reduced-motion: reduce)').matches);
+let morphLayer = null;
+// One <svg> for every morph polygon, reused across switches
+const morphRenderer = L.svg();
+let morphFrame = 0;
+
+function stopMorph() {
+  if (morphFrame) cancelAnimationFrame(morphFrame);
+  morphFrame = 0;
+  if (morphLayer) map.removeLayer(morphLayer);
+  morphLayer = null;
+}
+
+function hexToRgb(hex) {
+  const v = parseInt(hex.slice(1), 16);
+  return [(v >> 16) & 255, (v >> 8) & 255, v & 255];
+}
+
+function morphToSegment(morph, prev, seg, year, token, prepared) {
+  // The morph is stored for the forward direction; going back plays it reversed
+  const forward = seg > prev;
+  const before = geoCache.segments[Math.min(prev, seg)].entities;
+  const after = geoCache.segments[Math.max(prev, seg)].entities;
+  const colorOf = (list, era, key) => {
+    const e = list.find(x => x.era === era && x.key === key);
+    return hexToRgb(e ? e.color : '#888888');
+  };
+
+  if (caLayer) { map.removeLayer(caLayer); caLayer = null; }
+  entityLabels.forEach(m => map.removeLayer(m));
+  entityLabels = [];
+  const overlayPane = document.querySelector('.leaflet-overlay-pane');
+  if (overlayPane) overlayPane.style.opacity = '1';
+
+  const n = morph.n;
+  const first = forward ? morph.from : morph.to;
+  morphLayer = L.layerGroup().addTo(map);
+  const shapes = morph.pairs.map(([ea, ka, eb, kb], p) => {
+    const ring = [];
+    for (let k = 0, c = p * n * 2; k < n; k++, c += 2) ring.push(new L.LatLng(first[c + 1], first[c]));
+    const poly = L.polygon(ring, {
+      interactive: false, renderer: morphRenderer,
+      fillOpacity: 0.5, color: 'rgba(255,255,255,0.35)', weight: 1.5
+    }).addTo(morphLayer);
+    return {poly, ring: poly.getLatLngs()[0], from: colorOf(before, ea, ka), to: colorOf(after, eb, kb)};
+  });
+
+  const start = performance.now();
+  const frame = now => {
+    const t = Math.min(1, (now - start) / MORPH_MS);
+    const eased = t < 0.5 ? 2 * t * t : 1 - Math.pow(-2 * t + 2, 2) / 2;
+    const u = forward ? eased : 1 - eased;
+    const a = morph.from, b = morph.to;
+    shapes.forEach((s, p) => {
+      for (let k = 0, c = p * n * 2; k < n; k++, c += 2) {
+        s.ring[k].lng = a[c] + (b[c] - a[c]) * u;
+        s.ring[k].lat = a[c + 1] + (b[c + 1] - a[c + 1]) * u;
+      }
+      const rgb = s.from.map((v, i) => Math.round(v + (s.to[i] - v) * u));
+      s.poly.setStyle({fillColor: 'rgb(' + rgb.join(',') + ')'});
+      s.poly.redraw();
+    });
+    if (t < 1) {
+      morphFrame = requestAnimationFrame(frame);
+      return;
+    }
+    // Last frame: drop the morph shapes and commit the prepared layers together
+    morphFrame = 0;
+    stopMorph();
+    if (token !== eraSwitch.token) return;
+    commitEraLayers(prepared);
+    perfEraEvent('commit', year);
+  };
+  morphFrame = requestAnimationFrame(frame);
+}
 
 // ===== TIMELINE =====
 const trackEl = document.getElementById('timeline-track');
@@ -818,85 +1710,378 @@ const yearEl = document.getElementById('timeline-year');
 const eraEl = document.getElementById('timeline-era');
 const fillEl = document.getElementById('timeline-fill');
 
-// Build dots
+const sliderEl = document.getElementById('timeline-slider');
+sliderEl.min = TIMELINE.start;
+sliderEl.max = TIMELINE.end;
+sliderEl.step = 1;
+sliderEl.value = currentYear;
+
+function yearPosition(year) {
+  // Track inset matches the 6px ends of #timeline-line
+  const p = (year - TIMELINE.start) / Math.max(TIMELINE.end - TIMELINE.start, 1);
+  return 'calc(6px + (100% - 12px) * ' + p + ')';
+}
+
+// Build dots at their true position on the year axis
 ERAS.forEach((era, i) => {
   const dot = document.createElement('div');
   dot.className = 'timeline-dot' + (era === currentEra ? ' active' : '');
   dot.dataset.era = era;
   dot.title = era + ' \u2014 ' + ERA_NAMES[era];
+  dot.style.left = yearPosition(era);
   dot.addEventListener('click', () => switchEra(era));
   trackEl.appendChild(dot);
 
   const label = document.createElement('span');
   label.textContent = era;
+  label.style.left = yearPosition(era);
+  // Close eras (1920/1924) would overlap: drop every other one a line down
+  if (i > 0 && !labelsEl.lastChild.classList.contains('stagger') &&
+      (era - ERAS[i - 1]) / (TIMELINE.end - TIMELINE.start) < 0.08) {
+    label.classList.add('stagger');
+    labelsEl.classList.add('staggered');
+  }
   labelsEl.appendChild(label);
 });
 
+sliderEl.addEventListener('input', () => switchEra(parseInt(sliderEl.value, 10)));
+
 function updateTimelineFill() {
-  const idx = ERAS.indexOf(currentEra);
-  const pct = ERAS.length > 1 ? (idx / (ERAS.length - 1)) * 100 : 0;
-  fillEl.style.width = pct + '%';
+  const p = (currentYear - TIMELINE.start) / Math.max(TIMELINE.end - TIMELINE.start, 1);
+  fillEl.style.width = 'calc((100% - 12px) * ' + p + ')';
 }
 
-function switchEra(era) {
-  if (era === currentEra) return;
-  currentEra = era;
+// ===== ERA SWITCH SCHEDULER =====
+// Rapid switches (a held arrow key, a dragged slider) coalesce onto the
+// latest target: a newer switch cancels the pending one, a fade already
+// under way keeps running, the target's layers are prepared while it runs,
+// and every DOM swap lands in a single animation frame. Between neighbouring
+// segments the generator's change set (see changeSet) limits the swap to the
+// entities that actually change.
+const FADE_MS = 350;
+const eraSwitch = {token: 0, timer: 0, frame: 0, fadeStart: 0};
+
+function prepareEraLayers(seg, change) {
+  return {ca: prepareCA(seg, change), neighbors: prepareNeighbors(),
+          cities: prepareCities(map.getZoom()), legend: prepareLegend(seg)};
+}
+
+function commitEraLayers(prepared) {
+  // Zooming while the fade ran makes the prepared city set stale
+  if (prepared.cities.zoom !== map.getZoom()) prepared.cities = prepareCities(map.getZoom());
+  commitCA(prepared.ca);
+  commitNeighbors(prepared.neighbors);
+  commitCities(prepared.cities);
+  commitLegend(prepared.legend);
+  closeInfoPanel();
+}
+
+function cancelEraSwitch() {
+  clearTimeout(eraSwitch.timer);
+  cancelAnimationFrame(eraSwitch.frame);
+  eraSwitch.timer = eraSwitch.frame = 0;
+  stopMorph();
+  return ++eraSwitch.token;
+}
+
+function fadeToSegment(token, seg, year) {
+  const overlayPane = document.querySelector('.leaflet-overlay-pane');
+  if (!eraSwitch.fadeStart) {
+    eraSwitch.fadeStart = performance.now();
+    if (overlayPane) overlayPane.style.opacity = '0';
+  }
+  const wait = overlayPane ? Math.max(0, eraSwitch.fadeStart + FADE_MS - performance.now()) : 0;
+  const faded = new Promise(resolve => { eraSwitch.timer = setTimeout(resolve, wait); });
+  // The worker prepares the segment and the layers are built while the fade runs
+  const ready = ensureSegment(seg).then(() =>
+    token === eraSwitch.token ? prepareEraLayers(seg, changeSet(drawnSegment, seg)) : null);
+  Promise.all([ready, faded]).then(([prepared]) => {
+    if (token !== eraSwitch.token || !prepared) return;
+    eraSwitch.frame = requestAnimationFrame(() => {
+      eraSwitch.frame = 0;
+      if (token !== eraSwitch.token) return;
+      commitEraLayers(prepared);
+      eraSwitch.fadeStart = 0;
+      if (overlayPane) overlayPane.style.opacity = '1';
+      perfEraEvent('commit', year);
+    });
+  });
+}
+
+function switchEra(year) {
+  // Accepts any year: redraws only when the year lands in another segment
+  year = Math.max(TIMELINE.start, Math.min(TIMELINE.end, Math.round(year)));
+  if (year === currentYear) return;
+  const seg = segmentForYear(year);
+  currentYear = year;
+  currentEra = eraForYear(year);
 
   // Update dots
   document.querySelectorAll('.timeline-dot').forEach(d => {
-    d.classList.toggle('active', parseInt(d.dataset.era) === era);
+    d.classList.toggle('active', parseInt(d.dataset.era) === currentEra);
   });
-  yearEl.textContent = era;
-  eraEl.textContent = ERA_NAMES[era] || '';
+  yearEl.textContent = year;
+  eraEl.textContent = ERA_NAMES[currentEra] || '';
+  if (parseInt(sliderEl.value, 10) !== year) sliderEl.value = year;
   updateTimelineFill();
+  if (!LITE) renderWater();
+
+  if (seg === currentSegment) return;
+  const prev = currentSegment;
+  currentSegment = seg;
+  if (snapshotEl.isConnected && !snapshotEl.classList.contains('done')) showSnapshot(seg);
+  if (LITE) return;
+  perfEraEvent('start', year);
+  const token = cancelEraSwitch();
+
+  // When every border carries over (1936 -> 1991 -> 2024) the drawn
+  // polygons are restyled and relabelled in place, without a fade
+  const change = eraSwitch.fadeStart ? null : changeSet(drawnSegment, seg);
+  if (change && !change.add.length && !change.remove.length) {
+    ensureSegment(seg).then(() => {
+      if (token !== eraSwitch.token) return;
+      const prepared = prepareEraLayers(seg, change);
+      eraSwitch.frame = requestAnimationFrame(() => {
+        eraSwitch.frame = 0;
+        if (token !== eraSwitch.token) return;
+        commitEraLayers(prepared);
+        perfEraEvent('commit', year);
+      });
+    });
+    return;
+  }
 
-  // Fade out, swap, fade in
-  const overlayPane = document.querySelector('.leaflet-overlay-pane');
-  if (overlayPane) {
-    overlayPane.style.opacity = '0';
-    setTimeout(() => {
-      renderCA();
-      renderNeighbors();
-      renderCities();
-      buildLegend();
-      closeInfoPanel();
-      overlayPane.style.opacity = '1';
-    }, 350);
-  } else {
-    renderCA();
-    renderNeighbors();
-    renderCities();
-    buildLegend();
-    closeInfoPanel();
+  // Neighbouring segments animate their borders when the generator
+  // precomputed a morph for the boundary between them; anything else
+  // (including a switch that lands mid-fade) fades
+  if (Math.abs(seg - prev) !== 1 || REDUCED_MOTION || eraSwitch.fadeStart) {
+    fadeToSegment(token, seg, year);
+    return;
   }
+  const boundary = TIMELINE.boundaries[Math.max(seg, prev)];
+  Promise.all([ensureSegment(prev), ensureSegment(seg), ensureMorph(boundary)]).then(([, , morph]) => {
+    if (token !== eraSwitch.token) return;
+    if (!morph.pairs) fadeToSegment(token, seg, year);
+    else morphToSegment(morph, prev, seg, year, token, prepareEraLayers(seg));
+  });
 }
 
-// Keyboard nav
+// Instrumentation hook; replaced when built with --perf
+function perfEraEvent(phase, era) {}
+
+// Keyboard nav: arrows step between labelled eras, Shift+arrows by one year
 document.addEventListener('keydown', e => {
-  const idx = ERAS.indexOf(currentEra);
-  if (e.key === 'ArrowRight' && idx < ERAS.length - 1) switchEra(ERAS[idx + 1]);
-  if (e.key === 'ArrowLeft' && idx > 0) switchEra(ERAS[idx - 1]);
+  if (e.target.tagName === 'INPUT') return;  // slider and search handle their own keys
+  if (e.key !== 'ArrowRight' && e.key !== 'ArrowLeft') return;
+  const dir = e.key === 'ArrowRight' ? 1 : -1;
+  if (e.shiftKey) { switchEra(currentYear + dir); return; }
+  const next = dir > 0 ? ERAS.find(era => era > currentYear)
+                       : ERAS.slice().reverse().find(era => era < currentYear);
+  if (next !== undefined) switchEra(next);
+});
+
+// ===== PLACE SEARCH =====
+// Prefix index over every era's city names, built by cities.py: sorted
+// folded keys (one per word start) with postings of city, name and a
+// bitmask of the era positions in which the city carried that name
+const CITY_SEARCH = ''' + json.dumps(search_index, separators=(",", ":"), ensure_ascii=False) + r''';
+const searchIndex = {
+  keys: CITY_SEARCH.keys,
+  start: Uint32Array.from(CITY_SEARCH.start),
+  city: Uint32Array.from(CITY_SEARCH.city),
+  name: Uint32Array.from(CITY_SEARCH.name),
+  eras: Uint32Array.from(CITY_SEARCH.eras)
+};
+const searchInput = document.getElementById('search-input');
+const searchResultsEl = document.getElementById('search-results');
+let searchResults = [];
+
+function foldName(s) {
+  // Same folding as cities.fold_name: no diacritics, lowercase, single spaces
+  return s.normalize('NFKD').replace(/\p{M}/gu, '').toLowerCase()
+    .replace(/[^\p{L}\p{N}]+/gu, ' ').trim();
+}
+
+function searchPlaces(query, limit) {
+  const q = foldName(query);
+  if (!q) return [];
+  const keys = searchIndex.keys;
+  let lo = 0, hi = keys.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (keys[mid] < q) lo = mid + 1; else hi = mid;
+  }
+  // Short prefixes on a large gazetteer match thousands of keys; rank only
+  // the first few candidates so a keystroke stays well under a millisecond
+  const maxCandidates = limit * 16;
+  const seen = new Set();
+  const out = [];
+  for (let k = lo; k < keys.length && out.length < maxCandidates && keys[k].startsWith(q); k++) {
+    for (let p = searchIndex.start[k]; p < searchIndex.start[k + 1]; p++) {
+      const city = searchIndex.city[p];
+      const id = city + ':' + searchIndex.name[p];
+      if (seen.has(id)) continue;
+      seen.add(id);
+      const mask = searchIndex.eras[p];
+      const eras = [];
+      let tier = 255;
+      for (let e = 0; e < ERAS.length; e++) {
+        if (!(mask & (1 << e))) continue;
+        eras.push(ERAS[e]);
+        tier = Math.min(tier, CITIES.tier[e][city]);
+      }
+      out.push({city, name: CITIES.names[searchIndex.name[p]], eras, tier, exact: keys[k] === q});
+    }
+  }
+  // Exact name matches first, then the more prominent places
+  out.sort((a, b) => (b.exact - a.exact) || (a.tier - b.tier));
+  return out.slice(0, limit);
+}
+
+function renderSearchResults() {
+  searchResultsEl.innerHTML = '';
+  searchResults.forEach((r, i) => {
+    const item = document.createElement('div');
+    item.className = 'search-result';
+    const modern = CITIES.names[CITIES.name[ERAS.length - 1][r.city]];
+    const years = r.eras.length === ERAS.length ? 'all eras' : r.eras.join(', ');
+    item.innerHTML = '<span class="search-name"></span><span class="search-meta"></span>';
+    item.firstChild.textContent = r.name;
+    item.lastChild.textContent = (modern && modern !== r.name ? 'now ' + modern + ' · ' : '') + years;
+    item.addEventListener('mousedown', ev => { ev.preventDefault(); selectSearchResult(i); });
+    searchResultsEl.appendChild(item);
+  });
+  searchResultsEl.classList.toggle('visible', searchResults.length > 0);
+}
+
+function selectSearchResult(i) {
+  const r = searchResults[i];
+  if (!r) return;
+  // Stay in the current era when the name applies to it, else go to the latest one
+  const era = r.eras.includes(currentEra) ? currentEra : r.eras[r.eras.length - 1];
+  const t = CITIES.tier[ERAS.indexOf(era)][r.city];
+  if (era !== currentEra) switchEra(era);
+  map.flyTo([CITIES.lat[r.city], CITIES.lng[r.city]], Math.max(map.getZoom(), t === 0 ? 6 : t + 4, 6), {duration: 1.2});
+  searchInput.value = r.name;
+  searchResults = [];
+  renderSearchResults();
+  searchInput.blur();
+}
+
+searchInput.addEventListener('input', () => {
+  searchResults = searchPlaces(searchInput.value, 8);
+  renderSearchResults();
 });
+searchInput.addEventListener('keydown', e => {
+  if (e.key === 'Enter') selectSearchResult(0);
+  if (e.key === 'Escape') { searchInput.value = ''; searchResults = []; renderSearchResults(); searchInput.blur(); }
+});
+searchInput.addEventListener('blur', () => searchResultsEl.classList.remove('visible'));
+searchInput.addEventListener('focus', () => searchResultsEl.classList.toggle('visible', searchResults.length > 0));
 
 // ===== HOME BUTTON =====
 document.getElementById('home-btn').addEventListener('click', () => {
-  map.flyTo([42.0, 64.0], 5, {duration:1});
+  map.flyTo(HOME.center, HOME.zoom, {duration:1});
   closeInfoPanel();
 });
 
+''' + (perf_script(perf_endpoint) if perf else '') + (sw_register_script(sw_url) if sw_url else '') + r'''
 // ===== INITIAL RENDER =====
-renderNeighbors();
-renderCA();
-renderCities();
-buildLegend();
+// The snapshot is already on screen. Cities and the timeline need no geodata;
+// polygons follow once the worker answers and then replace the snapshot.
+// Lite mode never starts the worker.
 updateTimelineFill();
+if (!LITE) {
+  renderCities();
+  startGeoWorker();
+  Promise.all([ensureNeighbors(), ensureSegment(currentSegment)]).then(() => {
+    renderNeighbors();
+    renderCA();
+    buildLegend();
+    // Give the tiles a moment to arrive so the swap never shows a blank basemap
+    Promise.race([tilesReady, new Promise(r => setTimeout(r, 1500))]).then(dismissSnapshot);
+    // Warm the remaining segments and the change sets in the background
+    TIMELINE.segments.forEach((_, i) => ensureSegment(i));
+    ensureChanges();
+    ensureWater().then(renderWater);
+  });
+}
 </script>
 </body>
 </html>'''
 
-# Write the HTML file
-with open(OUTPUT_PATH, 'w') as f:
-    f.write(html)
-
-fsize = os.path.getsize(OUTPUT_PATH)
-print(f"HTML written to {OUTPUT_PATH} ({fsize/1024:.1f} KB)")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the interactive timeline map HTML.")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write a JSON stage timing/memory report to PATH")
+    parser.add_argument("--perf", action="store_true",
+                        help="instrument the page with performance marks and a HUD")
+    parser.add_argument("--perf-endpoint", metavar="URL",
+                        help="with --perf, POST the trace to URL when the page is hidden")
+    parser.add_argument("--service-worker", action="store_true",
+                        help="also emit sw.js for offline repeat visits and register it")
+    parser.add_argument("--sw-tile-zoom", type=int, default=6, metavar="Z",
+                        help="warm the tile cache for the map bounds up to zoom Z (default 6)")
+    parser.add_argument("--sw-max-tiles", type=int, default=2000, metavar="N",
+                        help="bound the tile cache to N entries (default 2000)")
+    parser.add_argument("--region", default=regions.DEFAULT_REGION, choices=sorted(regions.REGIONS),
+                        help=f"region profile from regions.py (default {regions.DEFAULT_REGION})")
+    parser.add_argument("--no-check-budget", action="store_false", dest="check_budget",
+                        help="skip checking the written page against budget.json (see check_budget.py)")
+    args = parser.parse_args(argv)
+    if args.service_worker and args.region != regions.DEFAULT_REGION:
+        # One worker per scope: a second region's sw.js would replace the first
+        parser.error("--service-worker is only supported for the default region")
+    prof = Profiler("generate_html", enabled=bool(args.profile))
+    region = regions.get_region(args.region)
+    output_path = region["html"]
+
+    with prof.stage("read_geodata") as rec:
+        with open(region["geodata"]) as f:
+            geodata_raw = f.read()
+        rec["bytes_in"] = len(geodata_raw)
+
+    with prof.stage("read_cities") as rec:
+        city_table = load_region_cities(region)
+        rec["bytes_in"] = os.path.getsize(region["cities"]) if region["cities"] else 0
+
+    with prof.stage("render_snapshots") as rec:
+        snapshot_set = render_snapshots(json.loads(geodata_raw), region)
+        rec["bytes_out"] = len(snapshot_set["base"]) + sum(map(len, snapshot_set["layers"]))
+
+    with prof.stage("assemble_html") as rec:
+        sw_url = os.path.basename(SW_PATH) if args.service_worker else None
+        html = build_html(geodata_raw, perf=args.perf, perf_endpoint=args.perf_endpoint,
+                          sw_url=sw_url, city_table=city_table, snapshot_set=snapshot_set,
+                          region=region)
+        rec["bytes_out"] = len(html)
+
+    # Write the HTML file
+    with prof.stage("write_html") as rec:
+        with open(output_path, 'w') as f:
+            f.write(html)
+        rec["bytes_out"] = os.path.getsize(output_path)
+
+    fsize = os.path.getsize(output_path)
+    print(f"HTML written to {output_path} ({fsize/1024:.1f} KB)")
+
+    if args.service_worker:
+        with prof.stage("service_worker") as rec:
+            sw, version = build_service_worker(html, os.path.basename(output_path),
+                                               args.sw_tile_zoom, args.sw_max_tiles)
+            with open(SW_PATH, 'w') as f:
+                f.write(sw)
+            rec["bytes_out"] = len(sw)
+        print(f"Service worker written to {SW_PATH} (version {version})")
+
+    if args.profile:
+        prof.write(args.profile)
+
+    if args.check_budget:
+        print()
+        if not check_budget.run_gate(html, region, {"generate_html": prof.elapsed()}):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
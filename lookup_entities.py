@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Bulk historical point-in-polygon lookup over the era geometries in geodata.json.
+
+Tags (lat, lng, year) records with the entity that controlled the spot in
+that year, e.g. Bukhara in 1900 or the Kirghiz ASSR in 1920. Years resolve
+through the interval index in timeline.py; each interval gets an STRtree over
+its living entities cut into grid cells, and points are tested in vectorized
+batches, so inputs of millions of rows stream through in chunks. Records with
+a blank or non-numeric lat, lng or year are written out unmatched and counted.
+CSV and Parquet stream in both directions; .npz has no streaming reader or
+writer, so .npz input and output are held in memory whole.
+
+    from lookup_entities import load_lookup
+    lookup = load_lookup()
+    lookup.entity_at(39.77, 64.42, 1900)        # -> {'era': 1900, 'key': 'BUKHARA', ...}
+    eras, keys, names = lookup.lookup(lats, lngs, years)
+
+    python lookup_entities.py records.csv tagged.csv --lat-col lat --lng-col lng --year-col year
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+import shapely
+from shapely.geometry import box, shape
+
+import regions
+import timeline
+from generate_geodata import project_px0
+
+ROOT_DIR = os.path.dirname(__file__)
+GEODATA_PATH = os.path.join(ROOT_DIR, "geodata.json")
+
+DEFAULT_CELL_SIZE = 2.0
+DEFAULT_CHUNK_SIZE = 200_000
+
+
+class SegmentIndex:
+    def __init__(self, eras, keys, names, pieces):
+        # One entry per entity alive in the segment; pieces[i] is entity i's
+        # geometry cut into grid cells (shared between segments)
+        self.eras = np.array(eras, dtype=np.int32)
+        self.keys = np.array(keys, dtype=object)
+        self.names = np.array(names, dtype=object)
+        flat, owners = [], []
+        for i, parts in enumerate(pieces):
+            flat.extend(parts)
+            owners.extend([i] * len(parts))
+        self.owners = np.array(owners, dtype=np.int32)
+        self.tree = shapely.STRtree(flat)
+
+    def lookup(self, lats, lngs):
+        # Entity index per point, -1 where no entity covers it. Where entities
+        # overlap the first one (in timeline order) wins.
+        points = shapely.points(np.asarray(lngs, dtype=float), np.asarray(lats, dtype=float))
+        none = np.iinfo(np.int32).max
+        best = np.full(len(points), none, dtype=np.int32)
+        point_idx, piece_idx = self.tree.query(points, predicate="intersects")
+        np.minimum.at(best, point_idx, self.owners[piece_idx])
+        return np.where(best == none, -1, best)
+
+
+def _grid_pieces(geom, cell_size):
+    # Cut an entity into grid cells so the tree's envelopes are tight and
+    # each containment test runs against a small polygon
+    minx, miny, maxx, maxy = geom.bounds
+    xs = np.arange(np.floor(minx / cell_size) * cell_size, maxx, cell_size)
+    ys = np.arange(np.floor(miny / cell_size) * cell_size, maxy, cell_size)
+    cells = [box(x, y, x + cell_size, y + cell_size) for x in xs for y in ys]
+    clipped = shapely.intersection(geom, cells)
+    return [c for c in clipped if not c.is_empty]
+
+
+class EntityLookup:
+    def __init__(self, index, segments, crs=None, eras=timeline.ERAS):
+        # index: regions.interval_index(); segments: one SegmentIndex
+        # (or None when nothing is alive) per interval; crs "px0" when the
+        # geodata was built with --mercator; eras: the region's labelled eras
+        self.index = index
+        self.segments = segments
+        self.crs = crs
+        self._boundaries = np.array(index["boundaries"])
+        self._era_array = np.array(eras)
+
+    def segment_for_year(self, years):
+        # Interval per year; -1 before the timeline, the last interval after it
+        years = np.asarray(years)
+        pos = np.searchsorted(self._boundaries, years, side="right") - 1
+        return np.where(pos >= 0, np.minimum(pos, len(self.segments) - 1), -1)
+
+    def era_for_year(self, years):
+        # Labelled era on or before each year; -1 before the timeline starts
+        years = np.asarray(years)
+        pos = np.searchsorted(self._era_array, years, side="right") - 1
+        era = self._era_array[np.clip(pos, 0, None)]
+        return np.where(years >= self.index["start"], era, -1)
+
+    def lookup(self, lats, lngs, years):
+        # Returns (eras, keys, names); keys/names are None where nothing
+        # matches. eras is the era that defines the matched entity, or the
+        # labelled era for the year when nothing matches.
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        years = np.asarray(years, dtype=np.int64)
+        if self.crs == "px0":
+            # Query in the geometry's space: x plays lng and y plays lat
+            lngs, lats = project_px0(lngs, lats)
+        eras = self.era_for_year(years)
+        segs = self.segment_for_year(years)
+        keys = np.full(len(lats), None, dtype=object)
+        names = np.full(len(lats), None, dtype=object)
+        for seg in np.unique(segs):
+            if seg < 0 or self.segments[seg] is None:
+                continue
+            mask = segs == seg
+            index = self.segments[seg]
+            found = index.lookup(lats[mask], lngs[mask])
+            hit = found >= 0
+            sel = np.flatnonzero(mask)[hit]
+            eras[sel] = index.eras[found[hit]]
+            keys[sel] = index.keys[found[hit]]
+            names[sel] = index.names[found[hit]]
+        return eras, keys, names
+
+    def entity_at(self, lat, lng, year):
+        eras, keys, names = self.lookup([lat], [lng], [year])
+        if keys[0] is None:
+            return None
+        return {"era": int(eras[0]), "key": keys[0], "name": names[0]}
+
+
+def load_lookup(path=GEODATA_PATH, cell_size=DEFAULT_CELL_SIZE):
+    with open(path) as f:
+        geodata = json.load(f)
+    historical = geodata["historical"]
+    # Geodata without a "region" key predates region profiles: Central Asia
+    region = regions.get_region(geodata.get("region"))
+    index = regions.interval_index(region)
+    crs = geodata.get("crs")
+    if crs == "px0":
+        # Keep grid cells roughly the same size on the ground
+        cell_size = cell_size * 256 / 360
+
+    # Entities defined under the same era share geometry across segments,
+    # so each one is cut into grid pieces once
+    entities = []
+    for era, key, _, _ in index["entities"]:
+        if str(era) in historical:
+            ent = historical[str(era)].get(key)
+            geometry, name = (ent["geometry"], ent["name"]) if ent else (None, key)
+        else:
+            meta = region["era_entities"][era][key]
+            geometry, name = geodata["modern"].get(meta["code"]), meta["name"]
+        if geometry is None:
+            print(f"  {era}/{key}: no geometry in {path}, skipped", file=sys.stderr)
+            entities.append(None)
+            continue
+        entities.append((era, key, name, _grid_pieces(shape(geometry), cell_size)))
+
+    segments = []
+    for members in index["segments"]:
+        alive = [entities[i] for i in members if entities[i] is not None]
+        if not alive:
+            segments.append(None)
+            continue
+        eras, keys, names, pieces = zip(*alive)
+        segments.append(SegmentIndex(eras, keys, names, pieces))
+    return EntityLookup(index, segments, crs, region["eras"])
+
+
+# =============================================
+# STREAMING I/O
+# =============================================
+
+def _to_float(value):
+    # NaN for a blank or non-numeric field
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _float_column(col):
+    col = np.asarray(col)
+    if col.dtype.kind in "biuf":
+        return col.astype(float)
+    return np.array([_to_float(v) for v in col], dtype=float)
+
+
+def lookup_valid(lookup, lats, lngs, years):
+    # lookup() over the rows with a finite lat, lng and year; the others come
+    # back unmatched (era -1). Returns (eras, keys, names, bad row count).
+    lats, lngs, years = _float_column(lats), _float_column(lngs), _float_column(years)
+    ok = np.isfinite(lats) & np.isfinite(lngs) & np.isfinite(years)
+    eras = np.full(len(lats), -1, dtype=np.int64)
+    keys = np.full(len(lats), None, dtype=object)
+    names = np.full(len(lats), None, dtype=object)
+    if ok.any():
+        eras[ok], keys[ok], names[ok] = lookup.lookup(lats[ok], lngs[ok], years[ok].astype(np.int64))
+    return eras, keys, names, int(np.count_nonzero(~ok))
+
+
+def iter_csv(path, chunk_size):
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield reader.fieldnames, chunk
+                chunk = []
+        if chunk:
+            yield reader.fieldnames, chunk
+
+
+def iter_columnar(path, chunk_size):
+    # Columnar input: .npz (one array per column, loaded whole: numpy can't
+    # memory-map the members of an .npz) or .parquet (needs pyarrow, streamed)
+    if path.endswith(".npz"):
+        data = np.load(path, allow_pickle=False)
+        columns = {name: data[name] for name in data.files}
+        n = len(next(iter(columns.values())))
+        for start in range(0, n, chunk_size):
+            yield {name: col[start:start + chunk_size] for name, col in columns.items()}
+        return
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Reading Parquet input requires pyarrow (pip install pyarrow)")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in batch.schema.names}
+
+
+def tag_csv(lookup, in_path, out_path, lat_col, lng_col, year_col, chunk_size):
+    total = matched = bad = 0
+    with open(out_path, "w", newline="") as out:
+        writer = None
+        for fieldnames, rows in iter_csv(in_path, chunk_size):
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames=list(fieldnames) + ["era", "entity", "entity_name"])
+                writer.writeheader()
+            lats = [r.get(lat_col) for r in rows]
+            lngs = [r.get(lng_col) for r in rows]
+            years = [r.get(year_col) for r in rows]
+            eras, keys, names, n_bad = lookup_valid(lookup, lats, lngs, years)
+            for row, era, key, name in zip(rows, eras, keys, names):
+                row["era"] = int(era) if era >= 0 else ""
+                row["entity"] = key or ""
+                row["entity_name"] = name or ""
+            writer.writerows(rows)
+            total += len(rows)
+            matched += int(np.count_nonzero(keys != None))  # noqa: E711
+            bad += n_bad
+            print(f"  {total} rows tagged", file=sys.stderr)
+    return total, matched, bad
+
+
+def tag_columnar(lookup, in_path, out_path, lat_col, lng_col, year_col, chunk_size):
+    # Parquet output is written batch by batch; .npz has no append mode, so
+    # those chunks are held in memory and concatenated once at the end
+    total = matched = bad = 0
+    outputs = []
+    writer = None
+    for cols in iter_columnar(in_path, chunk_size):
+        eras, keys, names, n_bad = lookup_valid(lookup, cols[lat_col], cols[lng_col], cols[year_col])
+        cols = dict(cols)
+        cols["era"] = eras
+        cols["entity"] = np.where(keys == None, "", keys).astype(str)  # noqa: E711
+        cols["entity_name"] = np.where(names == None, "", names).astype(str)  # noqa: E711
+        if out_path.endswith(".npz"):
+            outputs.append(cols)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.table(cols)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+        total += len(eras)
+        matched += int(np.count_nonzero(keys != None))  # noqa: E711
+        bad += n_bad
+        print(f"  {total} rows tagged", file=sys.stderr)
+    if writer is not None:
+        writer.close()
+    if outputs:
+        np.savez(out_path, **{name: np.concatenate([c[name] for c in outputs]) for name in outputs[0]})
+    return total, matched, bad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag lat/lng/year records with the controlling entity.")
+    parser.add_argument("input", help="CSV, .npz or .parquet records (.npz is read into memory whole)")
+    parser.add_argument("output", help="tagged output (same format family as the input)")
+    parser.add_argument("--geodata", default=GEODATA_PATH, help="geodata.json to query")
+    parser.add_argument("--lat-col", default="lat")
+    parser.add_argument("--lng-col", default="lng")
+    parser.add_argument("--year-col", default="year")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows per vectorized batch (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE,
+                        help=f"grid cell in degrees used to split entities (default {DEFAULT_CELL_SIZE})")
+    args = parser.parse_args(argv)
+
+    lookup = load_lookup(args.geodata, args.cell_size)
+    print(f"Indexed {len(lookup.segments)} timeline intervals: {lookup.index['boundaries']}",
+          file=sys.stderr)
+    tag = tag_csv if args.input.endswith(".csv") else tag_columnar
+    total, matched, bad = tag(lookup, args.input, args.output, args.lat_col, args.lng_col,
+                              args.year_col, args.chunk_size)
+    print(f"Tagged {total} rows ({matched} inside an entity) -> {args.output}")
+    if bad:
+        print(f"  {bad} rows with a blank or non-numeric {args.lat_col}/{args.lng_col}/{args.year_col}"
+              " left untagged", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
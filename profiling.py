@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Stage-level timing and memory instrumentation for the generator scripts.
+
+Both generate_geodata.py and generate_html.py accept --profile PATH and write
+a JSON report with wall time, CPU time, peak RSS, vertex counts and byte sizes
+for every stage (and every entity within a stage). Compare two reports with:
+
+    python profiling.py OLD.json NEW.json
+"""
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_VERSION = 1
+COUNT_FIELDS = ("vertices_in", "vertices_out", "bytes_in", "bytes_out")
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes everywhere else
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def count_vertices(geometry):
+    # Vertex count of a GeoJSON geometry dict (pure Python, no shapely)
+    def walk(coords):
+        if not coords:
+            return 0
+        if isinstance(coords[0], (int, float)):
+            return 1
+        return sum(walk(c) for c in coords)
+
+    if geometry["type"] == "GeometryCollection":
+        return sum(count_vertices(g) for g in geometry["geometries"])
+    return walk(geometry["coordinates"])
+
+
+class Profiler:
+    def __init__(self, script, enabled=True):
+        self.script = script
+        self.enabled = enabled
+        self.stages = []
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+
+    @contextmanager
+    def stage(self, name, entity=None):
+        # Yields a dict the caller can fill with COUNT_FIELDS
+        rec = {"stage": name, "entity": entity}
+        if not self.enabled:
+            yield rec
+            return
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield rec
+        finally:
+            rec["wall_s"] = round(time.perf_counter() - wall0, 6)
+            rec["cpu_s"] = round(time.process_time() - cpu0, 6)
+            rec["peak_rss_kb"] = peak_rss_kb()
+            self.stages.append(rec)
+
+    def elapsed(self):
+        # Wall seconds since the profiler was created, kept even when disabled
+        return time.perf_counter() - self._wall0
+
+    def report(self):
+        return {
+            "version": REPORT_VERSION,
+            "script": self.script,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "total_wall_s": round(self.elapsed(), 6),
+            "total_cpu_s": round(time.process_time() - self._cpu0, 6),
+            "peak_rss_kb": peak_rss_kb(),
+            "stages": self.stages,
+        }
+
+    def write(self, path):
+        if not self.enabled:
+            return
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Profile written to {path} ({len(self.stages)} stage records)")
+
+
+NULL_PROFILER = Profiler(None, enabled=False)
+
+
+# =============================================
+# REPORT COMPARISON
+# =============================================
+
+def aggregate(report):
+    # (stage, entity) -> summed metrics; a stage may run more than once
+    out = {}
+    for rec in report["stages"]:
+        key = (rec["stage"], rec.get("entity"))
+        agg = out.setdefault(key, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_kb": 0})
+        agg["wall_s"] += rec.get("wall_s", 0.0)
+        agg["cpu_s"] += rec.get("cpu_s", 0.0)
+        agg["peak_rss_kb"] = max(agg["peak_rss_kb"], rec.get("peak_rss_kb") or 0)
+        for field in COUNT_FIELDS:
+            if field in rec:
+                agg[field] = agg.get(field, 0) + rec[field]
+    return out
+
+
+def _pct(old, new):
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare(old, new):
+    a, b = aggregate(old), aggregate(new)
+    lines = [f"{'stage':<14} {'entity':<16} {'wall old':>9} {'wall new':>9} {'Δwall':>8}"
+             f" {'cpu new':>9} {'rss MB':>7} {'Δverts':>8} {'Δbytes':>8}"]
+    for key in list(a) + [k for k in b if k not in a]:
+        stage, entity = key
+        o, n = a.get(key), b.get(key)
+        if o is None or n is None:
+            state = "added" if o is None else "removed"
+            lines.append(f"{stage:<14} {entity or '-':<16} ({state})")
+            continue
+        dverts = n.get("vertices_out", 0) - o.get("vertices_out", 0)
+        dbytes = n.get("bytes_out", 0) - o.get("bytes_out", 0)
+        lines.append(
+            f"{stage:<14} {entity or '-':<16} {o['wall_s']:>9.4f} {n['wall_s']:>9.4f}"
+            f" {_pct(o['wall_s'], n['wall_s']):>8} {n['cpu_s']:>9.4f}"
+            f" {n['peak_rss_kb'] / 1024:>7.1f} {dverts:>+8} {dbytes:>+8}")
+    lines.append(f"total wall: {old['total_wall_s']:.3f}s -> {new['total_wall_s']:.3f}s"
+                 f" ({_pct(old['total_wall_s'], new['total_wall_s']).strip()})")
+    return "\n".join(lines)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(f"usage: {os.path.basename(sys.argv[0])} OLD.json NEW.json")
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        old = json.load(f)
+    with open(sys.argv[2]) as f:
+        new = json.load(f)
+    print(compare(old, new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Region profiles: everything that ties the pipeline to one particular map.
+
+A profile names the core countries (drawn as timeline entities), the
+neighbours (clipped to clip_box and drawn as static context), the view
+(bounds, center, zoom), neighbour and water label positions, the timeline
+entity config with its info-panel figures, the optional city and water body
+(shoreline series) inputs and the output paths.
+generate_geodata.py and generate_html.py take --region NAME; build_regions.py
+builds several regions in parallel. "central-asia" is the default and the
+only profile with the hand-built 1900-1924 historical overlays.
+"""
+import os
+
+import timeline
+
+ROOT_DIR = os.path.dirname(__file__)
+DEFAULT_REGION = "central-asia"
+
+REGIONS = {
+    "central-asia": {
+        "title": "Central Asia",
+        "countries": {"kazakhstan": "KZ", "uzbekistan": "UZ", "turkmenistan": "TM",
+                      "kyrgyzstan": "KG", "tajikistan": "TJ"},
+        "neighbors": {"russia": "RU", "china": "CN", "iran": "IR",
+                      "afghanistan": "AF", "pakistan": "PK", "mongolia": "MN",
+                      "azerbaijan": "AZ", "georgia": "GE"},
+        "neighbor_styles": {
+            "RU": {"fill": "#2d3748", "name": "Russia"},
+            "CN": {"fill": "#1a365d", "name": "China"},
+            "IR": {"fill": "#3d3028", "name": "Iran"},
+            "AF": {"fill": "#3d2c4a", "name": "Afghanistan"},
+            "PK": {"fill": "#2a3a2e", "name": "Pakistan"},
+            "MN": {"fill": "#2d3340", "name": "Mongolia"},
+            "AZ": {"fill": "#2a3340", "name": "Azerbaijan"},
+            "GE": {"fill": "#2e2a34", "name": "Georgia"},
+        },
+        # Visual centre of each neighbour within the clipped bounds
+        "neighbor_label_pos": {
+            "RU": [52.5, 68], "CN": [40, 82], "IR": [34, 55], "AF": [34.5, 67],
+            "PK": [32, 69], "MN": [48, 88], "AZ": [40.5, 48.5], "GE": [42, 44.3],
+        },
+        # Label centres of the historical entities (geodata "historical" keys)
+        "hist_label_pos": {
+            # 1900
+            "TURKESTAN": [40.5, 66], "BUKHARA": [38.8, 67], "KHIVA": [42, 59.5], "STEPPE": [49, 62],
+            # 1920
+            "TURKESTAN_ASSR": [40.5, 66], "BUKHARA_PSR": [38.8, 67], "KHOREZM_PSR": [42, 59.5],
+            "KIRGHIZ_ASSR": [49, 62],
+            # 1924
+            "UZ_SSR": [40, 67], "TM_SSR": [39, 59.5], "KARA_KIRGHIZ": [41.5, 74.5], "KZ_ASSR": [48, 67],
+        },
+        "water_labels": [
+            {"name": "Caspian Sea", "lat": 42.0, "lng": 50.5, "cls": "water-label-lg"},
+            {"name": "Aral Sea", "lat": 45.0, "lng": 59.5, "cls": "water-label-sm"},
+            {"name": "Lake Balkhash", "lat": 46.5, "lng": 74.5, "cls": "water-label-sm"},
+            {"name": "Issyk-Kul", "lat": 42.45, "lng": 77.2, "cls": "water-label-sm"},
+        ],
+        "clip_box": [44, 28, 92, 57],
+        "bounds": [[30, 44], [56, 90]],
+        "center": [42.0, 64.0],
+        "zoom": 5,
+        "historical": True,
+        "eras": timeline.ERAS,
+        "era_names": timeline.ERA_NAMES,
+        "era_entities": timeline.ERA_ENTITIES,
+        "lifespans": timeline.ENTITY_LIFESPANS,
+        "info": timeline.ENTITY_INFO,
+        "cities": os.path.join(ROOT_DIR, "cities.csv"),
+        "water": os.path.join(ROOT_DIR, "aral_shoreline.geojson"),
+        # Largest topology issue per kind, km² (see topology_qa)
+        "qa_tolerances": {"overlap": 10.0, "gap": 10.0, "neighbor_overlap": 10.0},
+        "geodata": os.path.join(ROOT_DIR, "geodata.json"),
+        "html": os.path.join(ROOT_DIR, "central-asia-map.html"),
+    },
+    "caucasus": {
+        "title": "South Caucasus",
+        "countries": {"georgia": "GE", "armenia": "AM", "azerbaijan": "AZ"},
+        "neighbors": {"russia": "RU", "turkey": "TR", "iran": "IR"},
+        "neighbor_styles": {
+            "RU": {"fill": "#2d3748", "name": "Russia"},
+            "TR": {"fill": "#3d2c4a", "name": "Turkey"},
+            "IR": {"fill": "#3d3028", "name": "Iran"},
+        },
+        "neighbor_label_pos": {"RU": [44.4, 44.5], "TR": [39.4, 41.2], "IR": [38.1, 47.3]},
+        "hist_label_pos": {},
+        "water_labels": [
+            {"name": "Caspian Sea", "lat": 40.6, "lng": 51.0, "cls": "water-label-lg"},
+            {"name": "Black Sea", "lat": 42.6, "lng": 40.0, "cls": "water-label-lg"},
+            {"name": "Lake Sevan", "lat": 40.35, "lng": 45.3, "cls": "water-label-sm"},
+        ],
+        "clip_box": [36, 35, 54, 47],
+        "bounds": [[37.5, 39], [45, 52]],
+        "center": [41.2, 45.3],
+        "zoom": 6,
+        "historical": False,
+        # Labelled eras; the timeline starts at the first
+        "eras": [1936, 1991, 2024],
+        "era_names": {1936: "Full SSR Status", 1991: "Independence", 2024: "Modern Era"},
+        "era_entities": {
+            1936: {
+                "GE_SSR": {"code": "GE", "color": "#E07A5F", "name": "Georgian SSR", "subtitle": "Union Republic since 1936", "center": [42.2, 43.5]},
+                "AM_SSR": {"code": "AM", "color": "#81B29A", "name": "Armenian SSR", "subtitle": "Union Republic since 1936", "center": [40.2, 45.0]},
+                "AZ_SSR": {"code": "AZ", "color": "#3D85C6", "name": "Azerbaijan SSR", "subtitle": "Union Republic since 1936", "center": [40.4, 47.7]},
+            },
+            1991: {
+                "GE": {"code": "GE", "color": "#E07A5F", "name": "Republic of Georgia", "subtitle": "Independence: Apr 9, 1991", "center": [42.2, 43.5]},
+                "AM": {"code": "AM", "color": "#81B29A", "name": "Republic of Armenia", "subtitle": "Independence: Sep 21, 1991", "center": [40.2, 45.0]},
+                "AZ": {"code": "AZ", "color": "#3D85C6", "name": "Republic of Azerbaijan", "subtitle": "Independence: Oct 18, 1991", "center": [40.4, 47.7]},
+            },
+            2024: {
+                "GE": {"code": "GE", "color": "#E07A5F", "name": "Georgia", "subtitle": "", "center": [42.2, 43.5]},
+                "AM": {"code": "AM", "color": "#81B29A", "name": "Armenia", "subtitle": "", "center": [40.2, 45.0]},
+                "AZ": {"code": "AZ", "color": "#3D85C6", "name": "Azerbaijan", "subtitle": "", "center": [40.4, 47.7]},
+            },
+        },
+        "lifespans": [
+            (1936, "GE_SSR", 1936, 1991), (1936, "AM_SSR", 1936, 1991), (1936, "AZ_SSR", 1936, 1991),
+            (1991, "GE", 1991, 2024), (1991, "AM", 1991, 2024), (1991, "AZ", 1991, 2024),
+            (2024, "GE", 2024, None), (2024, "AM", 2024, None), (2024, "AZ", 2024, None),
+        ],
+        "info": {
+            1936: {
+                "GE_SSR": {"pop": "3.5M", "area": "69,700 km²", "gdp": "—", "currency": "Soviet Ruble"},
+                "AM_SSR": {"pop": "1.3M", "area": "29,743 km²", "gdp": "—", "currency": "Soviet Ruble"},
+                "AZ_SSR": {"pop": "3.2M", "area": "86,600 km²", "gdp": "—", "currency": "Soviet Ruble"},
+            },
+            1991: {
+                "GE": {"pop": "5.4M", "area": "69,700 km²", "gdp": "—", "currency": "Soviet Ruble → Lari (1995)"},
+                "AM": {"pop": "3.6M", "area": "29,743 km²", "gdp": "—", "currency": "Soviet Ruble → Dram (1993)"},
+                "AZ": {"pop": "7.2M", "area": "86,600 km²", "gdp": "—", "currency": "Soviet Ruble → Manat (1992)"},
+            },
+            2024: {
+                "GE": {"pop": "3.7M", "area": "69,700 km²", "gdp": "$33B", "currency": "Lari (₾)"},
+                "AM": {"pop": "3.0M", "area": "29,743 km²", "gdp": "$25B", "currency": "Dram (֏)"},
+                "AZ": {"pop": "10.2M", "area": "86,600 km²", "gdp": "$74B", "currency": "Manat (₼)"},
+            },
+        },
+        "cities": None,
+        "water": None,
+        "qa_tolerances": {"overlap": 10.0, "gap": 10.0, "neighbor_overlap": 10.0},
+        "geodata": os.path.join(ROOT_DIR, "geodata-caucasus.json"),
+        "html": os.path.join(ROOT_DIR, "caucasus-map.html"),
+    },
+    "mongolia": {
+        "title": "Mongolia",
+        "countries": {"mongolia": "MN"},
+        "neighbors": {"russia": "RU", "china": "CN", "kazakhstan": "KZ"},
+        "neighbor_styles": {
+            "RU": {"fill": "#2d3748", "name": "Russia"},
+            "CN": {"fill": "#1a365d", "name": "China"},
+            "KZ": {"fill": "#3d3028", "name": "Kazakhstan"},
+        },
+        "neighbor_label_pos": {"RU": [52.6, 100.0], "CN": [41.0, 110.0], "KZ": [49.3, 85.8]},
+        "hist_label_pos": {},
+        "water_labels": [
+            {"name": "Lake Baikal", "lat": 53.2, "lng": 107.6, "cls": "water-label-sm"},
+            {"name": "Khövsgöl", "lat": 51.0, "lng": 100.5, "cls": "water-label-sm"},
+            {"name": "Uvs Lake", "lat": 50.3, "lng": 92.7, "cls": "water-label-sm"},
+        ],
+        "clip_box": [82, 37, 126, 56],
+        "bounds": [[39, 85], [54, 122]],
+        "center": [46.8, 103.0],
+        "zoom": 5,
+        "historical": False,
+        "eras": [1924, 1991, 2024],
+        "era_names": {1924: "People's Republic", 1991: "Democratic Revolution", 2024: "Modern Era"},
+        "era_entities": {
+            1924: {"MPR": {"code": "MN", "color": "#C0392B", "name": "Mongolian People's Republic",
+                           "subtitle": "Est. Nov 26, 1924", "center": [46.8, 103.0]}},
+            1991: {"MN": {"code": "MN", "color": "#3D85C6", "name": "Mongolia",
+                          "subtitle": "Constitution of 1992", "center": [46.8, 103.0]}},
+        },
+        "lifespans": [(1924, "MPR", 1924, 1992), (1991, "MN", 1992, None)],
+        "info": {
+            1924: {"MPR": {"pop": "~650K", "area": "1,564,116 km²", "gdp": "—", "currency": "Tögrög (from 1925)"}},
+            1991: {"MN": {"pop": "2.3M", "area": "1,564,116 km²", "gdp": "—", "currency": "Tögrög (₮)"}},
+        },
+        "cities": None,
+        "water": None,
+        "qa_tolerances": {"overlap": 10.0, "gap": 10.0, "neighbor_overlap": 10.0},
+        "geodata": os.path.join(ROOT_DIR, "geodata-mongolia.json"),
+        "html": os.path.join(ROOT_DIR, "mongolia-map.html"),
+    },
+}
+
+
+def get_region(name=None):
+    name = name or DEFAULT_REGION
+    if name not in REGIONS:
+        raise KeyError(f"unknown region {name!r} (known: {', '.join(REGIONS)})")
+    return dict(REGIONS[name], name=name)
+
+
+def interval_index(region):
+    return timeline.build_interval_index(region["lifespans"], start=region["eras"][0])
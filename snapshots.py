@@ -0,0 +1,154 @@
+"""
+Static SVG snapshots of a region's default map view, one per timeline interval.
+
+The page paints the snapshot for the initial year straight from the HTML,
+before Leaflet, the fonts or the geodata payload have loaded, and fades it
+out once the interactive layers are committed. Lite mode (?lite, Save-Data
+or a low-memory device) keeps the snapshots as the only view and swaps them
+as the timeline moves.
+
+Geometries are projected to Web Mercator pixels at the page's default zoom,
+clipped to the map bounds, simplified to sub-pixel tolerance and written as
+integer relative path commands, so each interval costs a few KB.
+"""
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+import regions
+from generate_geodata import project_px0
+
+SIMPLIFY_PX = 0.75
+CLIP_MARGIN_PX = 8
+BACKGROUND = "#f2efe9"
+NEIGHBOR_STYLE = 'fill-opacity=".6" stroke="#4a5568" stroke-width="1.5"'
+CA_STYLE = 'fill-opacity=".5" stroke="#fff" stroke-opacity=".35" stroke-width="1.5"'
+
+
+def _to_px(lng, lat, zoom):
+    x, y = project_px0(lng, lat)
+    return x * 2 ** zoom, y * 2 ** zoom
+
+
+def pixel_geometry(geom, origin, zoom, crs, clip, tolerance=SIMPLIFY_PX):
+    # GeoJSON geometry -> shapely geometry in pixels at zoom (relative to
+    # origin), clipped to clip and simplified to tolerance pixels
+    scale = 2 ** zoom
+    ox, oy = origin
+    if crs == "px0":
+        def transform(c):
+            return np.column_stack([c[:, 0] * scale - ox, c[:, 1] * scale - oy])
+    else:
+        def transform(c):
+            x, y = _to_px(c[:, 0], c[:, 1], zoom)
+            return np.column_stack([x - ox, y - oy])
+    geom = shapely.transform(shape(geom), transform)
+    return shapely.clip_by_rect(geom, *clip).simplify(tolerance)
+
+
+def view_frame(region):
+    # (origin, width, height, clip) of the region's bounds at its default zoom
+    zoom = region["zoom"]
+    (south, west), (north, east) = region["bounds"]
+    x0, y0 = _to_px(west, north, zoom)
+    x1, y1 = _to_px(east, south, zoom)
+    width, height = int(np.ceil(x1 - x0)), int(np.ceil(y1 - y0))
+    clip = (-CLIP_MARGIN_PX, -CLIP_MARGIN_PX, width + CLIP_MARGIN_PX, height + CLIP_MARGIN_PX)
+    return (float(x0), float(y0)), width, height, clip
+
+
+def _path(geom, origin, zoom, crs, clip):
+    # Geometry -> compact SVG path data in snapshot pixels; "" when nothing
+    # survives the clip
+    geom = pixel_geometry(geom, origin, zoom, crs, clip)
+    parts = []
+    for poly in getattr(geom, "geoms", [geom]):
+        if poly.geom_type != "Polygon" or poly.is_empty:
+            continue
+        for ring in [poly.exterior, *poly.interiors]:
+            pts = np.rint(np.asarray(ring.coords)[:-1]).astype(int)
+            # Drop repeats left by rounding; a ring needs three distinct points
+            keep = np.ones(len(pts), dtype=bool)
+            keep[1:] = np.any(pts[1:] != pts[:-1], axis=1)
+            pts = pts[keep]
+            if len(pts) < 3:
+                continue
+            deltas = np.diff(pts, axis=0)
+            parts.append(f"M{pts[0][0]} {pts[0][1]}l" + " ".join(
+                f"{dx}{'' if dy < 0 else ' '}{dy}" for dx, dy in deltas) + "z")
+    return "".join(parts)
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def segment_entities(geodata, index, era_entities):
+    # (era, key, name, color, geometry, label [lat, lng] or None) per entity
+    # alive in each interval, resolved the way the geo worker does
+    historical = geodata["historical"]
+    out = []
+    for members in index["segments"]:
+        ents = []
+        for i in members:
+            era, key = index["entities"][i][:2]
+            if str(era) in historical:
+                ent = historical[str(era)].get(key)
+                if ent:
+                    ents.append((era, key, ent["name"], ent["color"], ent["geometry"], None))
+            else:
+                meta = era_entities[era][key]
+                geometry = geodata["modern"].get(meta["code"])
+                if geometry:
+                    ents.append((era, key, meta["name"], meta["color"], geometry, meta["center"]))
+        out.append(ents)
+    return out
+
+
+def render_snapshots(geodata, region):
+    # Returns {"width", "height", "center": [x, y] (the default view's centre
+    # in snapshot pixels), "base": the SVG up to and including the neighbours,
+    # "layers": the entity paths and labels of each timeline interval}
+    label_pos = region["hist_label_pos"]
+    crs = geodata.get("crs")
+    zoom, center, neighbor_styles = region["zoom"], region["center"], region["neighbor_styles"]
+    origin, width, height, clip = view_frame(region)
+    x0, y0 = origin
+    cx, cy = _to_px(center[1], center[0], zoom)
+
+    # Neighbours are the same in every interval
+    neighbors = "".join(
+        f'<path fill="{neighbor_styles.get(code, {}).get("fill", "#222")}" d="{d}"/>'
+        for code, geom in geodata["neighbors"].items()
+        if (d := _path(geom, origin, zoom, crs, clip)))
+
+    index = regions.interval_index(region)
+    meta = geodata.get("meta", {})
+    layers = []
+    for ents in segment_entities(geodata, index, region["era_entities"]):
+        paths, labels = [], []
+        for era, key, name, color, geom, center_ll in ents:
+            d = _path(geom, origin, zoom, crs, clip)
+            if not d:
+                continue
+            paths.append(f'<path fill="{color}" d="{d}"/>')
+            row = meta.get("historical", {}).get(str(era), {}).get(key)
+            pos = center_ll or label_pos.get(key) or (row and row[5:7])
+            if pos:
+                lx, ly = _to_px(pos[1], pos[0], zoom)
+                labels.append(f'<text x="{lx - x0:.0f}" y="{ly - y0:.0f}">{_escape(name)}</text>')
+        layers.append(f'<g {CA_STYLE}>{"".join(paths)}</g>'
+                      f'<g text-anchor="middle">{"".join(labels)}</g>')
+    base = (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}" fill-rule="evenodd" '
+            f'style="left:calc(50% - {cx - x0:.0f}px);top:calc(50% - {cy - y0:.0f}px)">'
+            f'<rect width="{width}" height="{height}" fill="{BACKGROUND}"/>'
+            f'<g {NEIGHBOR_STYLE}>{neighbors}</g>')
+    return {"width": width, "height": height,
+            "center": [round(float(cx - x0)), round(float(cy - y0))],
+            "base": base, "layers": layers}
+
+
+def snapshot_svg(snapshots, seg):
+    # The shared frame and neighbours are stored once; intervals add their layer
+    return snapshots["base"] + snapshots["layers"][seg] + "</svg>"
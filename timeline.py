@@ -0,0 +1,161 @@
+"""
+Timeline definition shared by the generators and the lookup tools.
+
+ERAS are the labelled snapshot years on the timeline. Every entity also has a
+lifespan [start, end) in ENTITY_LIFESPANS; build_interval_index() turns those
+into sorted boundary years plus the active entity set between each pair of
+boundaries, so resolving any year is one binary search instead of a
+per-year table.
+"""
+import bisect
+
+TIMELINE_START = 1900
+TIMELINE_END = 2024
+
+ERAS = [1900, 1920, 1924, 1936, 1991, 2024]
+ERA_NAMES = {
+    1900: "Russian Imperial Era",
+    1920: "Soviet Takeover",
+    1924: "National Delimitation",
+    1936: "Full SSR Status",
+    1991: "Independence",
+    2024: "Modern Era",
+}
+
+# For 1936/1991/2024 — entities drawn from the modern borders in geodata.json.
+# 1900/1920/1924 entities (names, colors, geometry) come from geodata.json's
+# "historical" section instead.
+ERA_ENTITIES = {
+    1936: {
+        "KZ_SSR": {"code": "KZ", "color": "#E07A5F", "name": "Kazakh SSR", "subtitle": "Union Republic since 1936", "center": [48, 67]},
+        "UZ_SSR": {"code": "UZ", "color": "#81B29A", "name": "Uzbek SSR", "subtitle": "Union Republic since 1924", "center": [41.3, 64.5]},
+        "TM_SSR": {"code": "TM", "color": "#F2CC8F", "name": "Turkmen SSR", "subtitle": "Union Republic since 1924", "center": [39, 59.5]},
+        "KG_SSR": {"code": "KG", "color": "#3D85C6", "name": "Kirghiz SSR", "subtitle": "Union Republic since 1936", "center": [41.5, 74.5]},
+        "TJ_SSR": {"code": "TJ", "color": "#9B72CF", "name": "Tajik SSR", "subtitle": "Union Republic since 1929", "center": [38.8, 70.8]},
+    },
+    1991: {
+        "KZ": {"code": "KZ", "color": "#E07A5F", "name": "Republic of Kazakhstan", "subtitle": "Independence: Dec 16, 1991", "center": [48, 67]},
+        "UZ": {"code": "UZ", "color": "#81B29A", "name": "Republic of Uzbekistan", "subtitle": "Independence: Sep 1, 1991", "center": [41.3, 64.5]},
+        "TM": {"code": "TM", "color": "#F2CC8F", "name": "Republic of Turkmenistan", "subtitle": "Independence: Oct 27, 1991", "center": [39, 59.5]},
+        "KG": {"code": "KG", "color": "#3D85C6", "name": "Republic of Kyrgyzstan", "subtitle": "Independence: Aug 31, 1991", "center": [41.5, 74.5]},
+        "TJ": {"code": "TJ", "color": "#9B72CF", "name": "Republic of Tajikistan", "subtitle": "Independence: Sep 9, 1991", "center": [38.8, 70.8]},
+    },
+    2024: {
+        "KZ": {"code": "KZ", "color": "#E07A5F", "name": "Kazakhstan", "subtitle": "", "center": [48, 67]},
+        "UZ": {"code": "UZ", "color": "#81B29A", "name": "Uzbekistan", "subtitle": "", "center": [41.3, 64.5]},
+        "TM": {"code": "TM", "color": "#F2CC8F", "name": "Turkmenistan", "subtitle": "", "center": [39, 59.5]},
+        "KG": {"code": "KG", "color": "#3D85C6", "name": "Kyrgyzstan", "subtitle": "", "center": [41.5, 74.5]},
+        "TJ": {"code": "TJ", "color": "#9B72CF", "name": "Tajikistan", "subtitle": "", "center": [38.8, 70.8]},
+    },
+}
+
+# Info panel figures per entity, keyed by the era that defines it (as in
+# ERA_ENTITIES and geodata.json's "historical" section)
+ENTITY_INFO = {
+    1900: {
+        "TURKESTAN": {"pop": "~6M", "area": "~1,707,000 km²", "gdp": "—", "currency": "Russian Ruble"},
+        "BUKHARA": {"pop": "~2.5M", "area": "~203,000 km²", "gdp": "—", "currency": "Tanga (Bukharan)"},
+        "KHIVA": {"pop": "~800K", "area": "~62,000 km²", "gdp": "—", "currency": "Tilla (Khivan)"},
+        "STEPPE": {"pop": "~4M", "area": "~2,400,000 km²", "gdp": "—", "currency": "Russian Ruble"},
+    },
+    1920: {
+        "TURKESTAN_ASSR": {"pop": "~5.5M", "area": "~1,707,000 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "BUKHARA_PSR": {"pop": "~2M", "area": "~203,000 km²", "gdp": "—", "currency": "Bukharan Ruble"},
+        "KHOREZM_PSR": {"pop": "~600K", "area": "~62,000 km²", "gdp": "—", "currency": "Khorezmian Ruble"},
+        "KIRGHIZ_ASSR": {"pop": "~4.5M", "area": "~2,400,000 km²", "gdp": "—", "currency": "Soviet Ruble"},
+    },
+    1924: {
+        "UZ_SSR": {"pop": "~5M", "area": "~590,000 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "TM_SSR": {"pop": "~1M", "area": "~491,000 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "KARA_KIRGHIZ": {"pop": "~1M", "area": "~199,000 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "KZ_ASSR": {"pop": "~6M", "area": "~2,724,000 km²", "gdp": "—", "currency": "Soviet Ruble"},
+    },
+    1936: {
+        "KZ_SSR": {"pop": "6.1M", "area": "2,724,900 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "UZ_SSR": {"pop": "6.3M", "area": "448,978 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "TM_SSR": {"pop": "1.3M", "area": "491,210 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "KG_SSR": {"pop": "1.5M", "area": "199,951 km²", "gdp": "—", "currency": "Soviet Ruble"},
+        "TJ_SSR": {"pop": "1.5M", "area": "143,100 km²", "gdp": "—", "currency": "Soviet Ruble"},
+    },
+    1991: {
+        "KZ": {"pop": "16.5M", "area": "2,724,900 km²", "gdp": "~$120B", "currency": "Soviet Ruble → Tenge (1993)"},
+        "UZ": {"pop": "20.7M", "area": "448,978 km²", "gdp": "~$60B", "currency": "Soviet Ruble → So'm (1993)"},
+        "TM": {"pop": "3.7M", "area": "491,210 km²", "gdp": "~$18B", "currency": "Soviet Ruble → Manat (1993)"},
+        "KG": {"pop": "4.4M", "area": "199,951 km²", "gdp": "~$12B", "currency": "Soviet Ruble → Som (1993)"},
+        "TJ": {"pop": "5.3M", "area": "143,100 km²", "gdp": "~$8B", "currency": "Soviet Ruble → Somoni (2000)"},
+    },
+    2024: {
+        "KZ": {"pop": "19.8M", "area": "2,724,900 km²", "gdp": "$604B", "currency": "Tenge (₸)"},
+        "UZ": {"pop": "36.0M", "area": "448,978 km²", "gdp": "$301B", "currency": "So'm"},
+        "TM": {"pop": "6.5M", "area": "491,210 km²", "gdp": "$112B", "currency": "Manat (m)"},
+        "KG": {"pop": "7.1M", "area": "199,951 km²", "gdp": "$43B", "currency": "Som"},
+        "TJ": {"pop": "10.1M", "area": "143,100 km²", "gdp": "$46B", "currency": "Somoni (SM)"},
+    },
+}
+
+# (era, key, start, end): the entity defined under `era` exists from start
+# up to (not including) end; end=None means still current.
+ENTITY_LIFESPANS = [
+    # Russian Imperial Era
+    (1900, "TURKESTAN", 1867, 1918),
+    (1900, "BUKHARA", 1868, 1920),
+    (1900, "KHIVA", 1873, 1920),
+    (1900, "STEPPE", 1868, 1920),
+    # Soviet Takeover
+    (1920, "TURKESTAN_ASSR", 1918, 1924),
+    (1920, "BUKHARA_PSR", 1920, 1924),
+    (1920, "KHOREZM_PSR", 1920, 1924),
+    (1920, "KIRGHIZ_ASSR", 1920, 1924),
+    # National Delimitation. Kara-Kirghiz AO became the Kirghiz ASSR in 1926
+    # on the same borders, so one entity covers both until full SSR status.
+    (1924, "UZ_SSR", 1924, 1929),
+    (1924, "TM_SSR", 1924, 1936),
+    (1924, "KARA_KIRGHIZ", 1924, 1936),
+    (1924, "KZ_ASSR", 1924, 1936),
+    # Full SSR Status (Tajik SSR split from the Uzbek SSR in 1929)
+    (1936, "UZ_SSR", 1929, 1991),
+    (1936, "TJ_SSR", 1929, 1991),
+    (1936, "TM_SSR", 1936, 1991),
+    (1936, "KZ_SSR", 1936, 1991),
+    (1936, "KG_SSR", 1936, 1991),
+    # Independence
+    (1991, "KZ", 1991, 2024),
+    (1991, "UZ", 1991, 2024),
+    (1991, "TM", 1991, 2024),
+    (1991, "KG", 1991, 2024),
+    (1991, "TJ", 1991, 2024),
+    # Modern Era
+    (2024, "KZ", 2024, None),
+    (2024, "UZ", 2024, None),
+    (2024, "TM", 2024, None),
+    (2024, "KG", 2024, None),
+    (2024, "TJ", 2024, None),
+]
+
+
+def build_interval_index(lifespans=ENTITY_LIFESPANS, start=TIMELINE_START, end=TIMELINE_END):
+    # Segment i covers [boundaries[i], boundaries[i+1]) and holds the indexes
+    # (into "entities") of every entity alive for that whole span
+    last = end + 1
+    entities = []
+    for era, key, s, e in lifespans:
+        s = max(s, start)
+        e = last if e is None else min(e, last)
+        if s < e:
+            entities.append([era, key, s, e])
+    boundaries = sorted({start, last} | {s for _, _, s, _ in entities} | {e for _, _, _, e in entities})
+    segments = []
+    for lo in boundaries[:-1]:
+        segments.append([i for i, (_, _, s, e) in enumerate(entities) if s <= lo < e])
+    return {"start": start, "end": end, "boundaries": boundaries,
+            "segments": segments, "entities": entities}
+
+
+def segment_for_year(index, year):
+    b = index["boundaries"]
+    return min(max(bisect.bisect_right(b, year) - 1, 0), len(b) - 2)
+
+
+def era_for_year(year, eras=ERAS):
+    # Latest snapshot era on or before year (clamped to the first era)
+    return eras[max(bisect.bisect_right(eras, year) - 1, 0)]
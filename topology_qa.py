@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Topology QA for the era geometries in geodata.json.
+
+For every timeline interval the entities drawn together are checked for
+  overlaps           two entities claiming the same ground
+  gaps               slivers between them: holes in their union that the
+                     region's modern countries cover
+and every entity, once, for
+  neighbor overlaps  an entity running into a neighbour country.
+Candidate pairs come from an STRtree, intervals are checked in parallel, and
+areas are geodesic km². Issues of at least --min-area go into the JSON report
+with their geometry; any one larger than its tolerance fails the check.
+
+    python topology_qa.py                                  # geodata.json
+    python topology_qa.py geodata-caucasus.json --report qa.json --fail
+    python generate_geodata.py --qa-report qa.json --qa-fail
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+from shapely.geometry import mapping, shape
+
+import generate_geodata as geo
+import regions
+
+ROOT_DIR = os.path.dirname(__file__)
+GEODATA_PATH = os.path.join(ROOT_DIR, "geodata.json")
+
+MIN_AREA_KM2 = 1.0
+# Largest single issue allowed per kind, for regions whose profile has no
+# "qa_tolerances" of its own
+TOLERANCES_KM2 = {"overlap": 10.0, "gap": 10.0, "neighbor_overlap": 10.0}
+KINDS = list(TOLERANCES_KM2)
+
+
+def _geometry(geom, crs):
+    geom = shape(geom)
+    if crs == "px0":
+        # Areas are computed on the sphere, so work in degrees
+        geom = shapely.transform(geom, lambda c: np.column_stack(geo.unproject_px0(c[:, 0], c[:, 1])))
+    return shapely.make_valid(geom)
+
+
+def _polygonal(geoms):
+    # Keep only the areal part of each overlay result (touching borders
+    # intersect in lines and points)
+    out = []
+    for g in geoms:
+        parts = [p for p in shapely.get_parts(g) if p.geom_type in ("Polygon", "MultiPolygon")]
+        out.append(shapely.union_all(parts) if parts else shapely.Polygon())
+    return np.array(out, dtype=object)
+
+
+def _issues(kind, refs, geoms, min_area):
+    # [{kind, entities, area_km2, geometry}] for the geometries of at least min_area
+    geoms = _polygonal(geoms)
+    areas = geo.geodesic_areas(geoms) if len(geoms) else np.zeros(0)
+    return [{"kind": kind, "entities": ref, "area_km2": round(float(area), 2),
+             "geometry": mapping(geom)}
+            for ref, geom, area in zip(refs, geoms, areas) if area >= min_area]
+
+
+def pairwise_overlaps(refs, geoms, min_area):
+    # Overlapping area of every intersecting pair, candidates from an STRtree
+    geoms = np.asarray(geoms, dtype=object)
+    tree = shapely.STRtree(geoms)
+    left, right = tree.query(geoms, predicate="intersects")
+    keep = left < right
+    left, right = left[keep], right[keep]
+    overlaps = shapely.intersection(geoms[left], geoms[right])
+    return _issues("overlap", [[refs[i], refs[j]] for i, j in zip(left, right)], overlaps, min_area)
+
+
+def interior_gaps(geoms, reference, min_area):
+    # Ground the modern countries cover that no entity of the interval does,
+    # one issue per piece: holes inside the union as well as slivers along
+    # its outer edge (so enclaves of other states don't count)
+    missing = shapely.difference(reference, shapely.union_all(geoms))
+    parts = [p for p in shapely.get_parts(_polygonal([missing])[0]) if not p.is_empty]
+    if not parts:
+        return []
+    return _issues("gap", [[] for _ in parts], np.array(parts, dtype=object), min_area)
+
+
+def neighbor_overlaps(refs, geoms, neighbor_codes, neighbor_geoms, min_area):
+    # Entity x neighbour intersections, candidates from an STRtree over the neighbours
+    geoms = np.asarray(geoms, dtype=object)
+    tree = shapely.STRtree(neighbor_geoms)
+    ent, nb = tree.query(geoms, predicate="intersects")
+    overlaps = shapely.intersection(geoms[ent], np.asarray(neighbor_geoms, dtype=object)[nb])
+    return _issues("neighbor_overlap", [[refs[i], neighbor_codes[j]] for i, j in zip(ent, nb)],
+                   overlaps, min_area)
+
+
+# =============================================
+# WORKERS
+# =============================================
+# Tasks carry geometries as WKB so they pickle cheaply to the worker processes
+
+def check_interval(task):
+    refs = task["refs"]
+    geoms = shapely.from_wkb(task["geoms"])
+    reference = shapely.from_wkb(task["reference"])
+    issues = []
+    if len(geoms) > 1:
+        issues += pairwise_overlaps(refs, geoms, task["min_area"])
+    if len(geoms):
+        issues += interior_gaps(geoms, reference, task["min_area"])
+    return {"years": task["years"], "entities": refs, "issues": issues}
+
+
+def check_neighbors(task):
+    if not task["geoms"] or not task["neighbor_geoms"]:
+        return []
+    return neighbor_overlaps(task["refs"], shapely.from_wkb(task["geoms"]), task["neighbor_codes"],
+                             shapely.from_wkb(task["neighbor_geoms"]), task["min_area"])
+
+
+def collect_tasks(geodata, region, min_area=MIN_AREA_KM2):
+    # One task per timeline interval plus one for the neighbour check
+    crs = geodata.get("crs")
+    index = regions.interval_index(region)
+    output = {"modern": {code: _geometry(g, crs) for code, g in geodata["modern"].items()},
+              "historical": {era: {key: {"geometry": _geometry(ent["geometry"], crs)}
+                                   for key, ent in ents.items()}
+                             for era, ents in geodata["historical"].items()}}
+    reference = shapely.to_wkb(shapely.union_all(list(output["modern"].values())))
+    bounds = index["boundaries"] + [None]
+    intervals, entities = [], {}
+    for seg in range(len(index["segments"])):
+        geoms = geo.segment_geometries(output, index, seg, region["era_entities"])
+        refs = [f"{era}/{key}" for era, key in geoms]
+        entities.update(zip(refs, geoms.values()))
+        end = bounds[seg + 1]
+        intervals.append({"years": [bounds[seg], end - 1 if end is not None else None],
+                          "refs": refs, "geoms": list(shapely.to_wkb(list(geoms.values()))),
+                          "reference": reference, "min_area": min_area})
+    neighbor_codes = list(geodata["neighbors"])
+    neighbors = {"refs": list(entities),
+                 "geoms": list(shapely.to_wkb(list(entities.values()))),
+                 "neighbor_codes": neighbor_codes,
+                 "neighbor_geoms": list(shapely.to_wkb([_geometry(geodata["neighbors"][c], crs)
+                                                        for c in neighbor_codes])),
+                 "min_area": min_area}
+    return intervals, neighbors
+
+
+def run_qa(geodata, region=None, min_area=MIN_AREA_KM2, tolerances=None, jobs=None):
+    # The report: per-interval overlaps and gaps, neighbour overlaps, and a
+    # summary with per-kind counts, the largest issue and the failures
+    region = region or regions.get_region(geodata.get("region"))
+    tolerances = {**TOLERANCES_KM2, **region.get("qa_tolerances", {}), **(tolerances or {})}
+    intervals, neighbors = collect_tasks(geodata, region, min_area)
+    if jobs == 1:
+        results = [check_interval(t) for t in intervals]
+        nb_issues = check_neighbors(neighbors)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            nb_job = pool.submit(check_neighbors, neighbors)
+            results = list(pool.map(check_interval, intervals))
+            nb_issues = nb_job.result()
+
+    all_issues = [(r["years"], i) for r in results for i in r["issues"]] + [(None, i) for i in nb_issues]
+    summary = {}
+    failures = []
+    for kind in KINDS:
+        found = [(years, i) for years, i in all_issues if i["kind"] == kind]
+        worst = max(found, key=lambda f: f[1]["area_km2"], default=(None, None))
+        summary[kind] = {"count": len(found), "tolerance_km2": tolerances[kind],
+                         "max_km2": worst[1]["area_km2"] if worst[1] else 0.0,
+                         "max_entities": worst[1]["entities"] if worst[1] else []}
+        failures += [{"kind": kind, "years": years, "entities": i["entities"], "area_km2": i["area_km2"]}
+                     for years, i in found if i["area_km2"] > tolerances[kind]]
+    return {"region": region["name"], "min_area_km2": min_area,
+            "intervals": results, "neighbor_overlaps": nb_issues,
+            "summary": summary, "failures": failures, "ok": not failures}
+
+
+def print_summary(report):
+    print(f"Topology QA ({report['region']}, issues >= {report['min_area_km2']} km²):")
+    for kind, s in report["summary"].items():
+        worst = f", largest {s['max_km2']:.1f} km² ({' / '.join(s['max_entities']) or 'between entities'})" if s["count"] else ""
+        print(f"  {kind}: {s['count']}{worst} [tolerance {s['tolerance_km2']:g} km²]")
+    for f in report["failures"]:
+        years = f"{f['years'][0]}-{f['years'][1] or ''}: " if f["years"] else ""
+        print(f"  FAIL {f['kind']} {years}{' / '.join(f['entities']) or 'gap'} {f['area_km2']:.1f} km²",
+              file=sys.stderr)
+    failed = len(report["failures"])
+    print(f"  {f'{failed} issue(s) over tolerance' if failed else 'OK'}")
+
+
+def write_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, separators=(",", ":"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check era geometries for overlaps and gaps.")
+    parser.add_argument("geodata", nargs="?", default=GEODATA_PATH, help="geodata JSON to check")
+    parser.add_argument("--report", metavar="PATH", help="write the JSON report to PATH")
+    parser.add_argument("--fail", action="store_true", help="exit 1 when an issue exceeds its tolerance")
+    parser.add_argument("--min-area", type=float, default=MIN_AREA_KM2,
+                        help=f"smallest issue reported, km² (default {MIN_AREA_KM2:g})")
+    for kind, tol in TOLERANCES_KM2.items():
+        parser.add_argument(f"--max-{kind.replace('_', '-')}", type=float, default=None, dest=kind,
+                            help=f"largest {kind.replace('_', ' ')} allowed, km² "
+                                 f"(default: the region's, else {tol:g})")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    with open(args.geodata) as f:
+        geodata = json.load(f)
+    report = run_qa(geodata, min_area=args.min_area, jobs=args.jobs,
+                    tolerances={kind: getattr(args, kind) for kind in KINDS if getattr(args, kind) is not None})
+    print_summary(report)
+    if args.report:
+        write_report(report, args.report)
+        print(f"  Report: {args.report}")
+    return 1 if args.fail and not report["ok"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Watch mode: rebuild the map page on every source change and live-reload it.
+
+Keeps the geodata payload, city table, snapshots and the generator modules
+in memory and, when a file changes, redoes only what depends on it: a CSS or
+template edit in generate_html.py reassembles the page from the cached parts,
+a cities.csv edit rebuilds just the city table, and only geodata or renderer
+changes redraw the snapshots. The page is served at http://HOST:PORT/ with a
+small Server-Sent Events client injected, so open tabs reload on each build.
+
+    python watch_build.py                   # http://127.0.0.1:8000/
+    python watch_build.py --region caucasus --port 8001 --perf
+
+With --geodata the geodata step reruns too when generate_geodata.py or the
+region's shoreline series changes (needs node_modules; country geometries
+come from the on-disk cache).
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import regions
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Reload order: a module is reloaded whenever it or anything before it
+# changed, so dependents always see fresh definitions
+MODULES = ["timeline", "regions", "profiling", "cities", "generate_geodata", "snapshots", "generate_html"]
+
+LIVE_RELOAD_JS = r'''<script>
+// Injected by watch_build.py (not in the written file)
+new EventSource('/__events').onmessage = () => location.reload();
+</script>
+'''
+
+
+def module_path(name):
+    return os.path.join(ROOT_DIR, f"{name}.py")
+
+
+class WatchBuild:
+    def __init__(self, region_name, perf=False, geodata=False, cache_dir=None):
+        self.region_name = region_name
+        self.perf = perf
+        self.geodata = geodata
+        self.cache_dir = cache_dir
+        self.modules = {name: importlib.import_module(name) for name in MODULES}
+        self.mtimes = {}
+        self.geodata_raw = None
+        self.city_table = None
+        self.snapshot_set = None
+        self.html = ""
+        self.version = 0
+        self.changed = threading.Condition()
+
+    @property
+    def region(self):
+        return self.modules["regions"].get_region(self.region_name)
+
+    def watched(self):
+        region = self.region
+        paths = [module_path(name) for name in MODULES] + [region["geodata"]]
+        if region["cities"]:
+            paths.append(region["cities"])
+        if self.geodata and region["water"]:
+            paths.append(region["water"])
+        return paths
+
+    def poll(self):
+        # Paths whose mtime moved since the last poll (all of them the first time)
+        changed = set()
+        for path in self.watched():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self.mtimes.get(path) != mtime:
+                self.mtimes[path] = mtime
+                changed.add(path)
+        return changed
+
+    def reload_modules(self, changed):
+        first = next((i for i, name in enumerate(MODULES) if module_path(name) in changed), None)
+        if first is None:
+            return set()
+        for name in MODULES[first:]:
+            self.modules[name] = importlib.reload(self.modules[name])
+        return set(MODULES[first:])
+
+    def rebuild(self, changed):
+        t0 = time.perf_counter()
+        reloaded = self.reload_modules(changed)
+        region = self.region
+        steps = []
+        geo, html_mod = self.modules["generate_geodata"], self.modules["generate_html"]
+
+        if (self.geodata and ("generate_geodata" in reloaded or region["water"] in changed)
+                and self.geodata_raw is not None):
+            output = geo.build_geodata(region, cache_dir=self.cache_dir)
+            geo.write_output(output, region["geodata"])
+            self.mtimes[region["geodata"]] = os.stat(region["geodata"]).st_mtime_ns
+            changed = changed | {region["geodata"]}
+            steps.append("geodata")
+        if region["geodata"] in changed or self.geodata_raw is None:
+            with open(region["geodata"]) as f:
+                self.geodata_raw = f.read()
+            steps.append("read geodata")
+        if region["cities"] in changed or reloaded & {"timeline", "regions", "cities"} or self.city_table is None:
+            self.city_table = html_mod.load_region_cities(region)
+            steps.append("cities")
+        if (region["geodata"] in changed or reloaded & {"timeline", "regions", "generate_geodata", "snapshots"}
+                or self.snapshot_set is None):
+            self.snapshot_set = html_mod.render_snapshots(json.loads(self.geodata_raw), region)
+            steps.append("snapshots")
+
+        self.html = html_mod.build_html(self.geodata_raw, perf=self.perf, city_table=self.city_table,
+                                        snapshot_set=self.snapshot_set, region=region)
+        with open(region["html"], "w") as f:
+            f.write(self.html)
+        steps.append("html")
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+        elapsed = (time.perf_counter() - t0) * 1000
+        names = ", ".join(sorted(os.path.basename(p) for p in changed))
+        print(f"[{time.strftime('%H:%M:%S')}] {names}: {' + '.join(steps)} in {elapsed:.1f} ms")
+
+    def step(self):
+        changed = self.poll()
+        if not changed:
+            return
+        try:
+            self.rebuild(changed)
+        except Exception as err:  # keep watching; the next save usually fixes it
+            print(f"[{time.strftime('%H:%M:%S')}] build failed: {type(err).__name__}: {err}", file=sys.stderr)
+
+    def served_html(self):
+        return self.html.replace("</body>", LIVE_RELOAD_JS + "</body>", 1)
+
+    def wait_for_change(self, version, timeout):
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+def make_handler(build):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/__events":
+                self.events()
+            elif path in ("/", "/" + os.path.basename(build.region["html"])):
+                body = build.served_html().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+
+        def events(self):
+            # One SSE stream per open tab: a message per build, a comment
+            # every 15s so proxies keep the connection open
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            version = build.version
+            try:
+                while True:
+                    new = build.wait_for_change(version, 15)
+                    self.wfile.write(f"data: {new}\n\n".encode() if new != version else b": ping\n\n")
+                    self.wfile.flush()
+                    version = new
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the map on change and serve it with live reload.")
+    parser.add_argument("--region", default=regions.DEFAULT_REGION, choices=sorted(regions.REGIONS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between file polls")
+    parser.add_argument("--perf", action="store_true", help="build the instrumented page")
+    parser.add_argument("--geodata", action="store_true",
+                        help="also rerun the geodata step when generate_geodata.py changes")
+    parser.add_argument("--cache-dir", default=os.path.join(ROOT_DIR, ".geocache"),
+                        help="country geometry cache used by --geodata")
+    args = parser.parse_args(argv)
+
+    build = WatchBuild(args.region, perf=args.perf, geodata=args.geodata, cache_dir=args.cache_dir)
+    build.step()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(build))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {build.region['html']} at http://{args.host}:{server.server_port}/ (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(args.interval)
+            build.step()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()